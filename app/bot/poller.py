@@ -4,12 +4,13 @@ import time
 import json
 import threading
 from pathlib import Path
-from datetime import datetime
-import urllib.request
-import urllib.parse
+from datetime import datetime, timedelta
+from typing import Callable, Optional
 
 from app.common.state import set_armed, is_armed, ensure_initial_state
-from app.telegram.client import send_text, send_photo_bgr  # ya existen en tu proyecto
+from app.telegram.client import send_text, send_photo_bgr, send_album_bytes, api_url  # ya existen en tu proyecto
+from app.common.profiler import start_profile
+from app.common.metrics import read_metrics, format_metrics
 
 def _runtime_dir() -> Path:
     raw = os.getenv("RUNTIME_DIR", "./runtime")
@@ -17,11 +18,11 @@ def _runtime_dir() -> Path:
     p.mkdir(parents=True, exist_ok=True)
     return p
 
-def _latest_snapshot_path() -> Path:
-    return _runtime_dir() / "latest.jpg"
+def _latest_snapshot_path(runtime_dir: Path | None = None) -> Path:
+    return (runtime_dir or _runtime_dir()) / "latest.jpg"
 
-def _commands_path() -> Path:
-    return _runtime_dir() / "commands.json"
+def _commands_path(runtime_dir: Path | None = None) -> Path:
+    return (runtime_dir or _runtime_dir()) / "commands.json"
 
 def _atomic_write_json(path: Path, payload) -> None:
     tmp = path.with_suffix(path.suffix + ".tmp")
@@ -35,11 +36,11 @@ def _atomic_write_json(path: Path, payload) -> None:
         except Exception:
             pass
 
-def _enqueue_command(cmd: dict) -> None:
+def _enqueue_command(cmd: dict, runtime_dir: Path | None = None) -> None:
     """
     Añade un comando a commands.json (lista de dicts) de forma atómica.
     """
-    path = _commands_path()
+    path = _commands_path(runtime_dir)
     # Leer lo existente (si hay)
     existing = []
     if path.exists():
@@ -52,15 +53,26 @@ def _enqueue_command(cmd: dict) -> None:
     existing.append(cmd)
     _atomic_write_json(path, existing)
 
+# Sesión HTTP keep-alive para el long polling (evita abrir conexión TLS en cada ciclo)
+_session = None
+
+def _http():
+    global _session
+    if _session is None:
+        import requests
+        _session = requests.Session()
+    return _session
+
 def _get_updates(token: str, offset: int | None, timeout: int = 25):
-    base = f"https://api.telegram.org/bot{token}/getUpdates"
     params = {"timeout": str(timeout)}
     if offset is not None:
         params["offset"] = str(offset)
-    url = base + "?" + urllib.parse.urlencode(params)
-    with urllib.request.urlopen(url, timeout=timeout + 5) as resp:
-        data = json.loads(resp.read().decode("utf-8"))
+    r = _http().get(api_url(token, "getUpdates"), params=params, timeout=timeout + 5)
+    data = r.json()
     if not data.get("ok"):
+        if r.status_code == 409:
+            print("[BOT] getUpdates 409: hay un webhook activo (usa BOT_MODE=webhook o deleteWebhook).")
+            time.sleep(5)
         return []
     return data.get("result", [])
 
@@ -98,20 +110,199 @@ def _read_snapshot_with_retries(p: Path, retries: int = 6, delay: float = 0.15):
             time.sleep(delay)
     return None
 
-def _loop(settings) -> None:
+def _clip_dir(settings, runtime_dir: Path | None = None) -> Path:
+    raw = str(getattr(settings, "CLIP_DIR", "clips"))
+    return Path(raw) if os.path.isabs(raw) else (runtime_dir or _runtime_dir()) / raw
+
+def _parse_day(parts: list[str]):
+    """/sheets [AAAA-MM-DD|ayer] → fecha (hoy por defecto); None si no se entiende."""
+    today = datetime.now().date()
+    if len(parts) < 2 or parts[1].lower() == "hoy":
+        return today
+    if parts[1].lower() == "ayer":
+        return today - timedelta(days=1)
+    try:
+        return datetime.strptime(parts[1], "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+def _send_day_sheets(settings, token: str, chat_id: str, parts: list[str],
+                     runtime_dir: Path | None, tag: str) -> None:
+    from app.record.thumbs import day_sheets
+    day = _parse_day(parts)
+    if day is None:
+        send_text(token, chat_id, f"{tag}Uso: /sheets [AAAA-MM-DD|ayer]")
+        return
+    sheets = day_sheets(_clip_dir(settings, runtime_dir), day)
+    if not sheets:
+        send_text(token, chat_id, f"{tag}Sin hojas de contactos del {day:%d/%m/%Y}.")
+        return
+    jpegs = []
+    for p in sheets:
+        try:
+            jpegs.append(p.read_bytes())
+        except OSError:
+            pass  # borrada por la cuota mientras tanto
+    # Un álbum admite 10 fotos: tantos álbumes como hagan falta, en orden cronológico
+    chunks = [jpegs[i:i + 10] for i in range(0, len(jpegs), 10)]
+    for n, chunk in enumerate(chunks, 1):
+        caption = f"{tag}🗂 {day:%d/%m/%Y}: {len(jpegs)} clips"
+        if len(chunks) > 1:
+            caption += f" ({n}/{len(chunks)})"
+        send_album_bytes(token, chat_id, chunk, caption)
+
+def _send_heatmap(settings, token: str, chat_id: str, runtime_dir: Path | None, tag: str) -> None:
+    from app.vision.heatmap import load_heatmap, suggest_zones, render_heatmap, format_zones
+    rd = runtime_dir or _runtime_dir()
+    heat = load_heatmap(rd)
+    if heat is None:
+        send_text(token, chat_id, f"{tag}⚠️ Aún no hay mapa de calor (HEATMAP_ENABLE=false o sin guardar).")
+        return
+    img = _read_snapshot_with_retries(_latest_snapshot_path(rd))
+    if img is None:
+        send_text(token, chat_id, f"{tag}⚠️ No se pudo leer el snapshot para el mapa de calor.")
+        return
+    zones = suggest_zones(heat, float(getattr(settings, "HEATMAP_ZONE_ACTIVITY", 0.15)),
+                          float(getattr(settings, "HEATMAP_ZONE_MIN_AREA", 0.002)))
+    text = format_zones(zones)
+    caption = f"{tag}🔥 Mapa de calor\n{text}"
+    if len(caption) > 1000:  # límite del pie de foto: el detalle va aparte
+        send_photo_bgr(token, chat_id, render_heatmap(img, heat, zones), caption=f"{tag}🔥 Mapa de calor")
+        send_text(token, chat_id, tag + text[:4000])
+    else:
+        send_photo_bgr(token, chat_id, render_heatmap(img, heat, zones), caption=caption)
+
+def _parse_seconds(parts: list[str], default: float, minimum: float) -> float:
+    if len(parts) >= 2:
+        try:
+            return max(minimum, float(parts[1].replace(",", ".")))
+        except Exception:
+            pass
+    return default
+
+def handle_command(settings, token: str, chat_id: str, text: str,
+                   runtime_dir: Path | None = None, label: str = "",
+                   profile_via_queue: bool = False) -> bool:
+    """
+    Ejecuta un comando de texto del bot sobre la cámara cuyo RUNTIME_DIR es runtime_dir
+    (None = la del proceso). label se antepone a las respuestas (multi-cámara).
+    profile_via_queue=True encola /profile para que lo ejecute el proceso de la cámara.
+    Devuelve False si el texto no es un comando conocido.
+    """
+    low = text.lower()
+    parts = text.split()
+    tag = f"[{label}] " if label else ""
+    if low.startswith("/arm"):
+        set_armed(True, runtime_dir)
+        send_text(token, chat_id, f"{tag}🔒 Sistema ARMADO.")
+    elif low.startswith("/disarm"):
+        set_armed(False, runtime_dir)
+        send_text(token, chat_id, f"{tag}🔓 Sistema DESARMADO.")
+    elif low.startswith("/status"):
+        status = "ARMADO 🔒" if is_armed(runtime_dir) else "DESARMADO 🔓"
+        send_text(token, chat_id, f"{tag}Estado: {status}")
+    elif low.startswith("/metrics"):
+        m = read_metrics(runtime_dir)
+        if m is None:
+            send_text(token, chat_id, f"{tag}⚠️ Aún no hay métricas (METRICS_INTERVAL_SEC=0 o visor parado).")
+        else:
+            send_text(token, chat_id, tag + format_metrics(m))
+    elif low.startswith("/snapshot"):
+        p = _latest_snapshot_path(runtime_dir)
+        img = _read_snapshot_with_retries(p)
+        if img is not None:
+            send_photo_bgr(token, chat_id, img, caption=f"{tag}📸 Snapshot")
+        else:
+            send_text(token, chat_id, f"{tag}⚠️ No se pudo leer el snapshot en {p} (cv2.imread=None).")
+    elif low.startswith("/clip"):
+        # Formato: /clip N   (N en segundos, entero o float; por defecto 10 s)
+        dur = _parse_seconds(parts, 10.0, 1.0)
+        cmd = {
+            "type": "force_clip",
+            "duration_sec": dur,
+            "ts": time.time()
+        }
+        _enqueue_command(cmd, runtime_dir)
+        send_text(token, chat_id, f"{tag}🎬 Clip forzado: {dur:.1f} s (con preroll).")
+    elif low.startswith("/cut"):
+        # Formato: /cut M [N]  → N s (por defecto 60) desde hace M minutos (grabación continua)
+        try:
+            ago_min = max(0.0, float(parts[1].replace(",", ".")))
+        except Exception:
+            send_text(token, chat_id, f"{tag}Uso: /cut M [N]  (N segundos desde hace M minutos)")
+            return True
+        dur = 60.0
+        if len(parts) >= 3:
+            try:
+                dur = max(1.0, float(parts[2].replace(",", ".")))
+            except Exception:
+                pass
+        _enqueue_command({"type": "cut", "start_ts": time.time() - ago_min * 60.0,
+                          "duration_sec": dur, "ts": time.time()}, runtime_dir)
+        send_text(token, chat_id, f"{tag}✂️ Corte de {dur:.0f} s desde hace {ago_min:g} min solicitado.")
+    elif low.startswith("/heatmap"):
+        # Mapa de calor acumulado sobre el último frame + zonas candidatas a máscara
+        _send_heatmap(settings, token, chat_id, runtime_dir, tag)
+    elif low.startswith("/sheets"):
+        # Formato: /sheets [AAAA-MM-DD|ayer]  → hojas de contactos de los clips del día
+        _send_day_sheets(settings, token, chat_id, parts, runtime_dir, tag)
+    elif low.startswith("/set"):
+        # Formato: /set CLAVE VALOR  (sin VALOR se quita el cambio y vuelve el de .env)
+        # Lo valida y aplica el proceso de la cámara, que responde con el resultado
+        if len(parts) < 2:
+            send_text(token, chat_id, f"{tag}Uso: /set CLAVE VALOR  (p.ej. /set THRESH 20; "
+                                      f"/set THRESH quita el cambio)")
+            return True
+        value = " ".join(parts[2:]) if len(parts) >= 3 else None
+        _enqueue_command({"type": "set", "key": parts[1], "value": value, "chat_id": chat_id,
+                          "ts": time.time()}, runtime_dir)
+    elif low.startswith("/profile"):
+        # Formato: /profile N   (N en segundos; por defecto PROFILE_DEFAULT_SEC)
+        dur = _parse_seconds(parts, float(getattr(settings, "PROFILE_DEFAULT_SEC", 30.0)), 1.0)
+        if profile_via_queue:
+            _enqueue_command({"type": "profile", "duration_sec": dur, "chat_id": chat_id,
+                              "ts": time.time()}, runtime_dir)
+            send_text(token, chat_id, f"{tag}⏱ Perfilado de {dur:.0f} s solicitado.")
+            return True
+        on_done = None
+        if getattr(settings, "PROFILE_SEND_SUMMARY", True):
+            on_done = lambda rep, c=chat_id: send_text(token, c, (tag + rep.summary())[:4000])
+        if start_profile(dur, on_done=on_done):
+            send_text(token, chat_id, f"{tag}⏱ Perfilando {dur:.0f} s… (resultado en RUNTIME_DIR)")
+        else:
+            send_text(token, chat_id, f"{tag}⚠️ Ya hay un perfilado en curso.")
+    else:
+        return False
+    return True
+
+def _bot_config(settings):
+    """Devuelve (token, allowed_chat) o None si el bot está desactivado."""
     allow_cmds = os.getenv("ALLOW_TG_COMMANDS", "false").lower() == "true"
     if not allow_cmds:
         print("[BOT] ALLOW_TG_COMMANDS=false -> bot desactivado.")
-        return
+        return None
     token = os.getenv("TELEGRAM_BOT_TOKEN") or getattr(settings, "TG_BOT_TOKEN", None)
     if not token:
         print("[BOT] Falta TELEGRAM_BOT_TOKEN -> bot desactivado.")
-        return
-
+        return None
     allowed_chat = (os.getenv("TELEGRAM_CHAT_ID", "").strip()
                     or str(getattr(settings, "TG_CHAT_ID", "") or "")).strip()
+    return token, allowed_chat
+
+def process_update(upd: dict, token: str, allowed_chat: str,
+                   handler: Callable[[str, str, str], None]) -> None:
+    """Filtra un update de Telegram (chat permitido, solo texto) y lo pasa al handler."""
+    msg = upd.get("message") or upd.get("edited_message")
+    if not msg or "text" not in msg:
+        return
+    chat_id = str(msg["chat"]["id"]).strip()
+    text = (msg["text"] or "").strip()
+    if allowed_chat and chat_id != allowed_chat:
+        return
+    handler(token, chat_id, text)
 
-    ensure_initial_state()
+def _loop(settings, token: str, allowed_chat: str,
+          handler: Callable[[str, str, str], None]) -> None:
     print(f"[BOT] Poller activo. RUNTIME={_runtime_dir()} allowed_chat={allowed_chat or '*'}")
 
     offset = None
@@ -120,54 +311,31 @@ def _loop(settings) -> None:
             updates = _get_updates(token, offset)
             for upd in updates:
                 offset = upd["update_id"] + 1
-                msg = upd.get("message") or upd.get("edited_message")
-                if not msg or "text" not in msg:
-                    continue
-                chat_id = str(msg["chat"]["id"]).strip()
-                text = (msg["text"] or "").strip()
-
-                if allowed_chat and chat_id != allowed_chat:
-                    continue
-
-                low = text.lower()
-                if low.startswith("/arm"):
-                    set_armed(True)
-                    send_text(token, chat_id, "🔒 Sistema ARMADO.")
-                elif low.startswith("/disarm"):
-                    set_armed(False)
-                    send_text(token, chat_id, "🔓 Sistema DESARMADO.")
-                elif low.startswith("/status"):
-                    status = "ARMADO 🔒" if is_armed() else "DESARMADO 🔓"
-                    send_text(token, chat_id, f"Estado: {status}")
-                elif low.startswith("/snapshot"):
-                    p = _latest_snapshot_path()
-                    img = _read_snapshot_with_retries(p)
-                    if img is not None:
-                        send_photo_bgr(token, chat_id, img, caption="📸 Snapshot")
-                    else:
-                        send_text(token, chat_id, f"⚠️ No se pudo leer el snapshot en {p} (cv2.imread=None).")
-                elif low.startswith("/clip"):
-                    # Formato: /clip N   (N en segundos, entero o float)
-                    parts = text.split()
-                    dur = 10.0  # por defecto 10 s
-                    if len(parts) >= 2:
-                        try:
-                            dur = float(parts[1].replace(",", "."))
-                            if dur <= 0:
-                                dur = 1.0
-                        except Exception:
-                            pass
-                    cmd = {
-                        "type": "force_clip",
-                        "duration_sec": dur,
-                        "ts": time.time()
-                    }
-                    _enqueue_command(cmd)
-                    send_text(token, chat_id, f"🎬 Clip forzado: {dur:.1f} s (con preroll).")
+                process_update(upd, token, allowed_chat, handler)
         except Exception as e:
             print(f"[BOT] loop error: {e}")
             time.sleep(1)
 
-def start_poller(settings) -> None:
-    t = threading.Thread(target=_loop, args=(settings,), daemon=True)
+def start_poller(settings, handler: Optional[Callable[[str, str, str], None]] = None) -> None:
+    """
+    Arranca el bot: webhook si BOT_MODE=webhook (y se puede registrar), si no long polling.
+    handler(token, chat_id, text) permite enrutar los comandos (p.ej. el supervisor
+    multi-cámara); por defecto se aplican a la cámara de este proceso.
+    """
+    cfg = _bot_config(settings)
+    if cfg is None:
+        return
+    token, allowed_chat = cfg
+    if handler is None:
+        ensure_initial_state()
+        handler = lambda tok, chat_id, text: handle_command(settings, tok, chat_id, text)
+
+    if getattr(settings, "BOT_MODE", "polling") == "webhook":
+        from app.bot.webhook import start_webhook
+        if start_webhook(settings, token, allowed_chat, handler):
+            return
+        print("[BOT] Webhook no disponible → long polling.")
+
+    t = threading.Thread(target=_loop, args=(settings, token, allowed_chat, handler),
+                         name="bot-poller", daemon=True)
     t.start()
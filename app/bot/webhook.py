@@ -0,0 +1,117 @@
+# receptor webhook de Telegram (alternativa al long polling)
+
+from __future__ import annotations
+import hmac
+import json
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+
+from app.telegram.client import api_url
+
+_SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def _telegram_call(token: str, method: str, payload: dict) -> bool:
+    from app.bot.poller import _http
+    try:
+        r = _http().post(api_url(token, method), json=payload, timeout=15)
+        data = r.json()
+        if data.get("ok"):
+            return True
+        print(f"[WEBHOOK] {method} fallo: {data}")
+    except Exception as e:
+        print(f"[WEBHOOK] {method} error: {e}")
+    return False
+
+
+def _make_handler(path: str, secret: str, token: str, allowed_chat: str,
+                  handler: Callable[[str, str, str], None]):
+    from app.bot.poller import process_update
+
+    seen: deque = deque(maxlen=256)  # Telegram reintenta: deduplicar por update_id
+    seen_lock = threading.Lock()
+
+    class _Handler(BaseHTTPRequestHandler):
+        def _reply(self, code: int) -> None:
+            self.send_response(code)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def do_POST(self):
+            if self.path.split("?", 1)[0] != path:
+                self._reply(404)
+                return
+            got = self.headers.get(_SECRET_HEADER, "")
+            if secret and not hmac.compare_digest(got, secret):
+                self._reply(403)
+                return
+            try:
+                length = int(self.headers.get("Content-Length", "0"))
+                upd = json.loads(self.rfile.read(length).decode("utf-8"))
+            except Exception:
+                self._reply(400)
+                return
+            # Responder YA: Telegram no espera a que se ejecute el comando
+            self._reply(200)
+
+            uid = upd.get("update_id")
+            with seen_lock:
+                if uid in seen:
+                    return
+                seen.append(uid)
+            try:
+                process_update(upd, token, allowed_chat, handler)
+            except Exception as e:
+                print(f"[WEBHOOK] Error procesando update: {e}")
+
+        def log_message(self, fmt, *args):
+            pass  # sin log por petición
+
+    return _Handler
+
+
+def start_webhook(settings, token: str, allowed_chat: str,
+                  handler: Callable[[str, str, str], None]) -> bool:
+    """
+    Levanta un servidor HTTP local que recibe los updates por POST (verificando la
+    cabecera secreta) y registra el webhook en Telegram si BOT_WEBHOOK_URL está definido
+    (la URL pública debe ser HTTPS, típicamente un proxy inverso hacia este puerto).
+    Devuelve False si no se pudo arrancar (el llamador cae a long polling); antes borra
+    el webhook que pudiera quedar registrado, o getUpdates respondería 409.
+    """
+    listen = getattr(settings, "BOT_WEBHOOK_LISTEN", "0.0.0.0:8443")
+    path = "/" + getattr(settings, "BOT_WEBHOOK_PATH", "tg-webhook").strip("/")
+    secret = getattr(settings, "BOT_WEBHOOK_SECRET", "")
+    public_url = getattr(settings, "BOT_WEBHOOK_URL", "")
+    if not secret:
+        print("[WEBHOOK] Falta BOT_WEBHOOK_SECRET (obligatorio para verificar a Telegram).")
+        _telegram_call(token, "deleteWebhook", {})
+        return False
+
+    host, _, port = listen.rpartition(":")
+    try:
+        server = ThreadingHTTPServer((host or "0.0.0.0", int(port)),
+                                     _make_handler(path, secret, token, allowed_chat, handler))
+        server.daemon_threads = True
+    except Exception as e:
+        print(f"[WEBHOOK] No se pudo escuchar en {listen}: {e}")
+        _telegram_call(token, "deleteWebhook", {})
+        return False
+
+    if public_url:
+        ok = _telegram_call(token, "setWebhook", {
+            "url": public_url.rstrip("/") + path,
+            "secret_token": secret,
+            "allowed_updates": ["message", "edited_message"],
+        })
+        if not ok:
+            server.server_close()
+            _telegram_call(token, "deleteWebhook", {})
+            return False
+
+    threading.Thread(target=server.serve_forever, name="bot-webhook", daemon=True).start()
+    print(f"[WEBHOOK] Escuchando en http://{listen}{path} allowed_chat={allowed_chat or '*'}"
+          + (f" (registrado en {public_url})" if public_url else " (sin setWebhook)"))
+    return True
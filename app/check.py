@@ -0,0 +1,120 @@
+# comprobación rápida de configuración y conectividad (motion_recorder.py --check)
+
+from __future__ import annotations
+import os
+import time
+from pathlib import Path
+from typing import Optional
+
+from app.common.metrics import BootTimer
+
+
+def _line(ok: Optional[bool], what: str, t0: float) -> None:
+    mark = "✅" if ok else ("❌" if ok is False else "—")
+    print(f"[CHECK] {mark} {what} ({time.perf_counter() - t0:.2f} s)")
+
+
+def _check_telegram(token: str, chat_id: str) -> bool:
+    """getMe (token) y getChat (chat): no envía nada."""
+    import requests
+    from app.telegram.client import api_url
+    t0 = time.perf_counter()
+    try:
+        r = requests.get(api_url(token, "getMe"), timeout=10)
+        me = r.json().get("result") or {}
+        if not r.ok:
+            _line(False, f"Telegram: token rechazado (HTTP {r.status_code})", t0)
+            return False
+        r = requests.get(api_url(token, "getChat"), params={"chat_id": chat_id}, timeout=10)
+        if not r.ok:
+            _line(False, f"Telegram: bot @{me.get('username', '?')} sin acceso al chat {chat_id} (HTTP {r.status_code})", t0)
+            return False
+        _line(True, f"Telegram: bot @{me.get('username', '?')}, chat {chat_id}", t0)
+        return True
+    except Exception as e:
+        _line(False, f"Telegram: {e}", t0)
+        return False
+
+
+def run_check(boot: Optional[BootTimer] = None) -> bool:
+    """
+    Sin entrar en el bucle ni enviar mensajes:
+      - .env + overrides.json válidos
+      - RUNTIME_DIR y carpeta de clips escribibles
+      - base del snapshot (fija, caché o descubrimiento redir/html; Selenium no se prueba)
+      - un frame descargado y decodificado
+      - token y chat de Telegram (si está configurado)
+    Imprime una línea por paso y los tiempos de arranque; True si todo fue bien.
+    """
+    boot = boot or BootTimer()
+    ok_all = True
+
+    t0 = time.perf_counter()
+    try:
+        from app.config import load_settings, ConfigReloader
+        from app.run import _runtime_dir
+        settings = load_settings()
+        runtime = _runtime_dir()
+        settings = ConfigReloader(settings, runtime).initial()
+    except Exception as e:
+        _line(False, f"Configuración: {e}", t0)
+        return False
+    _line(True, f"Configuración{' de ' + settings.CAMERA_NAME if settings.CAMERA_NAME else ''}", t0)
+    boot.mark("config")
+
+    t0 = time.perf_counter()
+    clip_dir = Path(settings.CLIP_DIR) if os.path.isabs(settings.CLIP_DIR) else (runtime / settings.CLIP_DIR)
+    try:
+        for d in (runtime, clip_dir):
+            d.mkdir(parents=True, exist_ok=True)
+            probe = d / ".check.tmp"
+            probe.write_bytes(b"ok")
+            probe.unlink()
+        _line(True, f"Escritura en {runtime} y {clip_dir}", t0)
+    except Exception as e:
+        _line(False, f"Escritura: {e}", t0)
+        ok_all = False
+
+    from app.state import RuntimeState
+    from app.discovery.cache import load_discovery
+    from app.net.snapshot import fetch_frame
+    state = RuntimeState(snapshot_base=settings.SNAPSHOT_URL_INIT, snapshot_cookie=settings.SNAPSHOT_COOKIE)
+    t0 = time.perf_counter()
+    origin = "SNAPSHOT_URL"
+    if not state.snapshot_base:
+        cached = load_discovery(settings.SNAPSHOT_HOME, settings.DISCOVERY_CACHE_TTL_SEC)
+        if cached:
+            origin = "caché"
+            state.snapshot_base, state.snapshot_cookie = cached[0], cached[1] or state.snapshot_cookie
+        else:
+            origin = "descubrimiento"
+            from app.discovery.flow import discover_snapshot_base
+            if not discover_snapshot_base(settings, state, prefer_selenium=False):
+                hint = " (la cámara puede necesitar Selenium: no se prueba en --check)" if settings.USE_SELENIUM else ""
+                _line(False, f"Base del snapshot: no encontrada desde {settings.SNAPSHOT_HOME or '(sin SNAPSHOT_HOME)'}{hint}", t0)
+                ok_all = False
+    if state.snapshot_base:
+        _line(True, f"Base del snapshot ({origin}): {state.snapshot_base}", t0)
+        boot.mark("descubrimiento")
+        t0 = time.perf_counter()
+        res = fetch_frame(state.snapshot_base, settings.SNAPSHOT_REFERER, state.snapshot_cookie,
+                          timeout=settings.FETCH_TIMEOUT_MAX_SEC)
+        boot.mark("primer frame")
+        if res.ok:
+            h, w = res.frame.shape[:2]
+            lm = "con Last-Modified" if res.times.last_modified is not None else "sin Last-Modified"
+            _line(True, f"Frame {w}x{h}, {len(res.data) // 1024} KB en {1000 * res.latency:.0f} ms ({lm})", t0)
+        else:
+            _line(False, f"Frame: fallo {res.kind}" + (f" HTTP {res.status}" if res.status else ""), t0)
+            ok_all = False
+
+    t0 = time.perf_counter()
+    from app.telegram.client import enabled
+    if enabled(settings.TG_BOT_TOKEN, settings.TG_CHAT_ID):
+        ok_all = _check_telegram(settings.TG_BOT_TOKEN, settings.TG_CHAT_ID) and ok_all
+    else:
+        _line(None, "Telegram deshabilitado (TG_BOT_TOKEN / TG_CHAT_ID vacíos)", t0)
+
+    print(f"[BOOT] {boot.report()}")
+    print(f"[CHECK] {'Todo correcto' if ok_all else 'Hay fallos'}")
+    return ok_all
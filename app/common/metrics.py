@@ -0,0 +1,184 @@
+from __future__ import annotations
+import os
+import json
+import time
+from collections import deque
+from pathlib import Path
+from typing import Deque, Dict, Optional
+
+
+class StageTimer:
+    """
+    Tiempos por etapa del bucle (media exponencial, en ms).
+    Uso:  t.start() … t.lap("fetch") … t.lap("detect") …
+    Cada lap() mide desde el lap anterior (o desde start()).
+    """
+    def __init__(self, alpha: float = 0.1):
+        self.alpha = min(1.0, max(0.01, float(alpha)))
+        self._ema: Dict[str, float] = {}
+        self._t = time.perf_counter()
+
+    def start(self) -> None:
+        self._t = time.perf_counter()
+
+    def lap(self, name: str) -> float:
+        now = time.perf_counter()
+        dt = now - self._t
+        self._t = now
+        self.add(name, dt)
+        return dt
+
+    def add(self, name: str, seconds: float) -> None:
+        ms = 1000.0 * seconds
+        prev = self._ema.get(name)
+        self._ema[name] = ms if prev is None else prev * (1 - self.alpha) + ms * self.alpha
+
+    def snapshot(self) -> Dict[str, float]:
+        return {k: round(v, 2) for k, v in self._ema.items()}
+
+
+class BootTimer:
+    """
+    Fases del arranque para el informe [BOOT] y /metrics. t0 = inicio del proceso
+    (motion_recorder.py lo toma antes de importar nada); cada mark() cuenta desde la
+    marca anterior.
+    """
+    def __init__(self, t0: Optional[float] = None):
+        self.t0 = time.perf_counter() if t0 is None else float(t0)
+        self._t = self.t0
+        self.phases: Dict[str, float] = {}
+
+    def mark(self, name: str) -> float:
+        now = time.perf_counter()
+        dt = now - self._t
+        self._t = now
+        self.phases[name] = self.phases.get(name, 0.0) + dt
+        return dt
+
+    def total(self) -> float:
+        return self._t - self.t0
+
+    def report(self) -> str:
+        parts = ", ".join(f"{k} {v:.2f} s" for k, v in self.phases.items())
+        return f"{parts} → total {self.total():.2f} s"
+
+    def snapshot(self) -> Dict[str, float]:
+        return dict({k: round(v, 3) for k, v in self.phases.items()}, total=round(self.total(), 3))
+
+
+class LatencyStats:
+    """Distribución de una latencia (últimas window muestras, en s) → percentiles en ms."""
+    def __init__(self, window: int = 500):
+        self._v: Deque[float] = deque(maxlen=max(10, int(window)))
+        self.count = 0
+
+    def add(self, seconds: float) -> None:
+        self._v.append(max(0.0, float(seconds)))
+        self.count += 1
+
+    def snapshot(self) -> Optional[dict]:
+        if not self._v:
+            return None
+        s = sorted(self._v)
+        pick = lambda q: round(1000 * s[min(len(s) - 1, int(round(q * (len(s) - 1))))], 1)
+        return {"n": self.count, "p50_ms": pick(0.50), "p95_ms": pick(0.95),
+                "p99_ms": pick(0.99), "max_ms": round(1000 * s[-1], 1)}
+
+
+# === métricas del proceso de cámara → RUNTIME_DIR/metrics.json (para /metrics) ===
+
+def _runtime_dir() -> Path:
+    raw = os.getenv("RUNTIME_DIR", "./runtime")
+    p = Path(raw).expanduser().resolve()
+    p.mkdir(parents=True, exist_ok=True)
+    return p
+
+def _metrics_path(runtime_dir: Optional[Path] = None) -> Path:
+    return (runtime_dir or _runtime_dir()) / "metrics.json"
+
+def write_metrics(payload: dict, runtime_dir: Optional[Path] = None) -> None:
+    """Escritura atómica (.tmp → os.replace); un fallo solo se ignora."""
+    path = _metrics_path(runtime_dir)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    try:
+        tmp.write_text(json.dumps(payload, ensure_ascii=False, indent=1), encoding="utf-8")
+        os.replace(tmp, path)
+    except Exception:
+        try:
+            tmp.unlink(missing_ok=True)
+        except Exception:
+            pass
+
+def read_metrics(runtime_dir: Optional[Path] = None) -> Optional[dict]:
+    path = _metrics_path(runtime_dir)
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except Exception:
+        return None
+
+def format_metrics(m: dict) -> str:
+    """Resumen legible de metrics.json para el bot."""
+    age = time.time() - float(m.get("ts", 0))
+    lines = [f"Métricas (hace {age:.0f} s): {m.get('fps', 0):.1f} fps"]
+    timings = m.get("timings") or {}
+    if timings:
+        lines.append("Etapas (ms): " + ", ".join(f"{k}={v:.1f}" for k, v in timings.items()))
+    fetch = m.get("fetch") or {}
+    if fetch:
+        lines.append(f"Descarga: {fetch.get('state')} p50={fetch.get('p50_ms')} ms "
+                     f"p95={fetch.get('p95_ms')} ms timeout={fetch.get('timeout_sec')} s")
+    lat = m.get("latency") or {}
+    names = {"capture_to_detect": "captura→detección", "detect_to_alert": "detección→alerta entregada",
+             "server_stale": "antigüedad en el servidor"}
+    parts = [f"{names.get(k, k)} p50={v['p50_ms']:.0f} p95={v['p95_ms']:.0f} p99={v['p99_ms']:.0f} (n={v['n']})"
+             for k, v in lat.items() if v]
+    if parts:
+        lines.append("Latencia (ms): " + "; ".join(parts))
+    boot = m.get("boot")
+    if boot:
+        lines.append("Arranque (s): " + ", ".join(f"{k}={v:.2f}" for k, v in boot.items()))
+    motion = m.get("motion")
+    if motion:
+        auto = motion.get("auto")
+        txt = f"Detección: thresh={motion.get('thresh')} min_area={motion.get('min_area')}"
+        if auto:
+            txt += (f" (auto: ruido={auto.get('noise_floor')} blob={auto.get('noise_area')}"
+                    f" muestras={auto.get('samples')})")
+        levels = motion.get("levels") or {}
+        if levels.get("quiet") or levels.get("roi"):
+            n = max(1, sum(levels.values()))
+            txt += (f"; grueso→fino: {100 * levels.get('quiet', 0) / n:.0f}% sin movimiento, "
+                    f"{100 * levels.get('roi', 0) / n:.0f}% por regiones")
+        lines.append(txt)
+    tracks = m.get("tracks")
+    if tracks:
+        lines.append(f"Pistas: {tracks.get('confirmed_active', 0)} activas confirmadas, "
+                     f"{tracks.get('confirmed', 0)} confirmadas de {tracks.get('created', 0)} creadas")
+    cls = m.get("classify")
+    if cls:
+        counts = ", ".join(f"{k}={v}" for k, v in (cls.get("counts") or {}).items())
+        lines.append(f"Clasificación ({cls.get('backend')}): {counts}; enviados={cls.get('submitted', 0)} "
+                     f"caché zona={cls.get('region_hits', 0)} sin presupuesto={cls.get('skipped_budget', 0)}")
+    light = m.get("lighting")
+    if light:
+        lines.append(f"Cambios de luz: {light.get('events', 0)} eventos, "
+                     f"{light.get('frames_suppressed', 0)} frames filtrados, "
+                     f"alertas evitadas={light.get('alerts_avoided', 0)}, "
+                     f"clips evitados={light.get('clips_avoided', 0)}")
+    heat = m.get("heatmap")
+    if heat:
+        lines.append(f"Mapa de calor: {heat.get('samples', 0)} muestras, actividad media "
+                     f"{(heat.get('mean_activity') or 0) * 100:.1f}%, zonas candidatas={heat.get('zones', 0)}")
+    tc = m.get("transcode")
+    if tc:
+        lines.append(f"Transcodificación: {tc.get('done', 0)} hechas (x{tc.get('ratio')}, "
+                     f"{tc.get('avg_sec')} s de media, {tc.get('saved_mb')} MB ahorrados), "
+                     f"fallos={tc.get('failed', 0)} en cola={tc.get('pending', 0)}")
+    cfg = m.get("config")
+    if cfg and (cfg.get("reloads") or cfg.get("overrides") or cfg.get("pending_restart")):
+        ov = ", ".join(f"{k}={v}" for k, v in (cfg.get("overrides") or {}).items()) or "ninguno"
+        txt = f"Config: {cfg.get('reloads', 0)} recargas, /set: {ov}"
+        if cfg.get("pending_restart"):
+            txt += f"; pendiente de reinicio: {', '.join(cfg['pending_restart'])}"
+        lines.append(txt)
+    return "\n".join(lines)
@@ -0,0 +1,160 @@
+from __future__ import annotations
+import os
+import sys
+import time
+import signal
+import threading
+from pathlib import Path
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+# Perfilado bajo demanda (muestreo de pilas de TODOS los hilos).
+# No requiere reiniciar el proceso: se activa con /profile N o con SIGUSR1.
+
+_MAX_PROFILE_SEC = 300.0
+_lock = threading.Lock()
+_running = False
+
+
+def _runtime_dir() -> Path:
+    raw = os.getenv("RUNTIME_DIR", "./runtime")
+    p = Path(raw).expanduser().resolve()
+    p.mkdir(parents=True, exist_ok=True)
+    return p
+
+
+def _frame_label(frame) -> str:
+    co = frame.f_code
+    return f"{os.path.basename(co.co_filename)}:{co.co_name}"
+
+
+@dataclass
+class ProfileReport:
+    """Resultado de un perfilado: pilas colapsadas y contadores por función."""
+    duration_sec: float
+    samples: int
+    stacks: Counter = field(default_factory=Counter)      # "hilo;f1;f2;..." -> n
+    self_counts: Counter = field(default_factory=Counter)  # función en la cima -> n
+    total_counts: Counter = field(default_factory=Counter)  # función en la pila -> n
+    path: Optional[Path] = None
+
+    def summary(self, top: int = 12) -> str:
+        """Resumen de texto con las funciones más calientes (propio / inclusivo)."""
+        n = max(1, self.samples)
+        lines = [f"⏱ Perfil {self.duration_sec:.1f} s, {self.samples} muestras"]
+        if self.path:
+            lines.append(f"Fichero: {self.path.name}")
+        lines.append("— Tiempo propio —")
+        for name, c in self.self_counts.most_common(top):
+            lines.append(f"{100.0 * c / n:5.1f}%  {name}")
+        lines.append("— Tiempo inclusivo —")
+        for name, c in self.total_counts.most_common(top):
+            lines.append(f"{100.0 * c / n:5.1f}%  {name}")
+        return "\n".join(lines)
+
+
+class SamplingProfiler:
+    """
+    Muestrea sys._current_frames() cada `interval` segundos.
+    Coste despreciable cuando no está activo (no instala trazas).
+    """
+    def __init__(self, interval: float = 0.005):
+        self.interval = max(0.001, float(interval))
+
+    def run(self, duration_sec: float) -> ProfileReport:
+        duration = min(_MAX_PROFILE_SEC, max(0.5, float(duration_sec)))
+        me = threading.get_ident()
+        rep = ProfileReport(duration_sec=duration, samples=0)
+        t_end = time.perf_counter() + duration
+        while time.perf_counter() < t_end:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                f = frame
+                while f is not None:
+                    stack.append(_frame_label(f))
+                    f = f.f_back
+                if not stack:
+                    continue
+                stack.reverse()
+                thread_name = names.get(ident, str(ident))
+                rep.stacks[";".join([thread_name] + stack)] += 1
+                rep.self_counts[stack[-1]] += 1
+                for name in set(stack):
+                    rep.total_counts[name] += 1
+            rep.samples += 1
+            time.sleep(self.interval)
+        return rep
+
+
+def write_collapsed(rep: ProfileReport, out_dir: Optional[Path] = None) -> Path:
+    """
+    Escribe las pilas en formato 'collapsed' (flamegraph.pl / speedscope)
+    y un .txt con el resumen al lado.
+    """
+    out_dir = out_dir or _runtime_dir()
+    path = out_dir / time.strftime("profile_%Y%m%d_%H%M%S.collapsed")
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, n in rep.stacks.most_common():
+            f.write(f"{stack} {n}\n")
+    rep.path = path
+    try:
+        path.with_suffix(".txt").write_text(rep.summary(top=40), encoding="utf-8")
+    except Exception:
+        pass
+    return path
+
+
+def is_profiling() -> bool:
+    return _running
+
+
+def start_profile(duration_sec: float,
+                  on_done: Optional[Callable[[ProfileReport], None]] = None,
+                  interval: float = 0.005) -> bool:
+    """
+    Lanza un perfilado en segundo plano. Devuelve False si ya hay uno en curso.
+    on_done(report) se llama al terminar (desde el hilo del perfilador).
+    """
+    global _running
+    with _lock:
+        if _running:
+            return False
+        _running = True
+
+    def _worker():
+        global _running
+        try:
+            print(f"[PROF] Perfilando {duration_sec:.1f} s…")
+            rep = SamplingProfiler(interval).run(duration_sec)
+            path = write_collapsed(rep)
+            print(f"[PROF] Perfil guardado → {path} ({rep.samples} muestras)")
+            if on_done:
+                on_done(rep)
+        except Exception as e:
+            print(f"[PROF] ERROR: {e}", file=sys.stderr)
+        finally:
+            with _lock:
+                _running = False
+
+    threading.Thread(target=_worker, name="profiler", daemon=True).start()
+    return True
+
+
+def install_signal_handler(default_sec: float = 30.0) -> bool:
+    """
+    SIGUSR1 → perfilado de default_sec segundos (solo POSIX, hilo principal).
+    Ejemplo: kill -USR1 <pid>
+    """
+    sig = getattr(signal, "SIGUSR1", None)
+    if sig is None or threading.current_thread() is not threading.main_thread():
+        return False
+    try:
+        signal.signal(sig, lambda *_: start_profile(default_sec))
+        return True
+    except Exception as e:
+        print(f"[PROF] No se pudo instalar SIGUSR1: {e}", file=sys.stderr)
+        return False
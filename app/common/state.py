@@ -2,6 +2,7 @@ from __future__ import annotations
 import os
 import json
 from pathlib import Path
+from typing import Optional
 
 def _runtime_dir() -> Path:
     raw = os.getenv("RUNTIME_DIR", "./runtime")
@@ -9,18 +10,19 @@ def _runtime_dir() -> Path:
     p.mkdir(parents=True, exist_ok=True)
     return p
 
-def _state_path() -> Path:
-    return _runtime_dir() / "armed_state.json"
+def _state_path(runtime_dir: Optional[Path] = None) -> Path:
+    return (runtime_dir or _runtime_dir()) / "armed_state.json"
 
-def set_armed(armed: bool) -> None:
+def set_armed(armed: bool, runtime_dir: Optional[Path] = None) -> None:
+    """runtime_dir permite al supervisor multi-cámara tocar el estado de otra cámara."""
     try:
-        _state_path().write_text(json.dumps({"armed": bool(armed)}), encoding="utf-8")
-        print(f"[STATE] set_armed({armed}) -> {_state_path()}")
+        _state_path(runtime_dir).write_text(json.dumps({"armed": bool(armed)}), encoding="utf-8")
+        print(f"[STATE] set_armed({armed}) -> {_state_path(runtime_dir)}")
     except Exception as e:
         print(f"[STATE] ERROR set_armed: {e}")
 
-def is_armed() -> bool:
-    path = _state_path()
+def is_armed(runtime_dir: Optional[Path] = None) -> bool:
+    path = _state_path(runtime_dir)
     if not path.exists():
         return False
     try:
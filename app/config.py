@@ -1,11 +1,15 @@
 from __future__ import annotations
 import os
+import json
+import time
+import threading
 from pathlib import Path
-from dataclasses import dataclass
-from dotenv import load_dotenv
+from dataclasses import dataclass, fields, replace
+from typing import Mapping, Optional
+from dotenv import load_dotenv, dotenv_values
 
-def _getenv_bool(name: str, default: bool) -> bool:
-    v = os.getenv(name, str(default)).strip().lower()
+def _getenv_bool(env: Mapping[str, str], name: str, default: bool) -> bool:
+    v = env.get(name, str(default)).strip().lower()
     return v in ("1", "true", "yes", "y", "on")
 
 def _parse_hex_color(s: str, default=(255, 165, 0)) -> tuple[int, int, int]:
@@ -26,6 +30,9 @@ def _parse_hex_color(s: str, default=(255, 165, 0)) -> tuple[int, int, int]:
 
 @dataclass(frozen=True)
 class Settings:
+    # identidad (modo multi-cámara; vacío en modo cámara única)
+    CAMERA_NAME: str
+
     # fuente
     SNAPSHOT_HOME: str
     SNAPSHOT_URL_INIT: str
@@ -35,87 +42,682 @@ class Settings:
     # discovery
     USE_SELENIUM: bool
     SELENIUM_BROWSER: str
+    SELENIUM_KEEP_ALIVE: bool
+    SELENIUM_MAX_USES: int
+    SELENIUM_MAX_MEM_GROWTH_MB: float
+    DISCOVERY_CACHE_TTL_SEC: float
+    DISCOVERY_SELENIUM_HEAD_START_SEC: float
+    DISCOVERY_TIMEOUT_SEC: float
+
+    # descarga de frames (timeouts adaptativos / breaker)
+    FETCH_TIMEOUT_MIN_SEC: float
+    FETCH_TIMEOUT_MAX_SEC: float
+    FETCH_TIMEOUT_MULT: float
+    FETCH_BACKOFF_BASE_SEC: float
+    FETCH_BACKOFF_MAX_SEC: float
+    MAX_FAILS_BEFORE_REDISCOVER: int
+    BREAKER_COOLDOWN_SEC: float
+    BREAKER_MAX_COOLDOWN_SEC: float
 
     # ventana
     SHOW_WINDOW: bool
     WINDOW_TITLE: str
+    VIEWER_THREADED: bool
+    VIEWER_MAX_FPS: float
+    VIEWER_OVERLAY_TIMINGS: bool
+
+    # vista en vivo HTTP (MJPEG)
+    STREAM_ENABLE: bool
+    STREAM_LISTEN: str
+    STREAM_DRAW_BOXES: bool
+    STREAM_MAX_FPS: float
+    STREAM_TOKEN: str
 
     # telegram
     TG_BOT_TOKEN: str
     TG_CHAT_ID: str
 
+    # bot: long polling (por defecto) o webhook
+    BOT_MODE: str
+    BOT_WEBHOOK_LISTEN: str
+    BOT_WEBHOOK_PATH: str
+    BOT_WEBHOOK_URL: str
+    BOT_WEBHOOK_SECRET: str
+
     # motion
     ENABLE_MOTION: bool
     THRESH: int
     MIN_AREA: int
     PROC_WIDTH: int
     DILATE_ITERS: int
+    COARSE_WIDTH: int
     MERGE_PADDING: int
     BOX_COLOR_BGR: tuple[int, int, int]
     BOX_THICKNESS: int
 
+    # seguimiento de objetos (alertas por pista confirmada)
+    TRACK_ENABLE: bool
+    TRACK_MIN_HITS: int
+    TRACK_MAX_MISSES: int
+    TRACK_IOU: float
+    TRACK_MAX_DIST: float
+
+    # clasificación de recortes (persona/vehículo/animal/otro)
+    CLASSIFY_ENABLE: bool
+    CLASSIFY_BACKEND: str
+    CLASSIFY_MODEL: str
+    CLASSIFY_CONFIG: str
+    CLASSIFY_LABELS: str
+    CLASSIFY_MIN_CONF: float
+    CLASSIFY_WORKERS: int
+    CLASSIFY_MAX_PER_SEC: float
+    CLASSIFY_CACHE_TTL_SEC: float
+    ALERT_CLASSES: str
+    RECORD_CLASSES: str
+
+    # autocalibración de THRESH / MIN_AREA
+    AUTO_CALIBRATE: bool
+    AUTO_THRESH_MIN: int
+    AUTO_THRESH_MAX: int
+    AUTO_MIN_AREA_MIN: int
+    AUTO_MIN_AREA_MAX: int
+    AUTO_THRESH_MARGIN: float
+    AUTO_AREA_MARGIN: float
+    AUTO_CALIBRATE_ALPHA: float
+
+    # filtro de cambios globales de iluminación
+    LIGHT_GATE_ENABLE: bool
+    LIGHT_CHANGED_FRAC: float
+    LIGHT_MEAN_DELTA: float
+    LIGHT_HIST_DIST: float
+    LIGHT_SETTLE_FRAMES: int
+    LIGHT_MAX_SPREAD: float
+
+    # mapa de calor del movimiento y zonas candidatas a máscara
+    HEATMAP_ENABLE: bool
+    HEATMAP_HALFLIFE_MIN: float
+    HEATMAP_SAVE_SEC: float
+    HEATMAP_ZONE_ACTIVITY: float
+    HEATMAP_ZONE_MIN_AREA: float
+
+    # grabación de clips
+    RECORD_ON_MOTION: bool
+    CLIP_DIR: str
+    PRE_ROLL_SEC: float
+    POST_ROLL_SEC: float
+    QUIET_GAP_SEC: float
+    MAX_CLIP_SEC: float
+    MAX_DISK_GB: float
+    VIDEO_FPS: Optional[float]
+    VIDEO_CODEC: str
+    VIDEO_CODEC_CANDIDATES: str
+    VIDEO_CODEC_RT_MARGIN: float
+    TG_SEND_CLIPS: bool
+    TG_CLIP_COOLDOWN_SEC: float
+
+    # variante reducida de los clips para Telegram
+    TRANSCODE_ENABLE: bool
+    TRANSCODE_MAX_MB: float
+    TRANSCODE_MAX_WIDTH: int
+    TRANSCODE_MAX_FPS: float
+    TRANSCODE_TRIM: bool
+    TRANSCODE_TRIM_PAD_SEC: float
+    TRANSCODE_WORKERS: int
+    TRANSCODE_FFMPEG: str
+
+    # miniatura y hoja de contactos de cada clip
+    THUMB_ENABLE: bool
+    THUMB_WIDTH: int
+    THUMB_SHEET_FRAMES: int
+    THUMB_SHEET_COLS: int
+
+    # grabación continua (segmentos + índice de movimiento)
+    RECORD_CONTINUOUS: bool
+    SEGMENT_SEC: float
+    SEGMENT_DIR: str
+    SEGMENT_RETAIN_QUIET_HOURS: float
+    SEGMENT_RETAIN_EVENT_HOURS: float
+    SEGMENT_MAX_GB: float
+    SEGMENT_FFMPEG: str
+    SEGMENT_FFMPEG_CODEC: str
+
     # alertas TG movimiento
     SEND_TG_ON_MOTION: bool
     MOTION_ALERT_COOLDOWN_SEC: int
     PREVIEW_MAX_WIDTH: int
     PHOTO_JPEG_QUALITY: int
+    ALERT_BURST_ENABLE: bool
+    ALERT_BURST_FRAMES: int
+    ALERT_BURST_WINDOW_SEC: float
+    ALERT_BURST_PRE_SEC: float
+    ALERT_BURST_MIN_GAP_SEC: float
+
+    # diagnóstico
+    PROFILE_DEFAULT_SEC: float
+    PROFILE_SEND_SUMMARY: bool
+    METRICS_INTERVAL_SEC: float
+    CONFIG_WATCH_SEC: float
+
+def _env_path() -> Path:
+    return Path(__file__).resolve().parent.parent / ".env"
+
+def load_settings(env: Optional[Mapping[str, str]] = None) -> Settings:
+    """
+    Sin env: carga .env (sin pisar el entorno del proceso) y lee os.environ.
+    Con env: lee solo de ese diccionario (recarga en caliente / validación de /set).
+    """
+    if env is None:
+        env_path = _env_path()
+        if env_path.exists():
+            load_dotenv(dotenv_path=env_path)
+        else:
+            load_dotenv()
+        env = os.environ
+    _get = env.get
+
+    CAMERA_NAME = _get("CAMERA_NAME", "").strip()
+    SNAPSHOT_HOME = _get("SNAPSHOT_HOME", "").strip()
+    SNAPSHOT_URL_INIT = _get("SNAPSHOT_URL", "").strip()
+    SNAPSHOT_REFERER = _get("SNAPSHOT_REFERER", SNAPSHOT_HOME).strip()
+    SNAPSHOT_COOKIE = _get("SNAPSHOT_COOKIE", "").strip()
+
+    USE_SELENIUM = _getenv_bool(env, "USE_SELENIUM_DISCOVERY", True)
+    SELENIUM_BROWSER = _get("SELENIUM_BROWSER", "chrome").strip()
+    SELENIUM_KEEP_ALIVE = _getenv_bool(env, "SELENIUM_KEEP_ALIVE", False)
+    SELENIUM_MAX_USES = int(_get("SELENIUM_MAX_USES", "50"))
+    SELENIUM_MAX_MEM_GROWTH_MB = float(_get("SELENIUM_MAX_MEM_GROWTH_MB", "256"))
+    DISCOVERY_CACHE_TTL_SEC = float(_get("DISCOVERY_CACHE_TTL_SEC", "86400"))
+    DISCOVERY_SELENIUM_HEAD_START_SEC = float(_get("DISCOVERY_SELENIUM_HEAD_START_SEC", "2"))
+    DISCOVERY_TIMEOUT_SEC = float(_get("DISCOVERY_TIMEOUT_SEC", "45"))
+
+    FETCH_TIMEOUT_MIN_SEC = float(_get("FETCH_TIMEOUT_MIN_SEC", "1"))
+    FETCH_TIMEOUT_MAX_SEC = float(_get("FETCH_TIMEOUT_MAX_SEC", "8"))
+    FETCH_TIMEOUT_MULT = float(_get("FETCH_TIMEOUT_MULT", "3"))
+    FETCH_BACKOFF_BASE_SEC = float(_get("FETCH_BACKOFF_BASE_SEC", "0.2"))
+    FETCH_BACKOFF_MAX_SEC = float(_get("FETCH_BACKOFF_MAX_SEC", "10"))
+    MAX_FAILS_BEFORE_REDISCOVER = int(_get("MAX_FAILS_BEFORE_REDISCOVER", "3"))
+    BREAKER_COOLDOWN_SEC = float(_get("BREAKER_COOLDOWN_SEC", "5"))
+    BREAKER_MAX_COOLDOWN_SEC = float(_get("BREAKER_MAX_COOLDOWN_SEC", "300"))
+
+    SHOW_WINDOW = _getenv_bool(env, "SHOW_WINDOW", True)
+    WINDOW_TITLE = _get("WINDOW_TITLE", "Webcam (solo vista)").strip()
+    VIEWER_THREADED = _getenv_bool(env, "VIEWER_THREADED", True)
+    VIEWER_MAX_FPS = float(_get("VIEWER_MAX_FPS", "0"))
+    VIEWER_OVERLAY_TIMINGS = _getenv_bool(env, "VIEWER_OVERLAY_TIMINGS", False)
+
+    STREAM_ENABLE = _getenv_bool(env, "STREAM_ENABLE", False)
+    STREAM_LISTEN = _get("STREAM_LISTEN", "0.0.0.0:8080").strip()
+    STREAM_DRAW_BOXES = _getenv_bool(env, "STREAM_DRAW_BOXES", False)
+    STREAM_MAX_FPS = float(_get("STREAM_MAX_FPS", "0"))
+    STREAM_TOKEN = _get("STREAM_TOKEN", "").strip()
+
+    TG_BOT_TOKEN = _get("TG_BOT_TOKEN", "").strip()
+    TG_CHAT_ID = _get("TG_CHAT_ID", "").strip()
+
+    BOT_MODE = _get("BOT_MODE", "polling").strip().lower()
+    BOT_WEBHOOK_LISTEN = _get("BOT_WEBHOOK_LISTEN", "0.0.0.0:8443").strip()
+    BOT_WEBHOOK_PATH = _get("BOT_WEBHOOK_PATH", "tg-webhook").strip()
+    BOT_WEBHOOK_URL = _get("BOT_WEBHOOK_URL", "").strip()
+    BOT_WEBHOOK_SECRET = _get("BOT_WEBHOOK_SECRET", "").strip()
+
+    ENABLE_MOTION = _getenv_bool(env, "ENABLE_MOTION", True)
+    THRESH = int(_get("THRESH", "15"))
+    MIN_AREA = int(_get("MIN_AREA", "1500"))
+    PROC_WIDTH = int(_get("PROC_WIDTH", "320"))
+    DILATE_ITERS = int(_get("DILATE_ITERS", "2"))
+    COARSE_WIDTH = int(_get("COARSE_WIDTH", "80"))
+    MERGE_PADDING = int(_get("MERGE_PADDING", "15"))
+    BOX_COLOR_BGR = _parse_hex_color(_get("BOX_COLOR", "#ffa500"))
+    BOX_THICKNESS = int(_get("BOX_THICKNESS", "2"))
+
+    TRACK_ENABLE = _getenv_bool(env, "TRACK_ENABLE", False)
+    TRACK_MIN_HITS = int(_get("TRACK_MIN_HITS", "3"))
+    TRACK_MAX_MISSES = int(_get("TRACK_MAX_MISSES", "5"))
+    TRACK_IOU = float(_get("TRACK_IOU", "0.2"))
+    TRACK_MAX_DIST = float(_get("TRACK_MAX_DIST", "40"))
+
+    CLASSIFY_ENABLE = _getenv_bool(env, "CLASSIFY_ENABLE", False)
+    CLASSIFY_BACKEND = _get("CLASSIFY_BACKEND", "hog").strip().lower()
+    CLASSIFY_MODEL = _get("CLASSIFY_MODEL", "").strip()
+    CLASSIFY_CONFIG = _get("CLASSIFY_CONFIG", "").strip()
+    CLASSIFY_LABELS = _get("CLASSIFY_LABELS", "").strip()
+    CLASSIFY_MIN_CONF = float(_get("CLASSIFY_MIN_CONF", "0.4"))
+    CLASSIFY_WORKERS = int(_get("CLASSIFY_WORKERS", "1"))
+    CLASSIFY_MAX_PER_SEC = float(_get("CLASSIFY_MAX_PER_SEC", "4"))
+    CLASSIFY_CACHE_TTL_SEC = float(_get("CLASSIFY_CACHE_TTL_SEC", "300"))
+    ALERT_CLASSES = _get("ALERT_CLASSES", "").strip()
+    RECORD_CLASSES = _get("RECORD_CLASSES", "").strip()
+
+    AUTO_CALIBRATE = _getenv_bool(env, "AUTO_CALIBRATE", False)
+    AUTO_THRESH_MIN = int(_get("AUTO_THRESH_MIN", "8"))
+    AUTO_THRESH_MAX = int(_get("AUTO_THRESH_MAX", "40"))
+    AUTO_MIN_AREA_MIN = int(_get("AUTO_MIN_AREA_MIN", "150"))
+    AUTO_MIN_AREA_MAX = int(_get("AUTO_MIN_AREA_MAX", "6000"))
+    AUTO_THRESH_MARGIN = float(_get("AUTO_THRESH_MARGIN", "2.0"))
+    AUTO_AREA_MARGIN = float(_get("AUTO_AREA_MARGIN", "4.0"))
+    AUTO_CALIBRATE_ALPHA = float(_get("AUTO_CALIBRATE_ALPHA", "0.02"))
+
+    LIGHT_GATE_ENABLE = _getenv_bool(env, "LIGHT_GATE_ENABLE", True)
+    LIGHT_CHANGED_FRAC = float(_get("LIGHT_CHANGED_FRAC", "0.5"))
+    LIGHT_MEAN_DELTA = float(_get("LIGHT_MEAN_DELTA", "12"))
+    LIGHT_HIST_DIST = float(_get("LIGHT_HIST_DIST", "0.25"))
+    LIGHT_SETTLE_FRAMES = int(_get("LIGHT_SETTLE_FRAMES", "3"))
+    LIGHT_MAX_SPREAD = float(_get("LIGHT_MAX_SPREAD", "0.2"))
+
+    HEATMAP_ENABLE = _getenv_bool(env, "HEATMAP_ENABLE", False)
+    HEATMAP_HALFLIFE_MIN = float(_get("HEATMAP_HALFLIFE_MIN", "60"))
+    HEATMAP_SAVE_SEC = float(_get("HEATMAP_SAVE_SEC", "60"))
+    HEATMAP_ZONE_ACTIVITY = float(_get("HEATMAP_ZONE_ACTIVITY", "0.15"))
+    HEATMAP_ZONE_MIN_AREA = float(_get("HEATMAP_ZONE_MIN_AREA", "0.002"))
+
+    RECORD_ON_MOTION = _getenv_bool(env, "RECORD_ON_MOTION", False)
+    CLIP_DIR = _get("CLIP_DIR", "clips").strip() or "clips"
+    PRE_ROLL_SEC = float(_get("PRE_ROLL_SEC", "3"))
+    POST_ROLL_SEC = float(_get("POST_ROLL_SEC", "5"))
+    QUIET_GAP_SEC = float(_get("QUIET_GAP_SEC", "2"))
+    MAX_CLIP_SEC = float(_get("MAX_CLIP_SEC", "60"))
+    MAX_DISK_GB = float(_get("MAX_DISK_GB", "2"))
+    _fps = _get("VIDEO_FPS", "").strip()
+    VIDEO_FPS = float(_fps) if _fps not in ("", "None") else None
+    VIDEO_CODEC = _get("VIDEO_CODEC", "mp4v").strip() or "mp4v"
+    VIDEO_CODEC_CANDIDATES = _get("VIDEO_CODEC_CANDIDATES", "").strip()
+    VIDEO_CODEC_RT_MARGIN = float(_get("VIDEO_CODEC_RT_MARGIN", "1.5"))
+    TG_SEND_CLIPS = _getenv_bool(env, "TG_SEND_CLIPS", False)
+    TG_CLIP_COOLDOWN_SEC = float(_get("TG_CLIP_COOLDOWN_SEC", "30"))
+
+    TRANSCODE_ENABLE = _getenv_bool(env, "TRANSCODE_ENABLE", True)
+    TRANSCODE_MAX_MB = float(_get("TRANSCODE_MAX_MB", "45"))
+    TRANSCODE_MAX_WIDTH = int(_get("TRANSCODE_MAX_WIDTH", "854"))
+    TRANSCODE_MAX_FPS = float(_get("TRANSCODE_MAX_FPS", "12"))
+    TRANSCODE_TRIM = _getenv_bool(env, "TRANSCODE_TRIM", True)
+    TRANSCODE_TRIM_PAD_SEC = float(_get("TRANSCODE_TRIM_PAD_SEC", "1"))
+    TRANSCODE_WORKERS = int(_get("TRANSCODE_WORKERS", "1"))
+    TRANSCODE_FFMPEG = _get("TRANSCODE_FFMPEG", "auto").strip()
+    THUMB_ENABLE = _getenv_bool(env, "THUMB_ENABLE", True)
+    THUMB_WIDTH = int(_get("THUMB_WIDTH", "320"))
+    THUMB_SHEET_FRAMES = int(_get("THUMB_SHEET_FRAMES", "9"))
+    THUMB_SHEET_COLS = int(_get("THUMB_SHEET_COLS", "3"))
 
-def load_settings() -> Settings:
-    env_path = Path(__file__).resolve().parent.parent / ".env"
-    if env_path.exists():
-        load_dotenv(dotenv_path=env_path)
-    else:
-        load_dotenv()
-
-    SNAPSHOT_HOME = os.getenv("SNAPSHOT_HOME", "").strip()
-    SNAPSHOT_URL_INIT = os.getenv("SNAPSHOT_URL", "").strip()
-    SNAPSHOT_REFERER = os.getenv("SNAPSHOT_REFERER", SNAPSHOT_HOME).strip()
-    SNAPSHOT_COOKIE = os.getenv("SNAPSHOT_COOKIE", "").strip()
-
-    USE_SELENIUM = _getenv_bool("USE_SELENIUM_DISCOVERY", True)
-    SELENIUM_BROWSER = os.getenv("SELENIUM_BROWSER", "chrome").strip()
-
-    SHOW_WINDOW = _getenv_bool("SHOW_WINDOW", True)
-    WINDOW_TITLE = os.getenv("WINDOW_TITLE", "Webcam (solo vista)").strip()
-
-    TG_BOT_TOKEN = os.getenv("TG_BOT_TOKEN", "").strip()
-    TG_CHAT_ID = os.getenv("TG_CHAT_ID", "").strip()
-
-    ENABLE_MOTION = _getenv_bool("ENABLE_MOTION", True)
-    THRESH = int(os.getenv("THRESH", "15"))
-    MIN_AREA = int(os.getenv("MIN_AREA", "1500"))
-    PROC_WIDTH = int(os.getenv("PROC_WIDTH", "320"))
-    DILATE_ITERS = int(os.getenv("DILATE_ITERS", "2"))
-    MERGE_PADDING = int(os.getenv("MERGE_PADDING", "15"))
-    BOX_COLOR_BGR = _parse_hex_color(os.getenv("BOX_COLOR", "#ffa500"))
-    BOX_THICKNESS = int(os.getenv("BOX_THICKNESS", "2"))
-
-    SEND_TG_ON_MOTION = _getenv_bool("SEND_TG_ON_MOTION", True)
-    MOTION_ALERT_COOLDOWN_SEC = int(os.getenv("MOTION_ALERT_COOLDOWN_SEC", "30"))
-    PREVIEW_MAX_WIDTH = int(os.getenv("PREVIEW_MAX_WIDTH", "640"))
-    PHOTO_JPEG_QUALITY = int(os.getenv("PHOTO_JPEG_QUALITY", "80"))
+    RECORD_CONTINUOUS = _getenv_bool(env, "RECORD_CONTINUOUS", False)
+    SEGMENT_SEC = float(_get("SEGMENT_SEC", "60"))
+    SEGMENT_DIR = _get("SEGMENT_DIR", "segments").strip() or "segments"
+    SEGMENT_RETAIN_QUIET_HOURS = float(_get("SEGMENT_RETAIN_QUIET_HOURS", "24"))
+    SEGMENT_RETAIN_EVENT_HOURS = float(_get("SEGMENT_RETAIN_EVENT_HOURS", "168"))
+    SEGMENT_MAX_GB = float(_get("SEGMENT_MAX_GB", "20"))
+    SEGMENT_FFMPEG = _get("SEGMENT_FFMPEG", "auto").strip()
+    SEGMENT_FFMPEG_CODEC = _get("SEGMENT_FFMPEG_CODEC", "libx264").strip()
+
+    SEND_TG_ON_MOTION = _getenv_bool(env, "SEND_TG_ON_MOTION", True)
+    MOTION_ALERT_COOLDOWN_SEC = int(_get("MOTION_ALERT_COOLDOWN_SEC", "30"))
+    PREVIEW_MAX_WIDTH = int(_get("PREVIEW_MAX_WIDTH", "640"))
+    PHOTO_JPEG_QUALITY = int(_get("PHOTO_JPEG_QUALITY", "80"))
+    ALERT_BURST_ENABLE = _getenv_bool(env, "ALERT_BURST_ENABLE", False)
+    ALERT_BURST_FRAMES = int(_get("ALERT_BURST_FRAMES", "4"))
+    ALERT_BURST_WINDOW_SEC = float(_get("ALERT_BURST_WINDOW_SEC", "3"))
+    ALERT_BURST_PRE_SEC = float(_get("ALERT_BURST_PRE_SEC", "1"))
+    ALERT_BURST_MIN_GAP_SEC = float(_get("ALERT_BURST_MIN_GAP_SEC", "0.3"))
+
+    PROFILE_DEFAULT_SEC = float(_get("PROFILE_DEFAULT_SEC", "30"))
+    PROFILE_SEND_SUMMARY = _getenv_bool(env, "PROFILE_SEND_SUMMARY", True)
+    METRICS_INTERVAL_SEC = float(_get("METRICS_INTERVAL_SEC", "5"))
+    CONFIG_WATCH_SEC = float(_get("CONFIG_WATCH_SEC", "2"))
 
     return Settings(
+        CAMERA_NAME=CAMERA_NAME,
         SNAPSHOT_HOME=SNAPSHOT_HOME,
         SNAPSHOT_URL_INIT=SNAPSHOT_URL_INIT,
         SNAPSHOT_REFERER=SNAPSHOT_REFERER,
         SNAPSHOT_COOKIE=SNAPSHOT_COOKIE,
         USE_SELENIUM=USE_SELENIUM,
         SELENIUM_BROWSER=SELENIUM_BROWSER,
+        SELENIUM_KEEP_ALIVE=SELENIUM_KEEP_ALIVE,
+        SELENIUM_MAX_USES=SELENIUM_MAX_USES,
+        SELENIUM_MAX_MEM_GROWTH_MB=SELENIUM_MAX_MEM_GROWTH_MB,
+        DISCOVERY_CACHE_TTL_SEC=DISCOVERY_CACHE_TTL_SEC,
+        DISCOVERY_SELENIUM_HEAD_START_SEC=DISCOVERY_SELENIUM_HEAD_START_SEC,
+        DISCOVERY_TIMEOUT_SEC=DISCOVERY_TIMEOUT_SEC,
+        FETCH_TIMEOUT_MIN_SEC=FETCH_TIMEOUT_MIN_SEC,
+        FETCH_TIMEOUT_MAX_SEC=FETCH_TIMEOUT_MAX_SEC,
+        FETCH_TIMEOUT_MULT=FETCH_TIMEOUT_MULT,
+        FETCH_BACKOFF_BASE_SEC=FETCH_BACKOFF_BASE_SEC,
+        FETCH_BACKOFF_MAX_SEC=FETCH_BACKOFF_MAX_SEC,
+        MAX_FAILS_BEFORE_REDISCOVER=MAX_FAILS_BEFORE_REDISCOVER,
+        BREAKER_COOLDOWN_SEC=BREAKER_COOLDOWN_SEC,
+        BREAKER_MAX_COOLDOWN_SEC=BREAKER_MAX_COOLDOWN_SEC,
         SHOW_WINDOW=SHOW_WINDOW,
         WINDOW_TITLE=WINDOW_TITLE,
+        VIEWER_THREADED=VIEWER_THREADED,
+        VIEWER_MAX_FPS=VIEWER_MAX_FPS,
+        VIEWER_OVERLAY_TIMINGS=VIEWER_OVERLAY_TIMINGS,
+        STREAM_ENABLE=STREAM_ENABLE,
+        STREAM_LISTEN=STREAM_LISTEN,
+        STREAM_DRAW_BOXES=STREAM_DRAW_BOXES,
+        STREAM_MAX_FPS=STREAM_MAX_FPS,
+        STREAM_TOKEN=STREAM_TOKEN,
         TG_BOT_TOKEN=TG_BOT_TOKEN,
         TG_CHAT_ID=TG_CHAT_ID,
+        BOT_MODE=BOT_MODE,
+        BOT_WEBHOOK_LISTEN=BOT_WEBHOOK_LISTEN,
+        BOT_WEBHOOK_PATH=BOT_WEBHOOK_PATH,
+        BOT_WEBHOOK_URL=BOT_WEBHOOK_URL,
+        BOT_WEBHOOK_SECRET=BOT_WEBHOOK_SECRET,
         ENABLE_MOTION=ENABLE_MOTION,
         THRESH=THRESH,
         MIN_AREA=MIN_AREA,
         PROC_WIDTH=PROC_WIDTH,
         DILATE_ITERS=DILATE_ITERS,
+        COARSE_WIDTH=COARSE_WIDTH,
         MERGE_PADDING=MERGE_PADDING,
         BOX_COLOR_BGR=BOX_COLOR_BGR,
         BOX_THICKNESS=BOX_THICKNESS,
+        TRACK_ENABLE=TRACK_ENABLE,
+        TRACK_MIN_HITS=TRACK_MIN_HITS,
+        TRACK_MAX_MISSES=TRACK_MAX_MISSES,
+        TRACK_IOU=TRACK_IOU,
+        TRACK_MAX_DIST=TRACK_MAX_DIST,
+        CLASSIFY_ENABLE=CLASSIFY_ENABLE,
+        CLASSIFY_BACKEND=CLASSIFY_BACKEND,
+        CLASSIFY_MODEL=CLASSIFY_MODEL,
+        CLASSIFY_CONFIG=CLASSIFY_CONFIG,
+        CLASSIFY_LABELS=CLASSIFY_LABELS,
+        CLASSIFY_MIN_CONF=CLASSIFY_MIN_CONF,
+        CLASSIFY_WORKERS=CLASSIFY_WORKERS,
+        CLASSIFY_MAX_PER_SEC=CLASSIFY_MAX_PER_SEC,
+        CLASSIFY_CACHE_TTL_SEC=CLASSIFY_CACHE_TTL_SEC,
+        ALERT_CLASSES=ALERT_CLASSES,
+        RECORD_CLASSES=RECORD_CLASSES,
+        AUTO_CALIBRATE=AUTO_CALIBRATE,
+        AUTO_THRESH_MIN=AUTO_THRESH_MIN,
+        AUTO_THRESH_MAX=AUTO_THRESH_MAX,
+        AUTO_MIN_AREA_MIN=AUTO_MIN_AREA_MIN,
+        AUTO_MIN_AREA_MAX=AUTO_MIN_AREA_MAX,
+        AUTO_THRESH_MARGIN=AUTO_THRESH_MARGIN,
+        AUTO_AREA_MARGIN=AUTO_AREA_MARGIN,
+        AUTO_CALIBRATE_ALPHA=AUTO_CALIBRATE_ALPHA,
+        LIGHT_GATE_ENABLE=LIGHT_GATE_ENABLE,
+        LIGHT_CHANGED_FRAC=LIGHT_CHANGED_FRAC,
+        LIGHT_MEAN_DELTA=LIGHT_MEAN_DELTA,
+        LIGHT_HIST_DIST=LIGHT_HIST_DIST,
+        LIGHT_SETTLE_FRAMES=LIGHT_SETTLE_FRAMES,
+        LIGHT_MAX_SPREAD=LIGHT_MAX_SPREAD,
+        HEATMAP_ENABLE=HEATMAP_ENABLE,
+        HEATMAP_HALFLIFE_MIN=HEATMAP_HALFLIFE_MIN,
+        HEATMAP_SAVE_SEC=HEATMAP_SAVE_SEC,
+        HEATMAP_ZONE_ACTIVITY=HEATMAP_ZONE_ACTIVITY,
+        HEATMAP_ZONE_MIN_AREA=HEATMAP_ZONE_MIN_AREA,
+        RECORD_ON_MOTION=RECORD_ON_MOTION,
+        CLIP_DIR=CLIP_DIR,
+        PRE_ROLL_SEC=PRE_ROLL_SEC,
+        POST_ROLL_SEC=POST_ROLL_SEC,
+        QUIET_GAP_SEC=QUIET_GAP_SEC,
+        MAX_CLIP_SEC=MAX_CLIP_SEC,
+        MAX_DISK_GB=MAX_DISK_GB,
+        VIDEO_FPS=VIDEO_FPS,
+        VIDEO_CODEC=VIDEO_CODEC,
+        VIDEO_CODEC_CANDIDATES=VIDEO_CODEC_CANDIDATES,
+        VIDEO_CODEC_RT_MARGIN=VIDEO_CODEC_RT_MARGIN,
+        TG_SEND_CLIPS=TG_SEND_CLIPS,
+        TG_CLIP_COOLDOWN_SEC=TG_CLIP_COOLDOWN_SEC,
+        TRANSCODE_ENABLE=TRANSCODE_ENABLE,
+        TRANSCODE_MAX_MB=TRANSCODE_MAX_MB,
+        TRANSCODE_MAX_WIDTH=TRANSCODE_MAX_WIDTH,
+        TRANSCODE_MAX_FPS=TRANSCODE_MAX_FPS,
+        TRANSCODE_TRIM=TRANSCODE_TRIM,
+        TRANSCODE_TRIM_PAD_SEC=TRANSCODE_TRIM_PAD_SEC,
+        TRANSCODE_WORKERS=TRANSCODE_WORKERS,
+        TRANSCODE_FFMPEG=TRANSCODE_FFMPEG,
+        THUMB_ENABLE=THUMB_ENABLE,
+        THUMB_WIDTH=THUMB_WIDTH,
+        THUMB_SHEET_FRAMES=THUMB_SHEET_FRAMES,
+        THUMB_SHEET_COLS=THUMB_SHEET_COLS,
+        RECORD_CONTINUOUS=RECORD_CONTINUOUS,
+        SEGMENT_SEC=SEGMENT_SEC,
+        SEGMENT_DIR=SEGMENT_DIR,
+        SEGMENT_RETAIN_QUIET_HOURS=SEGMENT_RETAIN_QUIET_HOURS,
+        SEGMENT_RETAIN_EVENT_HOURS=SEGMENT_RETAIN_EVENT_HOURS,
+        SEGMENT_MAX_GB=SEGMENT_MAX_GB,
+        SEGMENT_FFMPEG=SEGMENT_FFMPEG,
+        SEGMENT_FFMPEG_CODEC=SEGMENT_FFMPEG_CODEC,
         SEND_TG_ON_MOTION=SEND_TG_ON_MOTION,
         MOTION_ALERT_COOLDOWN_SEC=MOTION_ALERT_COOLDOWN_SEC,
         PREVIEW_MAX_WIDTH=PREVIEW_MAX_WIDTH,
         PHOTO_JPEG_QUALITY=PHOTO_JPEG_QUALITY,
+        ALERT_BURST_ENABLE=ALERT_BURST_ENABLE,
+        ALERT_BURST_FRAMES=ALERT_BURST_FRAMES,
+        ALERT_BURST_WINDOW_SEC=ALERT_BURST_WINDOW_SEC,
+        ALERT_BURST_PRE_SEC=ALERT_BURST_PRE_SEC,
+        ALERT_BURST_MIN_GAP_SEC=ALERT_BURST_MIN_GAP_SEC,
+        PROFILE_DEFAULT_SEC=PROFILE_DEFAULT_SEC,
+        PROFILE_SEND_SUMMARY=PROFILE_SEND_SUMMARY,
+        METRICS_INTERVAL_SEC=METRICS_INTERVAL_SEC,
+        CONFIG_WATCH_SEC=CONFIG_WATCH_SEC,
     )
+
+
+# ================= Recarga en caliente =================
+
+# Campos que solo se leen al construir objetos de larga vida (ventana, servidores,
+# bot, etapas opcionales, grabación continua…): un cambio se guarda pero no se aplica
+# hasta reiniciar; el Settings en curso conserva su valor para seguir siendo coherente.
+RESTART_FIELDS = frozenset({
+    "CAMERA_NAME", "SNAPSHOT_HOME", "SNAPSHOT_URL_INIT",
+    "SHOW_WINDOW", "WINDOW_TITLE", "VIEWER_THREADED", "VIEWER_MAX_FPS", "VIEWER_OVERLAY_TIMINGS",
+    "STREAM_ENABLE", "STREAM_LISTEN", "STREAM_DRAW_BOXES", "STREAM_MAX_FPS", "STREAM_TOKEN",
+    "TG_BOT_TOKEN", "TG_CHAT_ID",
+    "BOT_MODE", "BOT_WEBHOOK_LISTEN", "BOT_WEBHOOK_PATH", "BOT_WEBHOOK_URL", "BOT_WEBHOOK_SECRET",
+    "ENABLE_MOTION", "TRACK_ENABLE", "AUTO_CALIBRATE", "LIGHT_GATE_ENABLE",
+    "HEATMAP_ENABLE",
+    "CLASSIFY_ENABLE", "CLASSIFY_BACKEND", "CLASSIFY_MODEL", "CLASSIFY_CONFIG",
+    "CLASSIFY_LABELS", "CLASSIFY_WORKERS", "CLASSIFY_MIN_CONF",
+    "CLIP_DIR", "VIDEO_FPS", "VIDEO_CODEC", "VIDEO_CODEC_CANDIDATES", "VIDEO_CODEC_RT_MARGIN",
+    "RECORD_CONTINUOUS", "SEGMENT_SEC", "SEGMENT_DIR", "SEGMENT_FFMPEG", "SEGMENT_FFMPEG_CODEC",
+    "TRANSCODE_WORKERS", "TRANSCODE_FFMPEG",
+})
+
+# Nunca se muestran (logs / respuestas del bot) ni se aceptan por /set
+SECRET_FIELDS = frozenset({"TG_BOT_TOKEN", "TG_CHAT_ID", "STREAM_TOKEN", "BOT_WEBHOOK_SECRET",
+                           "SNAPSHOT_COOKIE"})
+
+_OVERRIDES_FILE = "overrides.json"
+_known_keys: Optional[frozenset] = None
+
+
+class _KeyRecorder(dict):
+    """Mapping vacío que anota qué variables consulta load_settings()."""
+    def __init__(self):
+        super().__init__()
+        self.seen = set()
+
+    def get(self, key, default=None):
+        self.seen.add(key)
+        return default
+
+
+def settings_keys() -> frozenset:
+    """Nombres de variable (.env) que entiende load_settings()."""
+    global _known_keys
+    if _known_keys is None:
+        rec = _KeyRecorder()
+        load_settings(rec)
+        _known_keys = frozenset(rec.seen)
+    return _known_keys
+
+
+def _fmt_change(name: str, old, new) -> str:
+    if name in SECRET_FIELDS:
+        return f"{name}: *** → ***"
+    return f"{name}: {old} → {new}"
+
+
+def diff_settings(old: Settings, new: Settings) -> dict:
+    """{campo: (antes, después)} de los campos que cambian."""
+    out = {}
+    for f in fields(Settings):
+        a, b = getattr(old, f.name), getattr(new, f.name)
+        if a != b:
+            out[f.name] = (a, b)
+    return out
+
+
+class ConfigReloader:
+    """
+    Recarga de Settings sin reiniciar el bucle. Fuentes, de menor a mayor prioridad:
+    .env < entorno del proceso (supervisor, shell) < RUNTIME_DIR/overrides.json (/set).
+    - .env y overrides.json se vigilan por mtime cada CONFIG_WATCH_SEC (0 = no vigilar)
+    - request() (SIGHUP) fuerza la recarga
+    poll() se llama en la frontera de frame y devuelve un Settings nuevo (inmutable:
+    el bucle cambia de objeto de golpe) o None. Los RESTART_FIELDS conservan el valor
+    con el que arrancó el proceso.
+    """
+    def __init__(self, settings: Settings, runtime_dir: Path, env_path: Optional[Path] = None):
+        self.settings = settings
+        self.env_path = env_path or _env_path()
+        self.overrides_path = Path(runtime_dir) / _OVERRIDES_FILE
+        self._file_vals = self._read_env_file()
+        self._mtimes = self._stat()
+        self._next_check = 0.0
+        self._requested = threading.Event()
+        self._lock = threading.Lock()
+        self.reloads = 0
+        self.errors = 0
+        self.pending_restart: dict = {}
+
+    # -------- fuentes --------
+
+    def _read_env_file(self) -> dict:
+        try:
+            return {k: v for k, v in dotenv_values(self.env_path).items() if v is not None}
+        except Exception:
+            return {}
+
+    def _stat(self) -> tuple:
+        out = []
+        for p in (self.env_path, self.overrides_path):
+            try:
+                out.append(p.stat().st_mtime_ns)
+            except OSError:
+                out.append(None)
+        return tuple(out)
+
+    def overrides(self) -> dict:
+        try:
+            data = json.loads(self.overrides_path.read_text(encoding="utf-8"))
+            return {str(k): str(v) for k, v in data.items()} if isinstance(data, dict) else {}
+        except Exception:
+            return {}
+
+    def _sync_env_file(self) -> None:
+        """
+        Lleva a os.environ los cambios de .env, salvo las variables que el proceso
+        recibió con otro valor (entorno real, cameras.ini): esas siguen mandando.
+        """
+        new_vals = self._read_env_file()
+        for k in set(self._file_vals) | set(new_vals):
+            old, new = self._file_vals.get(k), new_vals.get(k)
+            if old == new:
+                continue
+            cur = os.environ.get(k)
+            if cur is not None and cur != old:
+                continue
+            if new is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = new
+        self._file_vals = new_vals
+
+    def build(self, extra: Optional[Mapping[str, str]] = None) -> Settings:
+        env = dict(os.environ)
+        env.update(self.overrides())
+        if extra:
+            env.update(extra)
+        return load_settings(env)
+
+    # -------- API --------
+
+    def initial(self) -> Settings:
+        """Settings de arranque con overrides.json aplicado (todos los campos)."""
+        if self.overrides():
+            try:
+                self.settings = self.build()
+            except ValueError as e:
+                print(f"[CONFIG] overrides.json inválido ({e}); se ignora")
+        return self.settings
+
+    def request(self) -> None:
+        self._requested.set()
+
+    def poll(self) -> Optional[Settings]:
+        forced = self._requested.is_set()
+        if not forced:
+            watch = self.settings.CONFIG_WATCH_SEC
+            now = time.monotonic()
+            if watch <= 0 or now < self._next_check:
+                return None
+            self._next_check = now + watch
+            if self._stat() == self._mtimes:
+                return None
+        self._requested.clear()
+        self._mtimes = self._stat()
+        with self._lock:
+            self._sync_env_file()
+            try:
+                new = self.build()
+            except ValueError as e:
+                self.errors += 1
+                print(f"[CONFIG] Recarga descartada: {e}")
+                return None
+        changes = diff_settings(self.settings, new)
+        held = {k: v for k, v in changes.items() if k in RESTART_FIELDS}
+        # Pendientes = los que aún difieren del valor en marcha (volver a él los quita)
+        back = sorted(set(self.pending_restart) - set(held))
+        self.pending_restart = dict(held)
+        if back:
+            print(f"[CONFIG] De nuevo con el valor en marcha (sin reinicio pendiente): {', '.join(back)}")
+        if held:
+            new = replace(new, **{k: getattr(self.settings, k) for k in held})
+            print(f"[CONFIG] Requieren reinicio (no aplicados): {', '.join(sorted(held))}")
+        applied = {k: v for k, v in changes.items() if k not in RESTART_FIELDS}
+        if not applied:
+            return None
+        for k, (a, b) in sorted(applied.items()):
+            print(f"[CONFIG] {_fmt_change(k, a, b)}")
+        self.reloads += 1
+        self.settings = new
+        return new
+
+    def set_override(self, key: str, value: Optional[str]) -> str:
+        """
+        /set CLAVE VALOR (value=None borra el override). Valida, persiste en
+        overrides.json y pide la recarga. Devuelve el texto de respuesta.
+        """
+        key = key.strip().upper()
+        if key not in settings_keys():
+            raise ValueError(f"clave desconocida: {key}")
+        if key in SECRET_FIELDS:
+            raise ValueError(f"{key} no se puede cambiar por chat")
+        with self._lock:
+            ov = self.overrides()
+            before = load_settings({**os.environ, **ov})
+            if value is None:
+                ov.pop(key, None)
+            else:
+                ov[key] = value
+            try:
+                trial = load_settings({**os.environ, **ov})
+            except ValueError as e:
+                raise ValueError(f"{key}={value}: {e}")
+            tmp = self.overrides_path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(ov, ensure_ascii=False, indent=1), encoding="utf-8")
+            os.replace(tmp, self.overrides_path)
+        self.request()
+        changes = diff_settings(before, trial)
+        if not changes:
+            return f"{key} sin cambios"
+        # self.settings conserva los RESTART_FIELDS de arranque: volver a ese valor no pide reinicio
+        held = sorted(k for k in changes if k in RESTART_FIELDS and getattr(trial, k) != getattr(self.settings, k))
+        txt = ", ".join(_fmt_change(k, a, b) for k, (a, b) in sorted(changes.items()))
+        return txt + (" (requiere reinicio)" if held else "")
+
+    def snapshot(self) -> dict:
+        return {"reloads": self.reloads, "errors": self.errors,
+                "overrides": self.overrides(), "pending_restart": sorted(self.pending_restart)}
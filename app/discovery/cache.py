@@ -0,0 +1,76 @@
+# caché de descubrimiento (arranque rápido)
+
+from __future__ import annotations
+import os
+import json
+import time
+from pathlib import Path
+from typing import Optional, Tuple
+
+
+def _runtime_dir() -> Path:
+    raw = os.getenv("RUNTIME_DIR", "./runtime")
+    p = Path(raw).expanduser().resolve()
+    p.mkdir(parents=True, exist_ok=True)
+    return p
+
+
+def _cache_path() -> Path:
+    return _runtime_dir() / "discovery_cache.json"
+
+
+def save_discovery(home_url: str, snapshot_base: str, cookie: str) -> None:
+    """Guarda (de forma atómica) la base descubierta y la cookie con su marca de tiempo."""
+    if not snapshot_base:
+        return
+    path = _cache_path()
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    payload = {
+        "home": home_url or "",
+        "snapshot_base": snapshot_base,
+        "cookie": cookie or "",
+        "ts": time.time(),
+    }
+    try:
+        tmp.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
+    except Exception as e:
+        print(f"[DISCOVER-CACHE] ERROR al guardar: {e}")
+        try:
+            if tmp.exists():
+                tmp.unlink(missing_ok=True)
+        except Exception:
+            pass
+
+
+def load_discovery(home_url: str, ttl_sec: float) -> Optional[Tuple[str, str]]:
+    """
+    Devuelve (snapshot_base, cookie) si hay caché para esta HOME y no ha caducado.
+    ttl_sec <= 0 desactiva la caché.
+    """
+    if ttl_sec <= 0:
+        return None
+    path = _cache_path()
+    if not path.exists():
+        return None
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except Exception:
+        return None
+    if not isinstance(data, dict) or (data.get("home") or "") != (home_url or ""):
+        return None
+    age = time.time() - float(data.get("ts", 0))
+    if age < 0 or age > ttl_sec:
+        print(f"[DISCOVER-CACHE] Caducada ({age:.0f} s > {ttl_sec:.0f} s)")
+        return None
+    base = data.get("snapshot_base") or ""
+    if not base:
+        return None
+    return base, data.get("cookie") or ""
+
+
+def invalidate_discovery() -> None:
+    try:
+        _cache_path().unlink(missing_ok=True)
+    except Exception:
+        pass
@@ -1,32 +1,113 @@
 # orquestación del descubrimiento
 
 from __future__ import annotations
+import sys
+import time
+import queue
+import threading
 from typing import Callable
 
 from .selenium_discovery import discover_snapshot_base_via_selenium
+from .selenium_session import get_session
 from .redirect_discovery import discover_snapshot_base_via_redirect
 from .html_discovery import discover_snapshot_base_from_home
+from .cache import save_discovery
+
+def _start_strategy(name: str, fn: Callable, results: queue.Queue,
+                    cancel: threading.Event) -> None:
+    """
+    Lanza una estrategia en un hilo daemon. Cada estrategia escribe en su propio
+    dict (no en RuntimeState) para que los perdedores no pisen al ganador.
+    """
+    def _worker():
+        found: dict = {}
+        try:
+            ok = fn(lambda url: found.__setitem__("base", url),
+                    lambda ck: found.__setitem__("cookie", ck),
+                    cancel)
+        except Exception as e:
+            print(f"[DISCOVER][{name}][ERR] {repr(e)}", file=sys.stderr)
+            ok = False
+        results.put((name, bool(ok and found.get("base")), found))
+
+    threading.Thread(target=_worker, name=f"discover-{name}", daemon=True).start()
+
+def _selenium_strategy(settings) -> Callable:
+    """Navegador persistente (SELENIUM_KEEP_ALIVE) o uno nuevo por descubrimiento."""
+    home, browser = settings.SNAPSHOT_HOME, settings.SELENIUM_BROWSER
+    if getattr(settings, "SELENIUM_KEEP_ALIVE", False):
+        session = get_session(browser,
+                              getattr(settings, "SELENIUM_MAX_USES", 50),
+                              getattr(settings, "SELENIUM_MAX_MEM_GROWTH_MB", 256.0))
+        return lambda sb, sc, ev: session.discover(home, sb, sc, cancel_event=ev)
+    return lambda sb, sc, ev: discover_snapshot_base_via_selenium(home, browser, sb, sc, cancel_event=ev)
 
 def discover_snapshot_base(settings, state,
                            prefer_selenium: bool = True) -> bool:
     """
     Intenta descubrir la URL base del snapshot (sin &r=).
-    Orden: Selenium → Redirección → HTML (o sin Selenium si está desactivado).
+    Redirección y HTML corren en paralelo; Selenium arranca si ambos fallan o
+    tras DISCOVERY_SELENIUM_HEAD_START_SEC. Gana la primera base válida y el resto
+    se cancela (el navegador temporal se cierra; el persistente se conserva).
     """
-    set_base = lambda url: setattr(state, "snapshot_base", url)
-    set_cookie = lambda ck: setattr(state, "snapshot_cookie", ck)
-
-    ok = False
-    if prefer_selenium and settings.USE_SELENIUM:
-        ok = discover_snapshot_base_via_selenium(
-            settings.SNAPSHOT_HOME, settings.SELENIUM_BROWSER, set_base, set_cookie
-        )
-    if not ok:
-        ok = discover_snapshot_base_via_redirect(
-            settings.SNAPSHOT_HOME, settings.SNAPSHOT_REFERER, state.snapshot_cookie, set_base, set_cookie
-        )
-    if not ok:
-        ok = discover_snapshot_base_from_home(
-            settings.SNAPSHOT_HOME, settings.SNAPSHOT_REFERER, state.snapshot_cookie, set_base, set_cookie
-        )
-    return ok
+    home = settings.SNAPSHOT_HOME
+    referer = settings.SNAPSHOT_REFERER
+    cookie = state.snapshot_cookie
+    use_selenium = prefer_selenium and settings.USE_SELENIUM
+    head_start = max(0.0, float(getattr(settings, "DISCOVERY_SELENIUM_HEAD_START_SEC", 2.0)))
+    timeout = max(1.0, float(getattr(settings, "DISCOVERY_TIMEOUT_SEC", 45.0)))
+
+    results: queue.Queue = queue.Queue()
+    cancel = threading.Event()
+    t0 = time.monotonic()
+
+    cheap = {
+        "redir": lambda sb, sc, ev: discover_snapshot_base_via_redirect(home, referer, cookie, sb, sc),
+        "html": lambda sb, sc, ev: discover_snapshot_base_from_home(home, referer, cookie, sb, sc),
+    }
+    for name, fn in cheap.items():
+        _start_strategy(name, fn, results, cancel)
+    cheap_pending = len(cheap)
+    pending = cheap_pending
+    selenium_started = False
+
+    winner = None
+    try:
+        while pending > 0 or (use_selenium and not selenium_started):
+            now = time.monotonic()
+            if now - t0 >= timeout:
+                print(f"[DISCOVER] Timeout global ({timeout:.0f} s)", file=sys.stderr)
+                break
+            if use_selenium and not selenium_started and (cheap_pending == 0 or now - t0 >= head_start):
+                _start_strategy("selenium", _selenium_strategy(settings), results, cancel)
+                selenium_started = True
+                pending += 1
+                continue
+
+            wait = timeout - (now - t0)
+            if use_selenium and not selenium_started:
+                wait = min(wait, head_start - (now - t0))
+            try:
+                name, ok, found = results.get(timeout=max(0.01, wait))
+            except queue.Empty:
+                continue
+            pending -= 1
+            if name in cheap:
+                cheap_pending -= 1
+            if ok:
+                winner = (name, found)
+                break
+    finally:
+        cancel.set()  # perdedores: cancelan y cierran navegador
+
+    if winner is None:
+        return False
+
+    name, found = winner
+    state.snapshot_base = found["base"]
+    if found.get("cookie"):
+        state.snapshot_cookie = found["cookie"]
+    print(f"[DISCOVER] Ganador: {name} en {time.monotonic() - t0:.2f} s → {state.snapshot_base}")
+    if getattr(settings, "DISCOVERY_CACHE_TTL_SEC", 0) > 0:
+        save_discovery(home, state.snapshot_base, state.snapshot_cookie)
+    return True
@@ -2,72 +2,138 @@
 
 from __future__ import annotations
 import sys
-from typing import Optional
+import threading
+from typing import Callable, Optional
+
+# Ruta del binario del driver resuelta por webdriver_manager (una vez por proceso)
+_driver_paths: dict[str, str] = {}
+_driver_paths_lock = threading.Lock()
+
+_CANCELLED = "cancel"
+
+
+def _driver_path(browser: str) -> str:
+    key = browser.lower()
+    with _driver_paths_lock:
+        if key not in _driver_paths:
+            if key == "edge":
+                from webdriver_manager.microsoft import EdgeChromiumDriverManager
+                _driver_paths[key] = EdgeChromiumDriverManager().install()
+            else:
+                from webdriver_manager.chrome import ChromeDriverManager
+                _driver_paths[key] = ChromeDriverManager().install()
+        return _driver_paths[key]
+
+
+def create_driver(browser: str):
+    """Crea un driver headless (Chrome o Edge). Lanza ImportError si falta Selenium."""
+    from selenium import webdriver
+    if browser.lower() == "edge":
+        from selenium.webdriver.edge.service import Service as EdgeService
+        from selenium.webdriver.edge.options import Options as EdgeOptions
+        opts = EdgeOptions()
+        service_cls, driver_cls = EdgeService, webdriver.Edge
+    else:
+        from selenium.webdriver.chrome.service import Service as ChromeService
+        from selenium.webdriver.chrome.options import Options as ChromeOptions
+        opts = ChromeOptions()
+        service_cls, driver_cls = ChromeService, webdriver.Chrome
+    opts.add_argument("--headless=new")
+    opts.add_argument("--disable-gpu")
+    opts.add_argument("--no-sandbox")
+    driver = driver_cls(service=service_cls(_driver_path(browser)), options=opts)
+    driver.set_page_load_timeout(20)
+    return driver
+
+
+def read_snapshot_base(driver, home_url: str,
+                       cancelled: Callable[[], bool] = lambda: False) -> Optional[str]:
+    """
+    Carga HOME en el driver y devuelve la base del <img src="...out.jpg?id=..."> (sin &r=).
+    Devuelve "" si no la encuentra y None si se canceló.
+    """
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+
+    driver.get(home_url)
+    wait = WebDriverWait(driver, 20, poll_frequency=0.25)
+    find_img = EC.presence_of_element_located((By.CSS_SELECTOR, "img[src*='.jpg']"))
+    img = wait.until(lambda d: _CANCELLED if cancelled() else find_img(d))
+    if img == _CANCELLED:
+        return None
+    src = img.get_attribute("src") or ""
+    if "out.jpg" in src and "id=" in src:
+        if "&r=" in src:
+            src = src.split("&r=")[0]
+        return src
+    return ""
+
+
+def read_cookie_header(driver) -> str:
+    try:
+        cookies = driver.get_cookies()
+        if cookies:
+            return "; ".join(
+                f"{c['name']}={c['value']}" for c in cookies if 'name' in c and 'value' in c
+            )
+    except Exception:
+        pass
+    return ""
+
+
+def _quit_on_cancel(driver, cancel_event: threading.Event, done: threading.Event) -> None:
+    """Vigila cancel_event y cierra el navegador (interrumpe un driver.get en curso)."""
+    while not done.wait(0.2):
+        if cancel_event.is_set():
+            try: driver.quit()
+            except Exception: pass
+            return
+
 
 def discover_snapshot_base_via_selenium(home_url: str, browser: str,
-                                        set_base_cb, set_cookie_cb) -> bool:
+                                        set_base_cb, set_cookie_cb,
+                                        cancel_event: Optional[threading.Event] = None) -> bool:
     """
     Abre HOME con Selenium (headless), localiza <img src="...out.jpg?id=..."> y
     devuelve True si encontró la base. set_base_cb y set_cookie_cb son callbacks
     para guardar datos en RuntimeState desde fuera del módulo.
+    Si cancel_event se activa (otra estrategia ganó), se cierra el navegador y devuelve False.
     """
-    try:
-        from selenium import webdriver
-        from selenium.webdriver.common.by import By
-        from selenium.webdriver.support.ui import WebDriverWait
-        from selenium.webdriver.support import expected_conditions as EC
-        from webdriver_manager.chrome import ChromeDriverManager
-        from webdriver_manager.microsoft import EdgeChromiumDriverManager
-        from selenium.webdriver.chrome.service import Service as ChromeService
-        from selenium.webdriver.edge.service import Service as EdgeService
-        from selenium.webdriver.chrome.options import Options as ChromeOptions
-        from selenium.webdriver.edge.options import Options as EdgeOptions
-    except Exception as e:
-        print(f"[SELENIUM] Módulos faltantes: {e}", file=sys.stderr)
-        return False
-
+    cancelled = lambda: cancel_event is not None and cancel_event.is_set()
     if not home_url:
         print("[SELENIUM] SNAPSHOT_HOME vacío", file=sys.stderr)
         return False
 
     driver = None
+    done = threading.Event()
     try:
-        if browser.lower() == "edge":
-            opts = EdgeOptions()
-            opts.add_argument("--headless=new")
-            opts.add_argument("--disable-gpu")
-            opts.add_argument("--no-sandbox")
-            driver = webdriver.Edge(service=EdgeService(EdgeChromiumDriverManager().install()), options=opts)
-        else:
-            opts = ChromeOptions()
-            opts.add_argument("--headless=new")
-            opts.add_argument("--disable-gpu")
-            opts.add_argument("--no-sandbox")
-            driver = webdriver.Chrome(service=ChromeService(ChromeDriverManager().install()), options=opts)
-
-        driver.set_page_load_timeout(20)
-        driver.get(home_url)
-
-        wait = WebDriverWait(driver, 20)
-        img = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "img[src*='.jpg']")))
-        src = img.get_attribute("src") or ""
-
-        if "out.jpg" in src and "id=" in src:
-            if "&r=" in src:
-                src = src.split("&r=")[0]
-            set_base_cb(src)
-            print(f"[SELENIUM] Base descubierta: {src}")
+        try:
+            driver = create_driver(browser)
+        except ImportError as e:
+            print(f"[SELENIUM] Módulos faltantes: {e}", file=sys.stderr)
+            return False
 
-            try:
-                cookies = driver.get_cookies()
-                if cookies:
-                    cookie_str = "; ".join(
-                        f"{c['name']}={c['value']}" for c in cookies if 'name' in c and 'value' in c
-                    )
-                    set_cookie_cb(cookie_str)
-            except Exception:
-                pass
+        if cancel_event is not None:
+            threading.Thread(target=_quit_on_cancel, args=(driver, cancel_event, done),
+                             name="selenium-cancel", daemon=True).start()
+        if cancelled():
+            print("[SELENIUM] Cancelado (otra estrategia ganó)")
+            driver.quit()
+            return False
 
+        src = read_snapshot_base(driver, home_url, cancelled)
+        if src is None:
+            print("[SELENIUM] Cancelado (otra estrategia ganó)")
+            driver.quit()
+            return False
+
+        if src:
+            set_base_cb(src)
+            print(f"[SELENIUM] Base descubierta: {src}")
+            cookie_str = read_cookie_header(driver)
+            if cookie_str:
+                set_cookie_cb(cookie_str)
             driver.quit()
             return True
 
@@ -79,5 +145,10 @@ def discover_snapshot_base_via_selenium(home_url: str, browser: str,
         if driver:
             try: driver.quit()
             except: pass
-        print(f"[SELENIUM][ERR] {repr(e)}", file=sys.stderr)
+        if cancelled():
+            print("[SELENIUM] Cancelado (otra estrategia ganó)")
+        else:
+            print(f"[SELENIUM][ERR] {repr(e)}", file=sys.stderr)
         return False
+    finally:
+        done.set()
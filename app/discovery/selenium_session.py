@@ -0,0 +1,149 @@
+# navegador headless persistente para re-descubrimientos rápidos
+
+from __future__ import annotations
+import sys
+import time
+import atexit
+import threading
+from typing import Optional
+
+from .selenium_discovery import create_driver, read_snapshot_base, read_cookie_header
+
+
+class SeleniumSession:
+    """
+    Mantiene UN driver vivo entre descubrimientos (arranque perezoso).
+    - Health-check antes de cada uso (execute_script).
+    - Reciclado tras max_uses usos o si el heap JS crece más de max_mem_growth_mb.
+    No es reentrante: los usos concurrentes se serializan con un lock.
+    """
+    def __init__(self, browser: str, max_uses: int = 50, max_mem_growth_mb: float = 256.0):
+        self.browser = browser
+        self.max_uses = max(1, int(max_uses))
+        self.max_mem_growth = max(0.0, float(max_mem_growth_mb)) * 1024 * 1024
+        self._driver = None
+        self._uses = 0
+        self._mem_baseline: Optional[float] = None
+        self._lock = threading.Lock()
+
+    # -------- API --------
+
+    def discover(self, home_url: str, set_base_cb, set_cookie_cb,
+                 cancel_event: Optional[threading.Event] = None) -> bool:
+        if not home_url:
+            print("[SELENIUM-WARM] SNAPSHOT_HOME vacío", file=sys.stderr)
+            return False
+        cancelled = lambda: cancel_event is not None and cancel_event.is_set()
+        with self._lock:
+            if cancelled():
+                return False
+            t0 = time.perf_counter()
+            try:
+                if self._driver is not None and not self._healthy():
+                    print("[SELENIUM-WARM] Driver no responde; reciclando…")
+                    self._quit()
+                if self._driver is None:
+                    self._driver = create_driver(self.browser)
+                    self._uses = 0
+                    self._mem_baseline = None
+                    print(f"[SELENIUM-WARM] Driver iniciado ({self.browser}) en {time.perf_counter() - t0:.2f} s")
+
+                src = read_snapshot_base(self._driver, home_url, cancelled)
+                self._uses += 1
+                if src is None:
+                    print("[SELENIUM-WARM] Cancelado (otra estrategia ganó)")
+                    return False
+                if not src:
+                    print("[SELENIUM-WARM] No se encontró <img> con out.jpg&id=", file=sys.stderr)
+                    return False
+
+                set_base_cb(src)
+                cookie_str = read_cookie_header(self._driver)
+                if cookie_str:
+                    set_cookie_cb(cookie_str)
+                print(f"[SELENIUM-WARM] Base descubierta en {time.perf_counter() - t0:.2f} s "
+                      f"(uso {self._uses}/{self.max_uses}): {src}")
+                return True
+
+            except ImportError as e:
+                print(f"[SELENIUM-WARM] Módulos faltantes: {e}", file=sys.stderr)
+                return False
+            except Exception as e:
+                print(f"[SELENIUM-WARM][ERR] {repr(e)}", file=sys.stderr)
+                self._quit()
+                return False
+            finally:
+                if self._driver is not None and self._should_recycle():
+                    self._quit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._quit()
+
+    # -------- Internos --------
+
+    def _healthy(self) -> bool:
+        try:
+            return self._driver.execute_script("return 1") == 1
+        except Exception:
+            return False
+
+    def _js_heap(self) -> Optional[float]:
+        try:
+            v = self._driver.execute_script(
+                "return (performance.memory && performance.memory.usedJSHeapSize) || null")
+            return float(v) if v else None
+        except Exception:
+            return None
+
+    def _should_recycle(self) -> bool:
+        if self._uses >= self.max_uses:
+            print(f"[SELENIUM-WARM] {self._uses} usos → reciclando driver")
+            return True
+        if self.max_mem_growth <= 0:
+            return False
+        heap = self._js_heap()
+        if heap is None:
+            return False
+        if self._mem_baseline is None:
+            self._mem_baseline = heap
+            return False
+        growth = heap - self._mem_baseline
+        if growth > self.max_mem_growth:
+            print(f"[SELENIUM-WARM] Heap JS +{growth / 1048576:.0f} MB → reciclando driver")
+            return True
+        return False
+
+    def _quit(self) -> None:
+        if self._driver is not None:
+            try: self._driver.quit()
+            except Exception: pass
+        self._driver = None
+        self._uses = 0
+        self._mem_baseline = None
+
+
+_session: Optional[SeleniumSession] = None
+_session_lock = threading.Lock()
+
+
+def get_session(browser: str, max_uses: int = 50, max_mem_growth_mb: float = 256.0) -> SeleniumSession:
+    """Sesión única por proceso (se cierra al salir)."""
+    global _session
+    with _session_lock:
+        if _session is None or _session.browser.lower() != browser.lower():
+            if _session is not None:
+                _session.close()
+            _session = SeleniumSession(browser, max_uses, max_mem_growth_mb)
+        return _session
+
+
+def shutdown_session() -> None:
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+atexit.register(shutdown_session)
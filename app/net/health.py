@@ -0,0 +1,162 @@
+# salud de la descarga de frames: timeouts adaptativos, backoff y circuit breaker
+
+from __future__ import annotations
+import time
+import random
+from collections import deque
+from typing import Deque, Optional
+
+from .snapshot import FetchResult, KIND_OK, KIND_HTTP, KIND_TIMEOUT, KIND_DECODE
+
+# Estados del breaker de re-descubrimiento
+CLOSED = "closed"        # normal: se permite re-descubrir tras N fallos "arreglables"
+OPEN = "open"            # el re-descubrimiento falló: esperar cooldown (exponencial)
+HALF_OPEN = "half_open"  # cooldown cumplido: se permite UN intento
+
+# HTTP que indican URL/id/sesión caducados (los arregla un re-descubrimiento)
+_REDISCOVERABLE_HTTP = {400, 401, 403, 404, 410}
+
+
+def _percentile(values, q: float) -> float:
+    s = sorted(values)
+    if not s:
+        return 0.0
+    idx = min(len(s) - 1, max(0, int(round(q * (len(s) - 1)))))
+    return s[idx]
+
+
+class FetchHealth:
+    """
+    Controlador de salud para la descarga de frames:
+      - timeout = percentil p95 de latencias recientes × mult (acotado a [min, max])
+      - backoff exponencial con jitter completo entre fallos
+      - circuit breaker que SOLO re-descubre ante fallos que un re-descubrimiento
+        puede arreglar (HTTP 4xx de id/sesión, respuesta no-JPEG). Timeouts y
+        errores de red/5xx solo hacen backoff (la cámara está lenta o caída).
+    """
+    def __init__(
+        self,
+        min_timeout: float = 1.0,
+        max_timeout: float = 8.0,
+        timeout_mult: float = 3.0,
+        window: int = 50,
+        fails_before_rediscover: int = 3,
+        backoff_base: float = 0.2,
+        backoff_max: float = 10.0,
+        breaker_cooldown: float = 5.0,
+        breaker_max_cooldown: float = 300.0,
+    ):
+        self.min_timeout = max(0.1, float(min_timeout))
+        self.max_timeout = max(self.min_timeout, float(max_timeout))
+        self.timeout_mult = max(1.0, float(timeout_mult))
+        self.latencies: Deque[float] = deque(maxlen=max(5, int(window)))
+        self.fails_before_rediscover = max(1, int(fails_before_rediscover))
+        self.backoff_base = max(0.0, float(backoff_base))
+        self.backoff_max = max(self.backoff_base, float(backoff_max))
+        self.breaker_cooldown = max(0.0, float(breaker_cooldown))
+        self.breaker_max_cooldown = max(self.breaker_cooldown, float(breaker_max_cooldown))
+
+        self.consecutive_fails = 0
+        self.fixable_fails = 0
+        self.state = CLOSED
+        self.open_count = 0
+        self.open_until = 0.0
+        self.unconfirmed = False  # re-descubrimiento "ok" aún sin frame correcto
+        self.last_kind: str = KIND_OK
+        self.counts: dict[str, int] = {}
+
+    # -------- timeouts --------
+
+    def timeout(self) -> float:
+        if len(self.latencies) < 5:
+            return self.max_timeout
+        t = _percentile(self.latencies, 0.95) * self.timeout_mult
+        return min(self.max_timeout, max(self.min_timeout, t))
+
+    # -------- registro de resultados --------
+
+    def record(self, res: FetchResult, timeout_used: Optional[float] = None) -> None:
+        self.last_kind = res.kind
+        self.counts[res.kind] = self.counts.get(res.kind, 0) + 1
+        if res.ok:
+            self.latencies.append(res.latency)
+            if self.consecutive_fails:
+                print(f"[HEALTH] Recuperado tras {self.consecutive_fails} fallos")
+            self.consecutive_fails = 0
+            self.fixable_fails = 0
+            if self.state != CLOSED:
+                print("[HEALTH] Breaker → closed")
+            self.state = CLOSED
+            self.open_count = 0
+            self.unconfirmed = False
+            return
+
+        self.consecutive_fails += 1
+        if res.kind == KIND_TIMEOUT:
+            # Latencia censurada: empuja el p95 hacia arriba (sin pasar de max_timeout)
+            self.latencies.append(float(timeout_used or self.max_timeout))
+        if self._is_fixable(res):
+            self.fixable_fails += 1
+
+    @staticmethod
+    def _is_fixable(res: FetchResult) -> bool:
+        if res.kind == KIND_DECODE:
+            return True
+        if res.kind == KIND_HTTP:
+            return res.status is None or res.status in _REDISCOVERABLE_HTTP
+        return False
+
+    # -------- decisiones --------
+
+    def next_delay(self) -> float:
+        """Backoff exponencial con jitter completo: U(0, min(max, base·2^(n-1)))."""
+        if self.consecutive_fails <= 0:
+            return 0.0
+        cap = min(self.backoff_max, self.backoff_base * (2 ** min(16, self.consecutive_fails - 1)))
+        return random.uniform(0.0, cap)
+
+    def should_rediscover(self, now: Optional[float] = None) -> bool:
+        now = time.monotonic() if now is None else now
+        if self.fixable_fails < self.fails_before_rediscover:
+            return False
+        if self.unconfirmed:
+            # El último re-descubrimiento dio una base que tampoco funciona
+            self.unconfirmed = False
+            self.fixable_fails = 0
+            self._open(now, "Base re-descubierta sin frames válidos")
+            return False
+        if self.state == OPEN:
+            if now < self.open_until:
+                return False
+            self.state = HALF_OPEN
+            print("[HEALTH] Breaker → half_open (un intento de re-descubrimiento)")
+        return True
+
+    def on_rediscover(self, ok: bool, now: Optional[float] = None) -> None:
+        now = time.monotonic() if now is None else now
+        self.fixable_fails = 0
+        if ok:
+            # La confirmación real llega con el siguiente frame correcto (record)
+            self.unconfirmed = True
+            return
+        self._open(now, "Re-descubrimiento fallido")
+
+    def _open(self, now: float, why: str) -> None:
+        self.open_count += 1
+        cooldown = min(self.breaker_max_cooldown,
+                       self.breaker_cooldown * (2 ** min(16, self.open_count - 1)))
+        cooldown *= random.uniform(0.8, 1.2)
+        self.state = OPEN
+        self.open_until = now + cooldown
+        print(f"[HEALTH] {why} → breaker open {cooldown:.1f} s")
+
+    def snapshot(self) -> dict:
+        """Resumen para logs/métricas."""
+        return {
+            "state": self.state,
+            "timeout_sec": round(self.timeout(), 3),
+            "p50_ms": round(1000 * _percentile(self.latencies, 0.50), 1),
+            "p95_ms": round(1000 * _percentile(self.latencies, 0.95), 1),
+            "consecutive_fails": self.consecutive_fails,
+            "counts": dict(self.counts),
+        }
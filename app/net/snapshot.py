@@ -3,10 +3,18 @@
 from __future__ import annotations
 import sys
 import time
-import numpy as np
+import socket
+import threading
+import urllib.error
 import urllib.request
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import TYPE_CHECKING, Optional
 from urllib.parse import urlparse, urlencode, urlunparse, parse_qs
 
+if TYPE_CHECKING:
+    import numpy as np  # cv2/numpy solo al decodificar (rapidez de arranque)
+
 def build_snapshot_url(snapshot_base: str) -> str:
     """Añade/actualiza &r=timestamp a la URL base (anti caché)."""
     if not snapshot_base:
@@ -20,17 +28,82 @@ def build_snapshot_url(snapshot_base: str) -> str:
     qs["r"] = [str(int(time.time() * 1000))]
     return urlunparse(p._replace(query=urlencode(qs, doseq=True)))
 
-def get_frame_once(snapshot_base: str, referer: str, cookie: str):
+# Tipos de fallo (FetchResult.kind)
+KIND_OK = "ok"
+KIND_HTTP = "http"        # respuesta HTTP de error (status en FetchResult.status)
+KIND_TIMEOUT = "timeout"  # sin respuesta dentro del timeout
+KIND_NET = "net"          # conexión rechazada, DNS, reset…
+KIND_DECODE = "decode"    # respuesta vacía o que no es un JPEG válido
+
+@dataclass
+class FrameTimes:
     """
-    Descarga un frame JPEG y lo devuelve como ndarray BGR.
-    Retorna (ok: bool, frame | None).
+    Marcas de tiempo de un frame. Las locales son de time.monotonic() (no saltan con
+    NTP); las del servidor, epoch de sus cabeceras Date / Last-Modified (resolución
+    de 1 s, con su reloj: solo se comparan entre ellas).
     """
-    import cv2  # local import por rapidez de arranque
+    request: float                          # inicio de la petición
+    first_byte: Optional[float] = None      # cabeceras recibidas
+    decoded: Optional[float] = None         # imdecode terminado
+    processed: Optional[float] = None       # detección terminada (lo pone el bucle)
+    wall: float = 0.0                       # time.time() al pedirlo (nombres, logs)
+    server_date: Optional[float] = None
+    last_modified: Optional[float] = None
+
+    def server_stale(self) -> Optional[float]:
+        """Segundos que la imagen llevaba hecha cuando el servidor respondió (si lo dice)."""
+        if self.server_date is None or self.last_modified is None:
+            return None
+        return max(0.0, self.server_date - self.last_modified)
+
+    def age(self, now: float) -> float:
+        """
+        Antigüedad estimada del frame en now (monótono): con Last-Modified, lo que ya
+        tenía al responder el servidor + lo transcurrido desde el primer byte; sin él se
+        supone capturado al pedirlo (snapshot bajo demanda).
+        """
+        stale = self.server_stale()
+        if stale is not None and self.first_byte is not None:
+            return stale + (now - self.first_byte)
+        return now - self.request
+
 
+def _header_ts(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except Exception:
+        return None
+
+@dataclass
+class FetchResult:
+    """Resultado de una descarga de frame, con el tipo de fallo y la latencia."""
+    ok: bool
+    frame: Optional[np.ndarray] = None
+    kind: str = KIND_OK
+    status: Optional[int] = None
+    latency: float = 0.0  # segundos (petición → decodificado)
+    data: Optional[bytes] = None  # JPEG original del servidor (para reenviar sin recodificar)
+    times: Optional[FrameTimes] = None
+
+def _is_timeout(e: BaseException) -> bool:
+    if isinstance(e, (socket.timeout, TimeoutError)):
+        return True
+    reason = getattr(e, "reason", None)
+    return isinstance(reason, (socket.timeout, TimeoutError))
+
+def fetch_frame(snapshot_base: str, referer: str, cookie: str, timeout: float = 8.0,
+                decode: bool = True) -> FetchResult:
+    """
+    Descarga un frame JPEG y lo devuelve como ndarray BGR dentro de un FetchResult,
+    distinguiendo error HTTP / timeout / red / decodificación.
+    decode=False solo descarga (data + times): decode_frame() lo completa después.
+    """
     url = build_snapshot_url(snapshot_base)
     if not url:
         print("[FRAME] snapshot_base vacío; no se puede construir URL", file=sys.stderr)
-        return False, None
+        return FetchResult(False, kind=KIND_HTTP)
 
     headers = {
         "User-Agent": "Mozilla/5.0 (MotionClient)",
@@ -41,25 +114,76 @@ def get_frame_once(snapshot_base: str, referer: str, cookie: str):
     if cookie:
         headers["Cookie"] = cookie
 
+    t0 = time.monotonic()
+    times = FrameTimes(request=t0, wall=time.time())
     try:
         req = urllib.request.Request(url, headers=headers)
-        with urllib.request.urlopen(req, timeout=8) as resp:
+        with urllib.request.urlopen(req, timeout=max(0.1, float(timeout))) as resp:
+            times.first_byte = time.monotonic()
+            times.server_date = _header_ts(resp.headers.get("Date"))
+            times.last_modified = _header_ts(resp.headers.get("Last-Modified"))
             data = resp.read()
 
         if not data:
             print(f"[FRAME] Respuesta vacía desde {url}", file=sys.stderr)
-            return False, None
-
-        arr = np.frombuffer(data, dtype=np.uint8)
-        frame = cv2.imdecode(arr, cv2.IMREAD_COLOR)
-        if frame is None:
-            print("[FRAME] imdecode devolvió None", file=sys.stderr)
-            return False, None
-
-        return True, frame
+            return FetchResult(False, kind=KIND_DECODE, latency=time.monotonic() - t0)
 
     except urllib.error.HTTPError as e:
         print(f"[FRAME][HTTP {e.code}] {e.reason} en {url}", file=sys.stderr)
+        return FetchResult(False, kind=KIND_HTTP, status=e.code, latency=time.monotonic() - t0)
     except Exception as e:
-        print(f"[FRAME][ERR] {repr(e)}", file=sys.stderr)
-    return False, None
+        kind = KIND_TIMEOUT if _is_timeout(e) else KIND_NET
+        print(f"[FRAME][{kind.upper()}] {repr(e)}", file=sys.stderr)
+        return FetchResult(False, kind=kind, latency=time.monotonic() - t0)
+
+    res = FetchResult(True, latency=time.monotonic() - t0, data=data, times=times)
+    return decode_frame(res) if decode else res
+
+def decode_frame(res: FetchResult) -> FetchResult:
+    """JPEG descargado (fetch_frame con decode=False) → frame BGR; no-JPEG = KIND_DECODE."""
+    import cv2  # local import por rapidez de arranque
+    import numpy as np
+
+    if not res.ok or res.frame is not None:
+        return res
+    frame = cv2.imdecode(np.frombuffer(res.data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        print("[FRAME] imdecode devolvió None", file=sys.stderr)
+        return FetchResult(False, kind=KIND_DECODE, latency=res.latency)
+    res.times.decoded = time.monotonic()
+    res.frame = frame
+    res.latency = res.times.decoded - res.times.request
+    return res
+
+
+class FramePrefetch:
+    """
+    Primera descarga del arranque en un hilo: la espera de red corre mientras el
+    proceso importa cv2/numpy y monta grabador y detector. take() espera a la
+    descarga y decodifica (el mismo FetchResult que fetch_frame).
+    """
+    def __init__(self, snapshot_base: str, referer: str, cookie: str, timeout: float = 8.0):
+        self.snapshot_base = snapshot_base
+        self.cookie = cookie
+        self._res: Optional[FetchResult] = None
+        self._thread = threading.Thread(target=self._run, args=(referer, timeout),
+                                        name="frame-prefetch", daemon=True)
+        self._thread.start()
+
+    def _run(self, referer: str, timeout: float) -> None:
+        self._res = fetch_frame(self.snapshot_base, referer, self.cookie, timeout, decode=False)
+
+    def take(self, snapshot_base: str, cookie: str) -> Optional[FetchResult]:
+        """Resultado si se pidió a la misma base (y con la misma cookie); si no, None."""
+        if snapshot_base != self.snapshot_base or cookie != self.cookie:
+            return None
+        self._thread.join()
+        return decode_frame(self._res) if self._res is not None else None
+
+def get_frame_once(snapshot_base: str, referer: str, cookie: str, timeout: float = 8.0):
+    """
+    Descarga un frame JPEG y lo devuelve como ndarray BGR.
+    Retorna (ok: bool, frame | None).
+    """
+    res = fetch_frame(snapshot_base, referer, cookie, timeout)
+    return res.ok, res.frame
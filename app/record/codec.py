@@ -0,0 +1,99 @@
+# selección automática de fourcc por micro-benchmark (VIDEO_CODEC=auto)
+
+from __future__ import annotations
+import os
+import json
+import time
+from pathlib import Path
+from typing import List, Optional
+import cv2
+import numpy as np
+
+DEFAULT_CANDIDATES = "avc1,H264,X264,hvc1,mp4v"
+_PROBE_FILE = "codec_probe.json"
+
+
+def _probe_one(fourcc: str, sample, fps: float, frames: int, tmp_dir: Path) -> dict:
+    """Codifica 'frames' frames (muestra desplazada para simular movimiento) y mide."""
+    h, w = sample.shape[:2]
+    out = tmp_dir / f".codec_probe_{fourcc}.mp4"
+    res = {"fourcc": fourcc, "ok": False, "encode_fps": 0.0, "bytes_per_sec": 0}
+    try:
+        writer = cv2.VideoWriter(str(out), cv2.VideoWriter_fourcc(*fourcc), fps, (w, h))
+        if not writer or not writer.isOpened():
+            return res
+        # Los frames se preparan antes de cronometrar: solo se mide el codificador
+        step = max(1, w // (4 * frames))
+        clip = [np.roll(sample, i * step, axis=1) for i in range(frames)]
+        t0 = time.perf_counter()
+        for f in clip:
+            writer.write(f)
+        writer.release()
+        elapsed = max(1e-6, time.perf_counter() - t0)
+        size = out.stat().st_size if out.exists() else 0
+        if size > 0:
+            res.update(ok=True, encode_fps=round(frames / elapsed, 1),
+                       bytes_per_sec=int(size / (frames / fps)))
+    except Exception as e:
+        res["error"] = str(e)
+    finally:
+        try:
+            out.unlink(missing_ok=True)
+        except Exception:
+            pass
+    return res
+
+
+def choose_codec(results: List[dict], fps: float, margin: float) -> Optional[str]:
+    """
+    El que menos bytes/s produce entre los que codifican a ≥ fps × margin;
+    si ninguno llega, el más rápido de los que funcionan.
+    """
+    working = [r for r in results if r.get("ok")]
+    if not working:
+        return None
+    realtime = [r for r in working if r["encode_fps"] >= fps * margin]
+    if realtime:
+        return min(realtime, key=lambda r: r["bytes_per_sec"])["fourcc"]
+    return max(working, key=lambda r: r["encode_fps"])["fourcc"]
+
+
+def probe_codecs(sample, fps: float, runtime_dir: Path, candidates: str = DEFAULT_CANDIDATES,
+                 margin: float = 1.5, frames: int = 24, force: bool = False) -> str:
+    """
+    Devuelve el fourcc elegido para la resolución de 'sample' a 'fps'.
+    El resultado se guarda en RUNTIME_DIR/codec_probe.json y se reutiliza mientras no
+    cambien resolución, fps, candidatos ni la versión de OpenCV.
+    """
+    h, w = sample.shape[:2]
+    names = [c.strip() for c in candidates.split(",") if len(c.strip()) == 4]
+    key = f"{w}x{h}@{fps:g}|{cv2.__version__}|{','.join(names)}|{margin:g}"
+    path = runtime_dir / _PROBE_FILE
+    if not force:
+        try:
+            cached = json.loads(path.read_text(encoding="utf-8"))
+            if cached.get("key") == key and cached.get("chosen"):
+                print(f"[CODEC] {cached['chosen']} (probado el {time.strftime('%Y-%m-%d', time.localtime(cached.get('ts', 0)))})")
+                return cached["chosen"]
+        except Exception:
+            pass
+
+    t0 = time.perf_counter()
+    results = [_probe_one(c, sample, fps, max(4, int(frames)), runtime_dir) for c in names]
+    chosen = choose_codec(results, fps, margin) or "mp4v"
+    for r in results:
+        if r["ok"]:
+            print(f"[CODEC]   {r['fourcc']}: {r['encode_fps']:.0f} fps, {r['bytes_per_sec'] / 1024:.0f} KiB/s")
+        else:
+            print(f"[CODEC]   {r['fourcc']}: no disponible")
+    print(f"[CODEC] Elegido {chosen} para {w}x{h}@{fps:g} (margen x{margin:g}, "
+          f"prueba {time.perf_counter() - t0:.1f} s)")
+
+    tmp = path.with_suffix(".tmp")
+    try:
+        tmp.write_text(json.dumps({"key": key, "chosen": chosen, "ts": time.time(), "results": results},
+                                  ensure_ascii=False, indent=1), encoding="utf-8")
+        os.replace(tmp, path)
+    except Exception as e:
+        print(f"[CODEC] No se pudo guardar {path}: {e}")
+    return chosen
@@ -1,13 +1,18 @@
 from __future__ import annotations
 import os
+import json
 import time
 from pathlib import Path
 from dataclasses import dataclass, field
-from typing import Deque, Tuple, List, Optional
+from typing import TYPE_CHECKING, Any, Deque, Tuple, List, Optional, Dict, Iterable
 from collections import deque
 import cv2
 
 
+if TYPE_CHECKING:
+    from app.record.thumbs import KeyframePicker, ClipThumbnailer
+
+
 def _ensure_dir(p: Path) -> Path:
     p.mkdir(parents=True, exist_ok=True)
     return p
@@ -38,31 +43,45 @@ class CircularFrameBuffer:
 class DiskQuota:
     max_gb: float
 
+    # Compañeros de <base>.mp4 que se borran con él (metadatos, variante TG, miniaturas)
+    SIDECARS = (".json", ".tg.mp4", ".thumb.jpg", ".sheet.jpg")
+
     def enforce(self, dir_path: Path) -> None:
-        """Borra ficheros .mp4 más antiguos hasta bajar de la cuota."""
+        """
+        Borra los clips (clip_*.mp4) más antiguos hasta bajar de la cuota. Cada clip
+        cuenta con sus compañeros conocidos (SIDECARS) y se borra con ellos; ningún
+        otro fichero de la carpeta se toca (CLIP_DIR puede ser compartido).
+        """
         if self.max_gb <= 0:
             return
         total_bytes = 0
-        mp4s = []
-        for p in dir_path.glob("*.mp4"):
-            try:
-                st = p.stat()
-                size = st.st_size
-                total_bytes += size
-                mp4s.append((st.st_mtime, size, p))
-            except Exception:
+        groups = []  # (mtime, bytes, ficheros) por clip
+        for p in dir_path.glob("clip_*.mp4"):
+            if "." in p.stem:  # <clip>.tg.mp4 es un compañero, no un clip
                 continue
+            files, size, mtime = [], 0, None
+            for f in [p] + [dir_path / (p.stem + sfx) for sfx in self.SIDECARS]:
+                try:
+                    st = f.stat()
+                except Exception:
+                    continue
+                files.append(f)
+                size += st.st_size
+                mtime = st.st_mtime if mtime is None else min(mtime, st.st_mtime)
+            if files:
+                total_bytes += size
+                groups.append((mtime, size, files))
         limit = int(self.max_gb * (1024**3))
         if total_bytes <= limit:
             return
         # Ordenar por más antiguo primero
-        mp4s.sort(key=lambda x: x[0])
-        for _, size, p in mp4s:
-            try:
-                p.unlink(missing_ok=True)
-                total_bytes -= size
-            except Exception:
-                pass
+        for _, size, files in sorted(groups, key=lambda g: g[0]):
+            for p in files:
+                try:
+                    p.unlink(missing_ok=True)
+                except Exception:
+                    pass
+            total_bytes -= size
             if total_bytes <= limit:
                 break
 
@@ -77,6 +96,10 @@ class ClipSession:
     frames_written: int = 0
     path: Optional[Path] = None
     reason: str = "motion"  # "motion" | "manual"
+    tracks: Dict[int, Any] = field(default_factory=dict)  # id → Track (app.vision.tracker)
+    scale: Tuple[float, float] = (1.0, 1.0)  # coords procesadas → frame original
+    motion_frames: Optional[List[int]] = None  # [primer, último] frame del clip con movimiento
+    keyframes: Optional[KeyframePicker] = None  # frames para miniatura / hoja de contactos
 
     def duration(self, now_ts: float) -> float:
         return max(0.0, now_ts - self.open_ts)
@@ -91,6 +114,9 @@ class ClipRecorder:
       - Cierre por quiet gap, fin provisional o MAX_CLIP_SEC
       - Cuota de disco
       - Forzado de clip manual (/clip N)
+      - Miniatura y hoja de contactos al cerrar (si se pasa thumbnailer)
+    Los ts que recibe son de time.monotonic(): un salto del reloj (NTP) no adelanta
+    cierres ni vacía el preroll. La hora de pared solo se usa en nombres y metadatos.
     """
     def __init__(
         self,
@@ -103,6 +129,9 @@ class ClipRecorder:
         video_fps: Optional[float] = None,
         video_codec: str = "mp4v",
         quota_gb: float = 2.0,
+        thumbnailer: Optional[ClipThumbnailer] = None,
+        thumb_frames: int = 9,
+        thumb_width: int = 320,
     ):
         self.base_dir = _ensure_dir(base_dir)
         self.clip_dir = _ensure_dir(clip_dir if clip_dir.is_absolute() else (self.base_dir / clip_dir))
@@ -113,9 +142,17 @@ class ClipRecorder:
         self.video_fps = video_fps  # si None, se estimará en caliente
         self.video_codec = video_codec
         self.quota = DiskQuota(quota_gb)
+        self.thumbnailer = thumbnailer
+        self.thumb_frames = thumb_frames
+        self.thumb_width = thumb_width
         self.buffer = CircularFrameBuffer(self.pre_roll_sec)
         self.session: Optional[ClipSession] = None
 
+    @staticmethod
+    def _wall(ts: float) -> float:
+        """ts monótono → epoch (con el desfase actual entre ambos relojes)."""
+        return time.time() - (time.monotonic() - ts)
+
     # -------- API principal llamada desde run.py --------
 
     def notify_frame(self, ts: float, frame, fps_hint: Optional[float] = None) -> None:
@@ -125,14 +162,33 @@ class ClipRecorder:
         if self.session and self.session.writer is not None:
             self._write_frame_to_session(frame)
 
-    def notify_motion(self, ts: float, frame) -> None:
-        """Se llama en eventos de movimiento detectado (cuando está armado)."""
+    def notify_motion(self, ts: float, frame, score: float = 1.0) -> None:
+        """
+        Se llama en eventos de movimiento detectado (cuando está armado).
+        score (p.ej. área de las cajas) ordena los frames de la hoja de contactos.
+        """
         if self.session is None:
             # Abrir nueva sesión con preroll
             self._open_session(ts, frame, reason="motion")
         # Extiende la ventana de cierre
         self.session.last_motion_ts = ts
         self.session.extend_until = ts + self.post_roll_sec
+        idx = max(0, self.session.frames_written - 1)  # el frame actual ya está escrito
+        if self.session.motion_frames is None:
+            self.session.motion_frames = [idx, idx]
+        else:
+            self.session.motion_frames[1] = idx
+        kf = self.session.keyframes
+        if kf is not None and kf.wants(self._wall(ts), score):
+            kf.add(self._wall(ts), frame, score)
+
+    def note_tracks(self, tracks: Iterable, sx: float = 1.0, sy: float = 1.0) -> None:
+        """Asocia las pistas activas al clip en curso (sus trayectorias van al .json del clip)."""
+        if self.session is None:
+            return
+        self.session.scale = (sx, sy)
+        for t in tracks:
+            self.session.tracks[t.id] = t
 
     def force_clip(self, ts: float, frame, duration_sec: float) -> None:
         """
@@ -168,6 +224,14 @@ class ClipRecorder:
 
         return None
 
+    def close(self, ts: float) -> Optional[Path]:
+        """Al parar el visor: cierra el clip en curso (sin release() el .mp4 no se puede leer)."""
+        if not self.session:
+            return None
+        path = self._close_session(ts)
+        self._after_close_cleanup()
+        return path
+
     # -------------------- Internos --------------------
 
     def _open_session(self, ts: float, frame, reason: str) -> None:
@@ -177,7 +241,7 @@ class ClipRecorder:
         fourcc = cv2.VideoWriter_fourcc(*self.video_codec)
         # nombre de archivo
         suffix = "man" if reason == "manual" else "mov"
-        fname = time.strftime(f"clip_%Y%m%d_%H%M%S_{suffix}.mp4", time.localtime(ts))
+        fname = time.strftime(f"clip_%Y%m%d_%H%M%S_{suffix}.mp4", time.localtime(self._wall(ts)))
         out_path = self.clip_dir / fname
 
         writer = cv2.VideoWriter(str(out_path), fourcc, fps, (w, h))
@@ -200,6 +264,11 @@ class ClipRecorder:
             path=out_path,
             reason=reason,
         )
+        if self.thumbnailer is not None:
+            from app.record.thumbs import KeyframePicker  # solo con THUMB_ENABLE
+            # El frame de apertura asegura miniatura también en clips manuales sin movimiento
+            self.session.keyframes = KeyframePicker(self.thumb_frames, self.thumb_width)
+            self.session.keyframes.add(self._wall(ts), frame, 0.0)
 
         # Escribir preroll (desde ts - pre_roll_sec)
         start_from = ts - self.pre_roll_sec
@@ -225,9 +294,48 @@ class ClipRecorder:
             print(f"[REC] Sesión CERRADA → {path} (frames={self.session.frames_written}, reason={self.session.reason})")
         except Exception as e:
             print(f"[REC] ERROR al cerrar sesión: {e}")
+        self._write_metadata(self.session, ts)
+        if self.thumbnailer is not None and self.session.keyframes is not None and path is not None:
+            self.thumbnailer.submit(path, self.session.keyframes)
         self.session = None
         return path
 
+    def _write_metadata(self, session: ClipSession, close_ts: float) -> None:
+        """Sidecar <clip>.json con los datos del clip y las trayectorias de las pistas."""
+        if session.path is None:
+            return
+        sx, sy = session.scale
+        t_from = session.open_ts - self.pre_roll_sec
+        tracks = []
+        for t in session.tracks.values():
+            pts = [[round(ts - session.open_ts, 3), int(cx * sx), int(cy * sy)]
+                   for ts, cx, cy in t.path if t_from <= ts <= close_ts]
+            if not pts:
+                continue
+            x, y, w, h = t.box
+            tracks.append({
+                "id": t.id,
+                "first_ts": round(self._wall(t.first_ts), 3),
+                "last_ts": round(self._wall(t.last_ts), 3),
+                "hits": t.hits,
+                "label": getattr(t, "label", None),
+                "last_box": [int(x * sx), int(y * sy), int(w * sx), int(h * sy)],
+                "path": pts,  # [segundos desde la apertura, cx, cy] en px del frame original
+            })
+        meta = {
+            "clip": session.path.name,
+            "reason": session.reason,
+            "open_ts": round(self._wall(session.open_ts), 3),
+            "close_ts": round(self._wall(close_ts), 3),
+            "frames": session.frames_written,
+            "motion_frames": session.motion_frames,
+            "tracks": tracks,
+        }
+        try:
+            session.path.with_suffix(".json").write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+        except Exception as e:
+            print(f"[REC] ERROR al escribir metadatos: {e}")
+
     def _after_close_cleanup(self) -> None:
         # Enforce quota
         try:
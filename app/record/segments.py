@@ -0,0 +1,502 @@
+# grabación continua en segmentos + índice de movimiento + cortes bajo demanda
+
+from __future__ import annotations
+import os
+import json
+import time
+import queue
+import shutil
+import threading
+import subprocess
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import cv2
+
+
+_CLOCK_STEP_SEC = 1.0  # desfase pared/monótono que se toma por salto de reloj (NTP corrige despacio por debajo)
+
+
+@dataclass
+class _Session:
+    """Tramo continuo a fps constante: el segmento k cubre [start + k·seg_sec, start + (k+1)·seg_sec)."""
+    id: str
+    start: float
+    seg_sec: float
+    fps: float
+    size: Tuple[int, int]
+    closed: bool = False
+    frames: int = 0
+    mono: float = 0.0  # time.monotonic() de start (solo la sesión en curso; no va al índice)
+
+    def seg_name(self, k: int) -> str:
+        return f"seg_{self.id}_{k:05d}.mp4"
+
+    def seg_range(self, k: int) -> Tuple[float, float]:
+        a = self.start + k * self.seg_sec
+        return a, a + self.seg_sec
+
+
+@dataclass
+class _Event:
+    start: float
+    end: float
+    armed: bool = False
+
+
+@dataclass
+class CutResult:
+    path: Path
+    reason: str
+    start: float
+    end: float
+
+
+@dataclass
+class _CutJob:
+    start: float
+    end: float
+    reason: str
+    deadline: float
+
+
+class SegmentRecorder:
+    """
+    Grabación 24/7 en segmentos de seg_sec segundos con un único codificador abierto:
+    - con ffmpeg: un proceso (muxer 'segment', keyframe cada segundo) recibe frames BGR
+      por stdin; si no hay ffmpeg, VideoWriter de OpenCV rotando de fichero
+    - fps constante: el hilo escritor duplica/descarta frames según el reloj monótono,
+      así el instante t (pared) está en el segmento (t - start) // seg_sec, offset exacto;
+      si el reloj de pared salta (NTP) respecto al monótono se abre sesión nueva
+    - índice (index.jsonl): sesiones (para localizar segmentos) y eventos de movimiento
+    - retención: segmentos sin eventos se borran antes que los que solapan eventos,
+      además de una cuota total en GB
+    - cortes bajo demanda: ffmpeg -c copy (sin recodificar); sin ffmpeg, recodifica
+    write() y mark_motion() no bloquean el bucle (cola acotada, descarta si se llena).
+    close() sí espera: cierra el segmento en curso (un .mp4 sin cerrar no se puede leer)
+    y termina los cortes pendientes.
+    """
+    def __init__(self, seg_dir: Path, clip_dir: Path, seg_sec: float = 60.0, fps: float = 12.0,
+                 codec: str = "mp4v", use_ffmpeg: str = "auto", ffmpeg_codec: str = "libx264",
+                 event_gap_sec: float = 5.0, retain_quiet_hours: float = 24.0,
+                 retain_event_hours: float = 168.0, max_gb: float = 20.0):
+        self.seg_dir = Path(seg_dir)
+        self.seg_dir.mkdir(parents=True, exist_ok=True)
+        self.clip_dir = Path(clip_dir)
+        self.clip_dir.mkdir(parents=True, exist_ok=True)
+        self.seg_sec = max(5.0, float(seg_sec))
+        self.fps = max(1.0, float(fps))
+        self.codec = codec
+        self.ffmpeg = shutil.which("ffmpeg") if str(use_ffmpeg).lower() in ("auto", "true", "1", "yes") else None
+        self.ffmpeg_codec = ffmpeg_codec
+        self.event_gap = max(0.5, float(event_gap_sec))
+        self.retain_quiet = max(0.0, float(retain_quiet_hours)) * 3600
+        self.retain_event = max(0.0, float(retain_event_hours)) * 3600
+        self.max_bytes = int(max(0.0, float(max_gb)) * (1024 ** 3))
+        self.index_path = self.seg_dir / "index.jsonl"
+
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, _Session] = {}
+        self._events: List[_Event] = []
+        self._load_index()
+        self._event: Optional[_Event] = None
+        self._closed_events: List[_Event] = []
+
+        self._q: "queue.Queue" = queue.Queue(maxsize=int(self.fps * 2))
+        self.dropped = 0
+        self._cur: Optional[_Session] = None
+        self._proc: Optional[subprocess.Popen] = None
+        self._writer: Optional[cv2.VideoWriter] = None
+        self._writer_k = -1
+        self._last_retention = 0.0
+
+        self._cuts: "queue.Queue" = queue.Queue()
+        self._cut_done: List[CutResult] = []
+        self._write_thread = threading.Thread(target=self._write_loop, name="segments", daemon=True)
+        self._cut_thread = threading.Thread(target=self._cut_loop, name="segment-cuts", daemon=True)
+        self._write_thread.start()
+        self._cut_thread.start()
+        mode = f"ffmpeg ({self.ffmpeg_codec})" if self.ffmpeg else f"OpenCV ({self.codec})"
+        print(f"[SEG] Grabación continua → {self.seg_dir} (segmentos de {self.seg_sec:.0f} s, {mode})")
+
+    # -------------------- índice --------------------
+
+    def _append_index(self, rec: dict) -> None:
+        with self._lock:
+            try:
+                with open(self.index_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(rec) + "\n")
+            except Exception as e:
+                print(f"[SEG] ERROR escribiendo índice: {e}")
+
+    def _load_index(self) -> None:
+        if not self.index_path.exists():
+            return
+        try:
+            for line in self.index_path.read_text(encoding="utf-8").splitlines():
+                rec = json.loads(line)
+                if rec.get("type") == "session":
+                    self._sessions[rec["id"]] = _Session(rec["id"], rec["start"], rec["seg_sec"], rec["fps"],
+                                                         tuple(rec["size"]), closed=True)
+                elif rec.get("type") == "session_end" and rec.get("id") in self._sessions:
+                    s = self._sessions[rec["id"]]
+                    s.frames = int(round((rec["end"] - s.start) * s.fps))
+                elif rec.get("type") == "event":
+                    self._events.append(_Event(rec["start"], rec["end"], rec.get("armed", False)))
+        except Exception as e:
+            print(f"[SEG] Índice ilegible ({e}); se empieza uno nuevo")
+            self._sessions, self._events = {}, []
+        # Sesiones sin cierre registrado (proceso caído): su fin es el último segmento en disco
+        for s in self._sessions.values():
+            if s.frames == 0:
+                ks = [int(p.stem.rsplit("_", 1)[1]) for p in self.seg_dir.glob(f"seg_{s.id}_*.mp4")]
+                if ks:
+                    s.frames = int(round((max(ks) + 1) * s.seg_sec * s.fps))
+
+    def _rewrite_index(self) -> None:
+        tmp = self.index_path.with_suffix(".tmp")
+        with self._lock:
+            lines = []
+            for s in self._sessions.values():
+                lines.append(json.dumps({"type": "session", "id": s.id, "start": s.start, "seg_sec": s.seg_sec,
+                                         "fps": s.fps, "size": list(s.size)}))
+                if s.closed and s.frames:
+                    lines.append(json.dumps({"type": "session_end", "id": s.id,
+                                             "end": s.start + s.frames / s.fps}))
+            lines += [json.dumps({"type": "event", "start": e.start, "end": e.end, "armed": e.armed})
+                      for e in self._events]
+            try:
+                tmp.write_text("\n".join(lines) + ("\n" if lines else ""), encoding="utf-8")
+                os.replace(tmp, self.index_path)
+            except Exception as e:
+                print(f"[SEG] ERROR compactando índice: {e}")
+
+    # -------------------- API del bucle --------------------
+
+    def write(self, ts: float, frame, mono: Optional[float] = None) -> None:
+        """ts: pared (sesiones e índice); mono: time.monotonic() del frame (ritmo del escritor)."""
+        if mono is None:
+            mono = time.monotonic()
+        try:
+            self._q.put_nowait((ts, mono, frame.copy()))
+        except queue.Full:
+            self.dropped += 1
+
+    def mark_motion(self, ts: float, armed: bool = False) -> None:
+        """Añade ts al evento abierto (o abre uno si pasó más de event_gap)."""
+        ev = self._event
+        if ev is not None and ts - ev.end <= self.event_gap:
+            ev.end = ts
+            ev.armed = ev.armed or armed
+            return
+        self._close_event()
+        self._event = _Event(ts, ts, armed)
+
+    def _close_event(self) -> None:
+        ev, self._event = self._event, None
+        if ev is None:
+            return
+        with self._lock:
+            self._events.append(ev)
+        self._closed_events.append(ev)
+        self._append_index({"type": "event", "start": ev.start, "end": ev.end, "armed": ev.armed})
+
+    def tick(self, ts: float) -> List[_Event]:
+        """Cierra el evento si lleva event_gap sin movimiento; devuelve los cerrados (para cortar/enviar)."""
+        if self._event is not None and ts - self._event.end > self.event_gap:
+            self._close_event()
+        done, self._closed_events = self._closed_events, []
+        return done
+
+    def request_cut(self, start: float, end: float, reason: str = "motion") -> None:
+        """Encola un corte [start, end]; se hace cuando los segmentos que lo cubren están cerrados."""
+        if end <= start:
+            return
+        self._cuts.put(_CutJob(start, end, reason, deadline=end + 2 * self.seg_sec + 30))
+
+    def poll_cuts(self) -> List[CutResult]:
+        with self._lock:
+            done, self._cut_done = self._cut_done, []
+        return done
+
+    def events(self, since: float = 0.0) -> List[Tuple[float, float]]:
+        with self._lock:
+            return [(e.start, e.end) for e in self._events if e.end >= since]
+
+    def close(self, timeout: float = 30.0) -> None:
+        """Cierra el evento abierto y la sesión (session_end en el índice); espera a escritor y cortes."""
+        self._close_event()
+        try:
+            self._q.put(None, timeout=timeout)
+        except queue.Full:
+            print("[SEG] Cola de escritura llena al cerrar; el último segmento puede quedar incompleto")
+        self._write_thread.join(timeout)
+        self._cuts.put(None)
+        self._cut_thread.join(timeout)
+        if self._write_thread.is_alive() or self._cut_thread.is_alive():
+            print(f"[SEG] Cierre sin terminar tras {timeout:.0f} s")
+
+    # -------------------- escritor (hilo propio) --------------------
+
+    def _open_session(self, ts: float, mono: float, frame) -> None:
+        self._close_session()
+        h, w = frame.shape[:2]
+        base = sid = time.strftime("%Y%m%d_%H%M%S", time.localtime(ts))
+        # Dos sesiones en el mismo segundo (reinicio rápido): sufijo -2, -3…
+        n = 1
+        while sid in self._sessions or any(self.seg_dir.glob(f"seg_{sid}_*.mp4")):
+            n += 1
+            sid = f"{base}-{n}"
+        s = _Session(sid, ts, self.seg_sec, self.fps, (w, h), mono=mono)
+        if self.ffmpeg:
+            pattern = str(self.seg_dir / f"seg_{sid}_%05d.mp4")
+            enc = ["-c:v", self.ffmpeg_codec] + (["-preset", "veryfast"] if self.ffmpeg_codec == "libx264" else [])
+            # keyframe cada segundo: los cortes con -c copy quedan alineados a ±1 s
+            cmd = ([self.ffmpeg, "-hide_banner", "-loglevel", "error", "-y",
+                    "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{w}x{h}", "-framerate", f"{self.fps:g}",
+                    "-i", "-"] + enc +
+                   ["-pix_fmt", "yuv420p", "-force_key_frames", "expr:gte(t,n_forced*1)",
+                    "-f", "segment", "-segment_time", f"{self.seg_sec:g}", "-reset_timestamps", "1",
+                    "-segment_format", "mp4", pattern])
+            try:
+                self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                              stderr=subprocess.DEVNULL)
+            except Exception as e:
+                print(f"[SEG] ffmpeg no arranca ({e}); se usa OpenCV")
+                self.ffmpeg = None
+        self._cur = s
+        self._writer_k = -1
+        with self._lock:
+            self._sessions[sid] = s
+        self._append_index({"type": "session", "id": sid, "start": ts, "seg_sec": s.seg_sec,
+                            "fps": s.fps, "size": [w, h]})
+
+    def _close_session(self) -> None:
+        if self._proc is not None:
+            try:
+                self._proc.stdin.close()
+                self._proc.wait(timeout=30)
+            except Exception:
+                self._proc.kill()
+            self._proc = None
+        if self._writer is not None:
+            self._writer.release()
+            self._writer = None
+        if self._cur is not None:
+            s, self._cur = self._cur, None
+            s.closed = True
+            self._append_index({"type": "session_end", "id": s.id, "end": s.start + s.frames / s.fps})
+
+    def _emit(self, frame) -> None:
+        s = self._cur
+        if self._proc is not None:
+            try:
+                self._proc.stdin.write(frame.tobytes())
+            except Exception as e:
+                print(f"[SEG] ffmpeg terminó ({e}); se sigue con OpenCV")
+                self._proc = None
+                self.ffmpeg = None
+                self._close_session()
+                return
+        else:
+            k = int(s.frames // round(s.seg_sec * s.fps))
+            if k != self._writer_k:
+                if self._writer is not None:
+                    self._writer.release()
+                path = self.seg_dir / s.seg_name(k)
+                self._writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*self.codec), s.fps, s.size)
+                if not self._writer.isOpened():
+                    self._writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), s.fps, s.size)
+                self._writer_k = k
+                self._retention(time.time())
+            self._writer.write(frame)
+        s.frames += 1
+
+    def _write_loop(self) -> None:
+        while True:
+            item = self._q.get()
+            if item is None:
+                self._close_session()
+                return
+            ts, mono, frame = item
+            try:
+                s = self._cur
+                h, w = frame.shape[:2]
+                # Sesión nueva si no hay, cambia la resolución, hubo un corte largo de imagen
+                # o el reloj de pared saltó (NTP): la línea de tiempo de la sesión (start +
+                # frames/fps) dejaría de casar con los ts de eventos y cortes
+                if (s is None or s.size != (w, h) or mono - (s.mono + s.frames / s.fps) > 5.0
+                        or abs((ts - s.start) - (mono - s.mono)) > _CLOCK_STEP_SEC):
+                    self._open_session(ts, mono, frame)
+                    s = self._cur
+                # fps constante: cuántos frames deberían existir ya hasta mono
+                due = int((mono - s.mono) * s.fps) + 1 - s.frames
+                for _ in range(max(0, due)):
+                    self._emit(frame)
+                    if self._cur is None:
+                        break
+                if self.ffmpeg and time.time() - self._last_retention >= self.seg_sec:
+                    self._retention(time.time())
+            except Exception as e:
+                print(f"[SEG] ERROR escribiendo segmento: {e}")
+
+    # -------------------- retención --------------------
+
+    def _segments(self) -> List[Tuple[float, float, Path, int]]:
+        """(inicio, fin, ruta, bytes) de los segmentos presentes en disco."""
+        out = []
+        with self._lock:
+            sessions = dict(self._sessions)
+        for p in self.seg_dir.glob("seg_*.mp4"):
+            try:
+                sid, k = p.stem[len("seg_"):].rsplit("_", 1)
+                s = sessions.get(sid)
+                if s is None:
+                    continue
+                a, b = s.seg_range(int(k))
+                out.append((a, b, p, p.stat().st_size))
+            except Exception:
+                continue
+        out.sort(key=lambda x: x[0])
+        return out
+
+    def _has_event(self, a: float, b: float) -> bool:
+        with self._lock:
+            return any(e.start <= b and e.end >= a for e in self._events)
+
+    def _retention(self, now: float) -> None:
+        self._last_retention = now
+        cur_seg = None
+        if self._cur is not None:
+            k = int(max(0.0, now - self._cur.start) // self._cur.seg_sec)
+            cur_seg = self._cur.seg_name(k)
+        segs = [x for x in self._segments() if x[2].name != cur_seg]
+        removed = 0
+        keep = []
+        for a, b, p, size in segs:
+            ev = self._has_event(a, b)
+            limit = self.retain_event if ev else self.retain_quiet
+            if limit > 0 and now - b > limit:
+                p.unlink(missing_ok=True)
+                removed += 1
+            else:
+                keep.append((not ev, a, p, size))
+        if self.max_bytes > 0:
+            total = sum(x[3] for x in keep)
+            # Cuota: primero los segmentos sin eventos, del más antiguo al más nuevo
+            for quiet, a, p, size in sorted(keep, key=lambda x: (not x[0], x[1])):
+                if total <= self.max_bytes:
+                    break
+                p.unlink(missing_ok=True)
+                total -= size
+                removed += 1
+        if removed:
+            self._compact()
+
+    def _compact(self) -> None:
+        segs = self._segments()
+        oldest = segs[0][0] if segs else time.time()
+        live = {p.stem.split("_", 1)[1].rsplit("_", 1)[0] for _, _, p, _ in segs}
+        with self._lock:
+            self._sessions = {k: s for k, s in self._sessions.items() if k in live or not s.closed}
+            self._events = [e for e in self._events if e.end >= oldest]
+        self._rewrite_index()
+
+    # -------------------- cortes --------------------
+
+    def _covering(self, a: float, b: float) -> Tuple[List[Tuple[_Session, int, float, float]], bool]:
+        """Segmentos que cubren [a, b] → [(sesión, k, inpoint, outpoint)], y si están todos cerrados."""
+        parts, ready = [], True
+        with self._lock:
+            sessions = sorted(self._sessions.values(), key=lambda s: s.start)
+        for s in sessions:
+            end_s = s.start + s.frames / s.fps
+            if s.start > b or end_s < a:
+                continue
+            k0 = int(max(0.0, a - s.start) // s.seg_sec)
+            k1 = int(max(0.0, b - s.start) // s.seg_sec)
+            for k in range(k0, k1 + 1):
+                sa, sb = s.seg_range(k)
+                if not s.closed and not (self.seg_dir / s.seg_name(k + 1)).exists():
+                    ready = False  # aún escribiéndose
+                if not (self.seg_dir / s.seg_name(k)).exists():
+                    continue
+                parts.append((s, k, max(0.0, a - sa), min(s.seg_sec, b - sa)))
+        return parts, ready
+
+    def _cut_loop(self) -> None:
+        pending: List[_CutJob] = []
+        stopping = False  # close(): la sesión ya está cerrada, se corta lo pendiente y se sale
+        while not (stopping and not pending):
+            try:
+                job = self._cuts.get(timeout=1.0)
+                if job is None:
+                    stopping = True
+                else:
+                    pending.append(job)
+            except queue.Empty:
+                pass
+            now = time.time()
+            for job in list(pending):
+                parts, ready = self._covering(job.start, job.end)
+                if not ready and now < job.deadline and not stopping:
+                    continue
+                pending.remove(job)
+                if not parts:
+                    print(f"[SEG] Corte sin segmentos para {job.start:.0f}–{job.end:.0f}")
+                    continue
+                suffix = "man" if job.reason == "manual" else "mov"
+                out = self.clip_dir / time.strftime(f"clip_%Y%m%d_%H%M%S_{suffix}.mp4", time.localtime(job.start))
+                t0 = time.perf_counter()
+                ok = self._cut_ffmpeg(parts, out) if self.ffmpeg else self._cut_opencv(parts, out)
+                if ok:
+                    print(f"[SEG] Corte {out.name}: {job.end - job.start:.0f} s de {len(parts)} segmento(s) "
+                          f"en {time.perf_counter() - t0:.1f} s ({'copia' if self.ffmpeg else 'recodificado'})")
+                    with self._lock:
+                        self._cut_done.append(CutResult(out, job.reason, job.start, job.end))
+
+    def _cut_ffmpeg(self, parts, out: Path) -> bool:
+        lst = out.with_suffix(".txt")
+        lines = []
+        for s, k, ip, op in parts:
+            lines.append(f"file '{(self.seg_dir / s.seg_name(k)).as_posix()}'")
+            lines.append(f"inpoint {ip:.3f}")
+            lines.append(f"outpoint {op:.3f}")
+        try:
+            lst.write_text("\n".join(lines) + "\n", encoding="utf-8")
+            r = subprocess.run([self.ffmpeg, "-hide_banner", "-loglevel", "error", "-y", "-f", "concat",
+                                "-safe", "0", "-i", str(lst), "-c", "copy", "-movflags", "+faststart", str(out)],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=120)
+            if r.returncode != 0:
+                print(f"[SEG] ffmpeg corte falló: {r.stderr.decode(errors='ignore')[:300]}")
+                return False
+            return True
+        except Exception as e:
+            print(f"[SEG] ERROR en corte: {e}")
+            return False
+        finally:
+            lst.unlink(missing_ok=True)
+
+    def _cut_opencv(self, parts, out: Path) -> bool:
+        writer = None
+        try:
+            for s, k, ip, op in parts:
+                cap = cv2.VideoCapture(str(self.seg_dir / s.seg_name(k)))
+                cap.set(cv2.CAP_PROP_POS_FRAMES, int(ip * s.fps))
+                n = int((op - ip) * s.fps)
+                for _ in range(max(0, n)):
+                    ok, f = cap.read()
+                    if not ok:
+                        break
+                    if writer is None:
+                        writer = cv2.VideoWriter(str(out), cv2.VideoWriter_fourcc(*self.codec), s.fps,
+                                                 (f.shape[1], f.shape[0]))
+                    writer.write(f)
+                cap.release()
+            return writer is not None
+        except Exception as e:
+            print(f"[SEG] ERROR en corte: {e}")
+            return False
+        finally:
+            if writer is not None:
+                writer.release()
@@ -0,0 +1,153 @@
+# miniatura y hoja de contactos de cada clip, con los frames que ya vio el grabador
+
+from __future__ import annotations
+import time
+import queue
+import threading
+from dataclasses import dataclass
+from datetime import date
+from pathlib import Path
+from typing import List, Optional, Tuple
+import cv2
+import numpy as np
+
+THUMB_SUFFIX = ".thumb.jpg"
+SHEET_SUFFIX = ".sheet.jpg"
+
+
+@dataclass
+class _Key:
+    ts: float
+    score: float
+    image: object  # frame reducido (con las cajas ya dibujadas)
+
+
+class KeyframePicker:
+    """
+    Guarda durante el clip los frames de pico de movimiento (reducidos a width):
+    - un candidato por tramo de min_gap_sec (el de más puntuación del tramo)
+    - como mucho 2·k candidatos; sobra el de menor puntuación
+    wants() se consulta antes de reducir el frame: el bucle solo paga el resize
+    cuando el frame se va a guardar.
+    """
+    def __init__(self, k: int = 9, width: int = 320, min_gap_sec: float = 0.5):
+        self.k = max(1, int(k))
+        self.width = max(32, int(width))
+        self.min_gap_sec = max(0.0, float(min_gap_sec))
+        self._keys: List[_Key] = []
+        self._slot_ts = float("-inf")  # inicio del tramo del último candidato
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def wants(self, ts: float, score: float) -> bool:
+        if not self._keys:
+            return True
+        if ts - self._slot_ts < self.min_gap_sec:
+            return score > self._keys[-1].score
+        return len(self._keys) < 2 * self.k or score > min(k.score for k in self._keys)
+
+    def add(self, ts: float, frame, score: float) -> None:
+        if not self.wants(ts, score):
+            return
+        h, w = frame.shape[:2]
+        if w > self.width:
+            img = cv2.resize(frame, (self.width, max(1, int(h * self.width / float(w)))),
+                             interpolation=cv2.INTER_AREA)
+        else:
+            img = frame.copy()
+        key = _Key(ts, float(score), img)
+        if self._keys and ts - self._slot_ts < self.min_gap_sec:
+            self._keys[-1] = key
+            return
+        self._slot_ts = ts
+        self._keys.append(key)
+        if len(self._keys) > 2 * self.k:
+            self._keys.remove(min(self._keys, key=lambda k: k.score))
+
+    def pick(self) -> Tuple[Optional[_Key], List[_Key]]:
+        """(mejor frame, los k mejores en orden cronológico)."""
+        if not self._keys:
+            return None, []
+        best = sorted(self._keys, key=lambda k: k.score, reverse=True)[: self.k]
+        return best[0], sorted(best, key=lambda k: k.ts)
+
+
+def compose_sheet(keys: List[_Key], cols: int = 3) -> np.ndarray:
+    """Rejilla de frames (hora en cada uno); las celdas vacías quedan en negro."""
+    cols = max(1, min(int(cols), len(keys)))
+    rows = (len(keys) + cols - 1) // cols
+    th = max(k.image.shape[0] for k in keys)
+    tw = max(k.image.shape[1] for k in keys)
+    sheet = np.zeros((rows * th, cols * tw, 3), dtype=np.uint8)
+    for i, k in enumerate(keys):
+        r, c = divmod(i, cols)
+        img = k.image
+        if img.shape[:2] != (th, tw):
+            img = cv2.resize(img, (tw, th), interpolation=cv2.INTER_AREA)
+        tile = sheet[r * th:(r + 1) * th, c * tw:(c + 1) * tw]
+        tile[:] = img
+        label = time.strftime("%H:%M:%S", time.localtime(k.ts))
+        cv2.putText(tile, label, (4, th - 6), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (0, 0, 0), 3, cv2.LINE_AA)
+        cv2.putText(tile, label, (4, th - 6), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (255, 255, 255), 1, cv2.LINE_AA)
+    return sheet
+
+
+def day_sheets(clip_dir: Path, day: date) -> List[Path]:
+    """Hojas de contactos de los clips de un día (por el nombre clip_AAAAMMDD_…), en orden."""
+    return sorted(Path(clip_dir).glob(f"clip_{day:%Y%m%d}_*{SHEET_SUFFIX}"))
+
+
+class ClipThumbnailer:
+    """
+    Hilo posterior al cierre de un clip: escribe junto al .mp4 la miniatura
+    (<clip>.thumb.jpg, el frame de más movimiento) y la hoja de contactos
+    (<clip>.sheet.jpg, rejilla de picos de movimiento). No decodifica el vídeo: usa
+    los frames que KeyframePicker guardó mientras se grababa. DiskQuota los borra
+    con su clip.
+    """
+    def __init__(self, cols: int = 3, jpeg_quality: int = 80):
+        self.cols = max(1, int(cols))
+        self.jpeg_quality = int(jpeg_quality)
+        self._q: "queue.Queue[Optional[Tuple[Path, KeyframePicker]]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self.written = 0
+
+    def submit(self, clip_path: Path, picker: KeyframePicker) -> None:
+        if not len(picker):
+            return
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="clip-thumbs", daemon=True)
+            self._thread.start()
+        self._q.put((Path(clip_path), picker))
+
+    def close(self, timeout: float = 30.0) -> None:
+        """Termina las miniaturas pendientes (el clip cerrado al parar también) y para el hilo."""
+        if self._thread is None:
+            return
+        self._q.put(None)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            print(f"[THUMB] Cierre sin terminar tras {timeout:.0f} s")
+
+    def _write(self, path: Path, img) -> None:
+        ok, buf = cv2.imencode(".jpg", img, [int(cv2.IMWRITE_JPEG_QUALITY), self.jpeg_quality])
+        if not ok:
+            raise RuntimeError("imencode falló")
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_bytes(buf.tobytes())
+        tmp.replace(path)
+
+    def _run(self) -> None:
+        while True:
+            job = self._q.get()
+            if job is None:
+                break
+            clip_path, picker = job
+            try:
+                best, keys = picker.pick()
+                self._write(clip_path.with_name(clip_path.stem + THUMB_SUFFIX), best.image)
+                self._write(clip_path.with_name(clip_path.stem + SHEET_SUFFIX), compose_sheet(keys, self.cols))
+                self.written += 1
+            except Exception as e:
+                print(f"[THUMB] ERROR con {clip_path.name}: {e}")
@@ -0,0 +1,279 @@
+# variante reducida de cada clip para Telegram (pool de procesos, presupuesto de bytes)
+
+from __future__ import annotations
+import os
+import json
+import math
+import time
+import shutil
+import subprocess
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor
+
+VARIANT_SUFFIX = ".tg.mp4"
+
+
+def _init_worker(nice: int) -> None:
+    """Los workers heredan la CPU fijada de la cámara: liberarla y bajar prioridad."""
+    if hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(0, range(os.cpu_count() or 1))
+        except Exception:
+            pass
+    if nice > 0 and hasattr(os, "nice"):
+        try:
+            os.nice(nice)
+        except Exception:
+            pass
+
+
+def _ffmpeg_pass(ffmpeg: str, src: str, dst: str, start: float, dur: float, width: int,
+                 fps: float, kbps: int) -> bool:
+    cmd = [ffmpeg, "-y", "-loglevel", "error", "-ss", f"{start:.3f}", "-i", src, "-t", f"{dur:.3f}",
+           "-vf", f"scale='min({width},iw)':-2,fps={fps:g}", "-an",
+           "-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p",
+           "-b:v", f"{kbps}k", "-maxrate", f"{kbps}k", "-bufsize", f"{2 * kbps}k",
+           "-movflags", "+faststart", dst]
+    return subprocess.run(cmd, stdin=subprocess.DEVNULL).returncode == 0
+
+
+def _opencv_pass(src: str, dst: str, first: int, last: int, step: int, width: int,
+                 fps: float, codec: str) -> Tuple[int, int, int]:
+    """Decodifica [first, last] cada step frames, reduce a width y escribe. → (frames, w, h)."""
+    import cv2
+    cap = cv2.VideoCapture(src)
+    writer = None
+    n = 0
+    size = (0, 0)
+    try:
+        if first > 0:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, first)
+        idx = first
+        while idx <= last:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            if (idx - first) % step == 0:
+                h0, w0 = frame.shape[:2]
+                if writer is None:
+                    w = min(w0, width) // 2 * 2
+                    h = max(2, int(round(h0 * w / float(w0))) // 2 * 2)
+                    size = (w, h)
+                    writer = cv2.VideoWriter(dst, cv2.VideoWriter_fourcc(*codec), fps, size)
+                    if not writer.isOpened():
+                        raise RuntimeError(f"VideoWriter {codec} no disponible")
+                if (w0, h0) != size:
+                    frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+                writer.write(frame)
+                n += 1
+            idx += 1
+    finally:
+        cap.release()
+        if writer is not None:
+            writer.release()
+    return n, size[0], size[1]
+
+
+def transcode_clip(src: str, dst: str, budget_bytes: int, max_width: int, max_fps: float,
+                   trim: Optional[Tuple[int, int]], codec: str = "mp4v",
+                   ffmpeg: Optional[str] = None, pad_sec: float = 1.0, attempts: int = 3) -> dict:
+    """
+    Variante de src que cabe en budget_bytes (se ejecuta en un worker):
+    - recorta a los frames trim=[a, b] (tramo con movimiento) ± pad_sec si se indica
+    - limita anchura y fps
+    - con ffmpeg, bitrate calculado para el presupuesto; sin él (OpenCV no controla el
+      bitrate), reduce la anchura en proporción a lo que sobra y reintenta
+    """
+    import cv2
+    t0 = time.perf_counter()
+    cap = cv2.VideoCapture(src)
+    src_fps = cap.get(cv2.CAP_PROP_FPS) or 12.0
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    src_w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH) or 0)
+    cap.release()
+    if total <= 0 or src_w <= 0:
+        raise RuntimeError(f"no se puede leer {src}")
+    pad = int(round(pad_sec * src_fps))
+    first, last = (0, total - 1) if trim is None else (max(0, trim[0] - pad), min(total - 1, trim[1] + pad))
+    step = max(1, int(round(src_fps / max_fps))) if max_fps > 0 else 1
+    fps = src_fps / step
+    dur = (last - first + 1) / src_fps
+    width = min(src_w, int(max_width)) if max_width > 0 else src_w
+
+    tool = "ffmpeg" if ffmpeg else "opencv"
+    kbps = max(50, int(budget_bytes * 8 * 0.92 / max(0.5, dur) / 1000))
+    frames = out_w = out_h = 0
+    out_bytes = 0
+    tries = 0
+    for tries in range(1, max(1, attempts) + 1):
+        if ffmpeg:
+            if not _ffmpeg_pass(ffmpeg, src, dst, first / src_fps, dur, width, fps, kbps):
+                raise RuntimeError("ffmpeg falló")
+        else:
+            frames, out_w, out_h = _opencv_pass(src, dst, first, last, step, width, fps, codec)
+        out_bytes = os.path.getsize(dst) if os.path.exists(dst) else 0
+        if 0 < out_bytes <= budget_bytes:
+            break
+        # Demasiado grande: los bytes escalan ~ con el área (OpenCV) o con el bitrate (ffmpeg)
+        ratio = budget_bytes / float(max(1, out_bytes))
+        if ffmpeg:
+            kbps = max(50, int(kbps * ratio * 0.9))
+        else:
+            width = max(160, int(width * math.sqrt(ratio) * 0.9))
+    src_bytes = os.path.getsize(src)
+    return {
+        "tool": tool,
+        "src_bytes": src_bytes,
+        "out_bytes": out_bytes,
+        "ratio": round(src_bytes / float(max(1, out_bytes)), 2),
+        "fits": 0 < out_bytes <= budget_bytes,
+        "seconds": round(time.perf_counter() - t0, 2),
+        "attempts": tries,
+        "trim": [first, last] if trim is not None else None,
+        "duration_sec": round(dur, 2),
+        "fps": round(fps, 2),
+        "width": out_w or width,
+        "height": out_h or None,
+        "frames": frames or None,
+    }
+
+
+def _width(path: Path) -> int:
+    import cv2
+    cap = cv2.VideoCapture(str(path))
+    try:
+        return int(cap.get(cv2.CAP_PROP_FRAME_WIDTH) or 0) or 1 << 30
+    finally:
+        cap.release()
+
+
+@dataclass
+class TranscodeResult:
+    src: Path
+    path: Path            # lo que se debe enviar (variante, o el original si no hizo falta)
+    stats: Optional[dict]
+    error: Optional[str] = None
+
+
+class ClipTranscoder:
+    """
+    Etapa posterior al cierre de un clip: genera <clip>.tg.mp4 en un pool de procesos
+    (la codificación no compite con el bucle por el GIL ni por la CPU fijada), ajustada
+    a budget_mb y recortada al tramo con movimiento (motion_frames del .json del clip,
+    más trim_pad_sec a cada lado). El original se conserva; tiempo y ratio de
+    compresión se guardan en el .json del clip bajo "transcode".
+    poll() devuelve los resultados terminados.
+    """
+    def __init__(self, workers: int = 1, budget_mb: float = 45.0, max_width: int = 854,
+                 max_fps: float = 12.0, codec: str = "mp4v", use_ffmpeg: str = "auto",
+                 trim: bool = True, trim_pad_sec: float = 1.0, nice: int = 10):
+        self.workers = max(1, int(workers))
+        self.budget_bytes = int(max(0.1, float(budget_mb)) * 1024 * 1024)
+        self.max_width = int(max_width)
+        self.max_fps = float(max_fps)
+        self.codec = codec
+        self.ffmpeg = shutil.which("ffmpeg") if str(use_ffmpeg).lower() in ("auto", "true", "1", "yes") else None
+        self.trim = bool(trim)
+        self.trim_pad_sec = max(0.0, float(trim_pad_sec))
+        self.nice = int(nice)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._jobs: Dict[object, Tuple[Path, Path]] = {}
+        self._ready: List[TranscodeResult] = []
+        self.done = 0
+        self.failed = 0
+        self.skipped = 0
+        self.src_bytes = 0
+        self.out_bytes = 0
+        self.seconds = 0.0
+
+    def _executor(self) -> ProcessPoolExecutor:
+        # Se crea al primer clip: sin envíos no hay procesos extra (ni se importa multiprocessing)
+        if self._pool is None:
+            import multiprocessing as mp
+            from concurrent.futures import ProcessPoolExecutor
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=mp.get_context("spawn"),
+                                             initializer=_init_worker, initargs=(self.nice,))
+        return self._pool
+
+    def _trim_range(self, src: Path) -> Optional[Tuple[int, int]]:
+        if not self.trim:
+            return None
+        try:
+            meta = json.loads(src.with_suffix(".json").read_text(encoding="utf-8"))
+        except Exception:
+            return None
+        mf = meta.get("motion_frames")
+        if not mf or meta.get("reason") == "manual":
+            return None
+        return int(mf[0]), int(mf[1])
+
+    def submit(self, src: Path) -> None:
+        src = Path(src)
+        trim = self._trim_range(src)
+        try:
+            size = src.stat().st_size
+        except OSError as e:
+            self._ready.append(TranscodeResult(src, src, None, error=str(e)))
+            return
+        if trim is None and size <= self.budget_bytes and (self.max_width <= 0 or _width(src) <= self.max_width):
+            # Ya cabe y no hay nada que recortar ni reducir
+            self.skipped += 1
+            self._ready.append(TranscodeResult(src, src, None))
+            return
+        dst = src.with_name(src.stem + VARIANT_SUFFIX)
+        fut = self._executor().submit(transcode_clip, str(src), str(dst), self.budget_bytes,
+                                      self.max_width, self.max_fps, trim, self.codec, self.ffmpeg,
+                                      self.trim_pad_sec)
+        self._jobs[fut] = (src, dst)
+
+    @property
+    def pending(self) -> int:
+        return len(self._jobs)
+
+    def _record(self, src: Path, stats: dict) -> None:
+        meta_path = src.with_suffix(".json")
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8")) if meta_path.exists() else {"clip": src.name}
+            meta["transcode"] = stats
+            meta_path.write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+        except Exception as e:
+            print(f"[TRANSCODE] No se pudo guardar estadísticas de {src.name}: {e}")
+
+    def poll(self) -> List[TranscodeResult]:
+        out, self._ready = self._ready, []
+        for fut in [f for f in self._jobs if f.done()]:
+            src, dst = self._jobs.pop(fut)
+            try:
+                stats = fut.result()
+            except Exception as e:
+                # Sin variante: se envía el original (si no cabe, Telegram lo rechazará)
+                self.failed += 1
+                dst.unlink(missing_ok=True)
+                out.append(TranscodeResult(src, src, None, error=str(e)))
+                continue
+            self.done += 1
+            self.src_bytes += stats["src_bytes"]
+            self.out_bytes += stats["out_bytes"]
+            self.seconds += stats["seconds"]
+            self._record(src, stats)
+            out.append(TranscodeResult(src, dst, stats))
+        return out
+
+    def snapshot(self) -> dict:
+        return {
+            "done": self.done,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "pending": self.pending,
+            "ratio": round(self.src_bytes / float(self.out_bytes), 2) if self.out_bytes else None,
+            "avg_sec": round(self.seconds / self.done, 2) if self.done else None,
+            "saved_mb": round((self.src_bytes - self.out_bytes) / 1048576.0, 1),
+        }
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
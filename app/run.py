@@ -8,21 +8,25 @@ load_dotenv()
 import sys
 import time
 import json
+import signal
+import threading
 from pathlib import Path
-import cv2
 
-from app.discovery.flow import discover_snapshot_base
-from app.net.snapshot import get_frame_once
-from app.video.viewer import create_window, show_frame, should_quit, destroy_all
-from app.telegram.client import send_text, enabled, send_photo_bgr
-from app.vision.motion import preprocess_frame, diff_and_boxes, merge_boxes
+# Solo módulos ligeros al importar: cv2/numpy y los de funciones opcionales se cargan
+# en run_viewer según la configuración, con la primera descarga ya en marcha
+from app.config import ConfigReloader, diff_settings
+from app.discovery.cache import load_discovery, invalidate_discovery
+from app.net.snapshot import fetch_frame, FramePrefetch
+from app.net.health import FetchHealth
+from app.telegram.client import send_text, enabled, send_photo_bgr, send_album_bgr, warm_up as tg_warm_up
+from app.telegram.client import queued as tg_queued, delivered_latencies as tg_delivered
+from app.telegram.burst import BurstCollector
 
 # Estado armado / bot
 from app.common.state import is_armed, ensure_initial_state
 from app.bot.poller import start_poller
-
-# Recorder de clips
-from app.record.recorder import ClipRecorder
+from app.common.profiler import install_signal_handler, start_profile
+from app.common.metrics import StageTimer, LatencyStats, BootTimer, write_metrics
 
 # === Opcional: envío de vídeo a Telegram (si existe esta función en tu cliente) ===
 try:
@@ -32,17 +36,18 @@ except Exception:
 
 
 # === Runtime (para snapshots y cola de órdenes) ===
+# Se resuelve una vez al arrancar run_viewer (no por frame: getenv + resolve + mkdir)
 def _runtime_dir() -> Path:
     raw = os.getenv("RUNTIME_DIR", "./runtime")
     p = Path(raw).expanduser().resolve()
     p.mkdir(parents=True, exist_ok=True)
     return p
 
-def _latest_snapshot_path() -> Path:
-    return _runtime_dir() / "latest.jpg"
+def _latest_snapshot_path(runtime: Path) -> Path:
+    return runtime / "latest.jpg"
 
-def _commands_path() -> Path:
-    return _runtime_dir() / "commands.json"
+def _commands_path(runtime: Path) -> Path:
+    return runtime / "commands.json"
 
 def _atomic_replace(path: Path, payload) -> None:
     tmp = path.with_suffix(path.suffix + ".tmp")
@@ -56,12 +61,11 @@ def _atomic_replace(path: Path, payload) -> None:
         except Exception:
             pass
 
-def _drain_commands() -> list[dict]:
+def _drain_commands(path: Path) -> list[dict]:
     """
     Lee y vacía la cola de órdenes (lista de dicts) de forma atómica.
     Devuelve la lista (puede ser vacía).
     """
-    path = _commands_path()
     if not path.exists():
         return []
     try:
@@ -79,11 +83,11 @@ def _drain_commands() -> list[dict]:
             pass
         return []
 
-def _save_latest_frame_bgr(frame, jpeg_quality: int = 85) -> None:
+def _save_latest_frame_bgr(frame, dst: Path, jpeg_quality: int = 85) -> None:
     """
-    Guardado ATÓMICO: imencode → .tmp → os.replace() a latest.jpg
+    Guardado ATÓMICO: imencode → .tmp → os.replace() a dst (latest.jpg)
     """
-    dst = _latest_snapshot_path()
+    import cv2  # local import por rapidez de arranque
     tmp = dst.with_suffix(dst.suffix + ".tmp")
 
     if frame is None or frame.size == 0:
@@ -104,8 +108,132 @@ def _save_latest_frame_bgr(frame, jpeg_quality: int = 85) -> None:
             pass
 
 
+def _discover(settings, state) -> bool:
+    """Descubrimiento completo (selenium/redir/html): sus módulos solo se cargan si hace falta."""
+    from app.discovery.flow import discover_snapshot_base
+    return discover_snapshot_base(settings, state, prefer_selenium=True)
+
+
+def _tagged(settings, text: str) -> str:
+    """Antepone el nombre de la cámara (modo multi-cámara) a los mensajes de Telegram."""
+    name = getattr(settings, "CAMERA_NAME", "")
+    return f"[{name}] {text}" if name else text
+
+
+
+# === Recarga en caliente ===
+def _install_reload_signal(reloader) -> bool:
+    """SIGHUP → recarga de configuración en el siguiente frame (solo POSIX, hilo principal)."""
+    sig = getattr(signal, "SIGHUP", None)
+    if sig is None or threading.current_thread() is not threading.main_thread():
+        return False
+    try:
+        signal.signal(sig, lambda *_: reloader.request())
+        return True
+    except Exception as e:
+        print(f"[CONFIG] No se pudo instalar SIGHUP: {e}", file=sys.stderr)
+        return False
+
+def _retune(obj, fresh, names) -> None:
+    """Copia a obj parámetros ya validados por el constructor de fresh, sin tocar su estado."""
+    for n in names:
+        setattr(obj, n, getattr(fresh, n))
+
+def _make_thumbnailer(settings):
+    from app.record.thumbs import ClipThumbnailer  # local: solo con THUMB_ENABLE
+    return ClipThumbnailer(cols=settings.THUMB_SHEET_COLS, jpeg_quality=settings.PHOTO_JPEG_QUALITY)
+
+def _make_transcoder(settings, codec: str):
+    from app.record.transcode import ClipTranscoder  # local: solo con TRANSCODE_ENABLE
+    return ClipTranscoder(
+        workers=settings.TRANSCODE_WORKERS, budget_mb=settings.TRANSCODE_MAX_MB,
+        max_width=settings.TRANSCODE_MAX_WIDTH, max_fps=settings.TRANSCODE_MAX_FPS,
+        codec=codec, use_ffmpeg=settings.TRANSCODE_FFMPEG,
+        trim=settings.TRANSCODE_TRIM, trim_pad_sec=settings.TRANSCODE_TRIM_PAD_SEC,
+    )
+
+def _apply_settings(settings, changes: dict, *, detector=None, calibrator=None, light_gate=None,
+                    tracker=None, classifier=None, burst=None, recorder=None, segrec=None,
+                    transcoder=None, thumbnailer=None, heatmap=None, health=None) -> None:
+    """Lleva los cambios de Settings a los objetos vivos (se llama entre frames)."""
+    if detector is not None:
+        detector.configure(settings.PROC_WIDTH, settings.THRESH, settings.MIN_AREA, settings.DILATE_ITERS,
+                           coarse_width=settings.COARSE_WIDTH)
+        if "PROC_WIDTH" in changes and tracker is not None:
+            tracker.reset()  # las pistas están en coords del tamaño de procesado anterior
+    if calibrator is not None and any(k in changes for k in (
+            "THRESH", "MIN_AREA", "AUTO_THRESH_MIN", "AUTO_THRESH_MAX", "AUTO_MIN_AREA_MIN",
+            "AUTO_MIN_AREA_MAX", "AUTO_THRESH_MARGIN", "AUTO_AREA_MARGIN", "AUTO_CALIBRATE_ALPHA")):
+        # Nuevos valores de partida o límites: la calibración vuelve a empezar desde ellos
+        from app.vision.motion import ThresholdCalibrator
+        fresh = ThresholdCalibrator(
+            settings.THRESH, settings.MIN_AREA,
+            thresh_bounds=(settings.AUTO_THRESH_MIN, settings.AUTO_THRESH_MAX),
+            area_bounds=(settings.AUTO_MIN_AREA_MIN, settings.AUTO_MIN_AREA_MAX),
+            thresh_margin=settings.AUTO_THRESH_MARGIN, area_margin=settings.AUTO_AREA_MARGIN,
+            alpha=settings.AUTO_CALIBRATE_ALPHA,
+        )
+        vars(calibrator).update(vars(fresh))
+    if light_gate is not None:
+        from app.vision.motion import LightingGate
+        _retune(light_gate, LightingGate(settings.LIGHT_CHANGED_FRAC, settings.LIGHT_MEAN_DELTA,
+                                         settings.LIGHT_HIST_DIST, settings.LIGHT_SETTLE_FRAMES,
+                                         settings.LIGHT_MAX_SPREAD),
+                ("changed_frac", "mean_delta", "hist_dist", "settle_frames", "max_spread"))
+    if heatmap is not None:
+        heatmap.halflife_sec = max(1.0, settings.HEATMAP_HALFLIFE_MIN * 60.0)
+    if tracker is not None:
+        from app.vision.tracker import Tracker
+        _retune(tracker, Tracker(settings.TRACK_IOU, settings.TRACK_MAX_DIST,
+                                 settings.TRACK_MIN_HITS, settings.TRACK_MAX_MISSES),
+                ("iou_thresh", "max_dist", "min_hits", "max_misses"))
+    if burst is not None:
+        _retune(burst, BurstCollector(settings.ALERT_BURST_FRAMES, settings.ALERT_BURST_WINDOW_SEC,
+                                      settings.ALERT_BURST_PRE_SEC, settings.ALERT_BURST_MIN_GAP_SEC),
+                ("k", "window_sec", "pre_sec", "min_gap_sec"))
+    if classifier is not None:
+        classifier.rate = max(0.1, float(settings.CLASSIFY_MAX_PER_SEC))
+        classifier.cache_ttl = max(0.0, float(settings.CLASSIFY_CACHE_TTL_SEC))
+    if transcoder is not None:
+        from app.record.transcode import ClipTranscoder
+        _retune(transcoder, ClipTranscoder(
+            budget_mb=settings.TRANSCODE_MAX_MB, max_width=settings.TRANSCODE_MAX_WIDTH,
+            max_fps=settings.TRANSCODE_MAX_FPS, trim=settings.TRANSCODE_TRIM,
+            trim_pad_sec=settings.TRANSCODE_TRIM_PAD_SEC,
+        ), ("budget_bytes", "max_width", "max_fps", "trim", "trim_pad_sec"))
+    if recorder is not None:
+        recorder.pre_roll_sec = max(0.0, settings.PRE_ROLL_SEC)
+        recorder.buffer.max_seconds = recorder.pre_roll_sec
+        recorder.post_roll_sec = max(0.0, settings.POST_ROLL_SEC)
+        recorder.quiet_gap_sec = max(0.0, settings.QUIET_GAP_SEC)
+        recorder.max_clip_sec = max(1.0, settings.MAX_CLIP_SEC)
+        recorder.quota.max_gb = settings.MAX_DISK_GB
+        recorder.thumbnailer = thumbnailer if settings.THUMB_ENABLE else None
+        recorder.thumb_frames = max(1, settings.THUMB_SHEET_FRAMES)
+        recorder.thumb_width = max(32, settings.THUMB_WIDTH)
+    if thumbnailer is not None:
+        thumbnailer.cols = max(1, settings.THUMB_SHEET_COLS)
+        thumbnailer.jpeg_quality = settings.PHOTO_JPEG_QUALITY
+    if segrec is not None:
+        segrec.event_gap = max(0.5, settings.QUIET_GAP_SEC + settings.POST_ROLL_SEC)
+        segrec.retain_quiet = max(0.0, settings.SEGMENT_RETAIN_QUIET_HOURS) * 3600
+        segrec.retain_event = max(0.0, settings.SEGMENT_RETAIN_EVENT_HOURS) * 3600
+        segrec.max_bytes = int(max(0.0, settings.SEGMENT_MAX_GB) * (1024 ** 3))
+    if health is not None:
+        _retune(health, FetchHealth(
+            min_timeout=settings.FETCH_TIMEOUT_MIN_SEC, max_timeout=settings.FETCH_TIMEOUT_MAX_SEC,
+            timeout_mult=settings.FETCH_TIMEOUT_MULT,
+            fails_before_rediscover=settings.MAX_FAILS_BEFORE_REDISCOVER,
+            backoff_base=settings.FETCH_BACKOFF_BASE_SEC, backoff_max=settings.FETCH_BACKOFF_MAX_SEC,
+            breaker_cooldown=settings.BREAKER_COOLDOWN_SEC,
+            breaker_max_cooldown=settings.BREAKER_MAX_COOLDOWN_SEC,
+        ), ("min_timeout", "max_timeout", "timeout_mult", "fails_before_rediscover", "backoff_base",
+            "backoff_max", "breaker_cooldown", "breaker_max_cooldown"))
+
+
 # === Utilidad para preview con cajas ===
 def _make_preview_with_boxes(frame, boxes, sx, sy, color_bgr, thick, max_w):
+    import cv2
     vis = frame.copy()
     for (x, y, w, h) in boxes:
         X1 = int(x * sx); Y1 = int(y * sy)
@@ -117,69 +245,140 @@ def _make_preview_with_boxes(frame, boxes, sx, sy, color_bgr, thick, max_w):
     return vis
 
 
-def run_viewer(settings, state):
+def run_viewer(settings, state, boot: BootTimer = None):
+    """boot: fases ya medidas por el lanzador (imports, config); si no, cuenta desde aquí."""
+    boot = boot or BootTimer()
     print("▶ Iniciando visor de webcam (vista + detección opcional).")
-    print(f"[INIT] RUNTIME_DIR={_runtime_dir()}  SNAPSHOT={_latest_snapshot_path()}  CMDS={_commands_path()}")
+    runtime = _runtime_dir()
+    latest_path = _latest_snapshot_path(runtime)
+    commands_path = _commands_path(runtime)
+    print(f"[INIT] RUNTIME_DIR={runtime}  SNAPSHOT={latest_path}  CMDS={commands_path}")
+
+    # Configuración recargable (.env / overrides.json vigilados, SIGHUP, /set CLAVE VALOR);
+    # los /set de ejecuciones anteriores se aplican ya desde el arranque
+    reloader = ConfigReloader(settings, runtime)
+    settings = reloader.initial()
+
+    # Primera descarga (base fija o de la caché de descubrimiento) y cliente de Telegram
+    # en hilos: la red espera mientras se cargan cv2/numpy y se monta el resto
+    cached = None if state.snapshot_base else load_discovery(settings.SNAPSHOT_HOME,
+                                                            getattr(settings, "DISCOVERY_CACHE_TTL_SEC", 0))
+    prefetch = None
+    if state.snapshot_base or cached:
+        prefetch = FramePrefetch(state.snapshot_base or cached[0], settings.SNAPSHOT_REFERER,
+                                 state.snapshot_cookie if not cached else (cached[1] or state.snapshot_cookie))
+    if enabled(settings.TG_BOT_TOKEN, settings.TG_CHAT_ID):
+        threading.Thread(target=tg_warm_up, name="tg-warmup", daemon=True).start()
+    boot.mark("config")
+
+    # Módulos con cv2/numpy (los de funciones opcionales, más abajo y solo si están activas)
+    import cv2
+    from app.vision.motion import MotionDetector, LightingGate, ThresholdCalibrator, merge_boxes
+    from app.record.recorder import ClipRecorder
 
     # 0) Estado inicial y poller
     ensure_initial_state()         # aplica ARMED_ON_BOOT cada arranque
     start_poller(settings)
-
-    # === Configuración de grabación ===
-    record_on_motion = (os.getenv("RECORD_ON_MOTION", str(getattr(settings, "RECORD_ON_MOTION", "false"))).lower() == "true")
-    clip_dir_env = os.getenv("CLIP_DIR", getattr(settings, "CLIP_DIR", "clips"))
-    pre_roll_sec = float(os.getenv("PRE_ROLL_SEC", getattr(settings, "PRE_ROLL_SEC", 3)))
-    post_roll_sec = float(os.getenv("POST_ROLL_SEC", getattr(settings, "POST_ROLL_SEC", 5)))
-    quiet_gap_sec = float(os.getenv("QUIET_GAP_SEC", getattr(settings, "QUIET_GAP_SEC", 2)))
-    max_clip_sec = float(os.getenv("MAX_CLIP_SEC", getattr(settings, "MAX_CLIP_SEC", 60)))
-    max_disk_gb = float(os.getenv("MAX_DISK_GB", getattr(settings, "MAX_DISK_GB", 2)))
-    video_fps_cfg = os.getenv("VIDEO_FPS", getattr(settings, "VIDEO_FPS", None))
-    video_fps = float(video_fps_cfg) if str(video_fps_cfg).strip() not in ("", "None") else None
-    video_codec = str(os.getenv("VIDEO_CODEC", getattr(settings, "VIDEO_CODEC", "mp4v"))).strip() or "mp4v"
-
-    tg_send_clips = (os.getenv("TG_SEND_CLIPS", str(getattr(settings, "TG_SEND_CLIPS", "false"))).lower() == "true")
-    tg_clip_cooldown = float(os.getenv("TG_CLIP_COOLDOWN_SEC", getattr(settings, "TG_CLIP_COOLDOWN_SEC", 30)))
-
-    # Inicializa recorder
-    runtime = _runtime_dir()
-    clip_dir = Path(clip_dir_env) if os.path.isabs(clip_dir_env) else (runtime / clip_dir_env)
+    if install_signal_handler(getattr(settings, "PROFILE_DEFAULT_SEC", 30.0)):
+        print(f"[PROF] SIGUSR1 → perfilado de {settings.PROFILE_DEFAULT_SEC:.0f} s (kill -USR1 {os.getpid()})")
+    if _install_reload_signal(reloader):
+        print(f"[CONFIG] SIGHUP → recarga de configuración (kill -HUP {os.getpid()})")
+
+    # === Grabación ===
+    codec_auto = settings.VIDEO_CODEC.lower() == "auto"
+    clip_dir = Path(settings.CLIP_DIR) if os.path.isabs(settings.CLIP_DIR) else (runtime / settings.CLIP_DIR)
+    # Miniatura + hoja de contactos de cada clip (hilo aparte, con los frames ya vistos)
+    thumbnailer = _make_thumbnailer(settings) if settings.THUMB_ENABLE else None
     recorder = ClipRecorder(
         base_dir=runtime,
         clip_dir=clip_dir,
-        pre_roll_sec=pre_roll_sec,
-        post_roll_sec=post_roll_sec,
-        quiet_gap_sec=quiet_gap_sec,
-        max_clip_sec=max_clip_sec,
-        video_fps=video_fps,
-        video_codec=video_codec,
-        quota_gb=max_disk_gb,
+        pre_roll_sec=settings.PRE_ROLL_SEC,
+        post_roll_sec=settings.POST_ROLL_SEC,
+        quiet_gap_sec=settings.QUIET_GAP_SEC,
+        max_clip_sec=settings.MAX_CLIP_SEC,
+        video_fps=settings.VIDEO_FPS,
+        video_codec="mp4v" if codec_auto else settings.VIDEO_CODEC,  # auto: mp4v hasta terminar la prueba
+        quota_gb=settings.MAX_DISK_GB,
+        thumbnailer=thumbnailer,
+        thumb_frames=settings.THUMB_SHEET_FRAMES,
+        thumb_width=settings.THUMB_WIDTH,
     )
-
-    # 1) Descubrir base si no viene
+    # Variante para Telegram (≤ TRANSCODE_MAX_MB) en procesos aparte; el pool nace con el primer clip
+    transcoder = _make_transcoder(settings, recorder.video_codec) if settings.TRANSCODE_ENABLE else None
+    segrec = None
+    if settings.RECORD_CONTINUOUS:
+        from app.record.segments import SegmentRecorder
+        seg_dir = Path(settings.SEGMENT_DIR) if os.path.isabs(settings.SEGMENT_DIR) else (runtime / settings.SEGMENT_DIR)
+        segrec = SegmentRecorder(
+            seg_dir, recorder.clip_dir, seg_sec=settings.SEGMENT_SEC, fps=settings.VIDEO_FPS or 12.0,
+            codec=recorder.video_codec, use_ffmpeg=settings.SEGMENT_FFMPEG,
+            ffmpeg_codec=settings.SEGMENT_FFMPEG_CODEC,
+            event_gap_sec=settings.QUIET_GAP_SEC + settings.POST_ROLL_SEC,
+            retain_quiet_hours=settings.SEGMENT_RETAIN_QUIET_HOURS,
+            retain_event_hours=settings.SEGMENT_RETAIN_EVENT_HOURS,
+            max_gb=settings.SEGMENT_MAX_GB,
+        )
+
+    boot.mark("módulos")
+
+    def _first_frame():
+        """La descarga adelantada si fue a esta base; si no, una nueva."""
+        nonlocal prefetch
+        res = prefetch.take(state.snapshot_base, state.snapshot_cookie) if prefetch is not None else None
+        prefetch = None
+        if res is None:
+            res = fetch_frame(state.snapshot_base, settings.SNAPSHOT_REFERER, state.snapshot_cookie)
+        boot.mark("primer frame")
+        return res.ok, res.frame
+
+    # 1) Descubrir base si no viene (primero caché en RUNTIME_DIR, validada con un frame)
+    boot_mode = "fija"
+    ok, frame = False, None
     if not state.snapshot_base:
-        ok = discover_snapshot_base(settings, state, prefer_selenium=True)
-        if not ok:
-            print("❌ No se pudo descubrir la URL del snapshot (selenium/redir/html).")
-            return
+        if cached:
+            cookie_orig = state.snapshot_cookie
+            state.snapshot_base = cached[0]
+            state.snapshot_cookie = cached[1] or cookie_orig
+            ok, frame = _first_frame()
+            if ok and frame is not None:
+                boot_mode = "caliente"
+                print(f"[BOOT] Base desde caché validada: {state.snapshot_base}")
+            else:
+                print("[BOOT] Caché de descubrimiento no válida; descubrimiento completo…", file=sys.stderr)
+                invalidate_discovery()
+                state.snapshot_base = ""
+                state.snapshot_cookie = cookie_orig
+        if not state.snapshot_base:
+            boot_mode = "frío"
+            ok = _discover(settings, state)
+            boot.mark("descubrimiento")
+            if not ok:
+                print("❌ No se pudo descubrir la URL del snapshot (selenium/redir/html).")
+                return
+            ok, frame = False, None
 
     # 2) Primer frame
-    print("Probando acceso a la URL…")
-    ok, frame = get_frame_once(state.snapshot_base, settings.SNAPSHOT_REFERER, state.snapshot_cookie)
+    if not ok or frame is None:
+        print("Probando acceso a la URL…")
+        ok, frame = _first_frame()
     if not ok or frame is None:
         print("[BOOT] Reintentando descubrimiento…", file=sys.stderr)
-        ok2 = discover_snapshot_base(settings, state, prefer_selenium=True)
+        ok2 = _discover(settings, state)
+        boot.mark("descubrimiento")
         if ok2:
-            ok, frame = get_frame_once(state.snapshot_base, settings.SNAPSHOT_REFERER, state.snapshot_cookie)
+            ok, frame = _first_frame()
 
     if not ok or frame is None:
         print("❌ No se pudo obtener el primer frame.")
         return
+    print(f"[BOOT] Arranque {boot_mode}: {boot.report()}")
 
-    # ✅ Telegram: inicio
+    # ✅ Telegram: inicio (en un hilo: el bucle no espera a la API)
     if enabled(settings.TG_BOT_TOKEN, settings.TG_CHAT_ID):
-        ok_tg = send_text(settings.TG_BOT_TOKEN, settings.TG_CHAT_ID, "✅ Visor iniciado: primer frame OK.")
-        if not ok_tg:
-            print("[TG] Aviso de inicio NO enviado. Revisa logs anteriores.", file=sys.stderr)
+        def _notify_start():
+            if not send_text(settings.TG_BOT_TOKEN, settings.TG_CHAT_ID, _tagged(settings, "✅ Visor iniciado: primer frame OK.")):
+                print("[TG] Aviso de inicio NO enviado. Revisa logs anteriores.", file=sys.stderr)
+        threading.Thread(target=_notify_start, name="tg-start", daemon=True).start()
     else:
         print("[TG] Deshabilitado: define TG_BOT_TOKEN y TG_CHAT_ID en .env", file=sys.stderr)
 
@@ -187,144 +386,538 @@ def run_viewer(settings, state):
     print(f"[OK] Base snapshot:  {state.snapshot_base}")
     print(f"[OK] Resolución: {w0}x{h0}")
 
+    # VIDEO_CODEC=auto: prueba de codificadores a la resolución real, en segundo plano
+    # (cacheada en RUNTIME_DIR: en arranques siguientes es inmediata)
+    if codec_auto:
+        from app.record.codec import probe_codecs, DEFAULT_CANDIDATES
+
+        def _pick_codec(sample=frame.copy()):
+            try:
+                recorder.video_codec = probe_codecs(sample, settings.VIDEO_FPS or 12.0, runtime,
+                                                    settings.VIDEO_CODEC_CANDIDATES or DEFAULT_CANDIDATES,
+                                                    settings.VIDEO_CODEC_RT_MARGIN)
+                if transcoder is not None:
+                    transcoder.codec = recorder.video_codec
+                if segrec is not None:
+                    segrec.codec = recorder.video_codec
+            except Exception as e:
+                print(f"[CODEC] Prueba fallida ({e}); se mantiene mp4v", file=sys.stderr)
+        threading.Thread(target=_pick_codec, name="codec-probe", daemon=True).start()
+
+    # Ventana: hilo de render propio (el bucle solo deja el último frame en un buzón)
+    viewer = None
     if settings.SHOW_WINDOW:
-        create_window(settings.WINDOW_TITLE)
+        from app.video.viewer import create_window, show_frame, should_quit, destroy_all, ViewerThread
+        if settings.VIEWER_THREADED:
+            viewer = ViewerThread(settings.WINDOW_TITLE, settings.VIEWER_MAX_FPS,
+                                  settings.VIEWER_OVERLAY_TIMINGS).start()
+        else:
+            create_window(settings.WINDOW_TITLE)
+
+    # Tiempos por etapa (overlay de la ventana / métricas)
+    timings = StageTimer()
+
+    stream_hub = None
+    if settings.STREAM_ENABLE:
+        from app.video.stream import FrameHub, start_stream_server
+        stream_hub = FrameHub()
+        start_stream_server(stream_hub, settings.STREAM_LISTEN, _tagged(settings, settings.WINDOW_TITLE),
+                            settings.STREAM_TOKEN, settings.STREAM_MAX_FPS)
 
     # --- Estado para motion ---
-    prev_gray = None
+    detector = None
+    light_gate = None
+    calibrator = None
+    tracker = None
+    classifier = None
+    heatmap = None
+    alert_classes = record_classes = None  # sin clasificador no se filtra por clase
     sx = sy = 1.0
     if settings.ENABLE_MOTION:
-        prev_gray, sx, sy = preprocess_frame(frame, settings.PROC_WIDTH)
+        if settings.TRACK_ENABLE:
+            from app.vision.tracker import Tracker
+            tracker = Tracker(settings.TRACK_IOU, settings.TRACK_MAX_DIST,
+                              settings.TRACK_MIN_HITS, settings.TRACK_MAX_MISSES)
+        if settings.CLASSIFY_ENABLE:
+            if tracker is None:
+                print("[CLASSIFY] Requiere TRACK_ENABLE=true; clasificación desactivada.", file=sys.stderr)
+            else:
+                try:
+                    from app.vision.classify import CropClassifier, crop_box, parse_classes
+                    labels = tuple(l.strip() for l in settings.CLASSIFY_LABELS.split(",") if l.strip()) or None
+                    classifier = CropClassifier(
+                        settings.CLASSIFY_BACKEND, settings.CLASSIFY_MODEL, settings.CLASSIFY_CONFIG,
+                        labels=labels, min_conf=settings.CLASSIFY_MIN_CONF,
+                        workers=settings.CLASSIFY_WORKERS, max_per_sec=settings.CLASSIFY_MAX_PER_SEC,
+                        cache_ttl=settings.CLASSIFY_CACHE_TTL_SEC,
+                    )
+                    alert_classes = parse_classes(settings.ALERT_CLASSES)
+                    record_classes = parse_classes(settings.RECORD_CLASSES)
+                    print(f"[CLASSIFY] {classifier.backend}: alertas={settings.ALERT_CLASSES or 'todas'} "
+                          f"grabación={settings.RECORD_CLASSES or 'todas'}")
+                except Exception as e:
+                    print(f"[CLASSIFY] No disponible ({e}); clasificación desactivada.", file=sys.stderr)
+        if settings.AUTO_CALIBRATE:
+            calibrator = ThresholdCalibrator(
+                settings.THRESH, settings.MIN_AREA,
+                thresh_bounds=(settings.AUTO_THRESH_MIN, settings.AUTO_THRESH_MAX),
+                area_bounds=(settings.AUTO_MIN_AREA_MIN, settings.AUTO_MIN_AREA_MAX),
+                thresh_margin=settings.AUTO_THRESH_MARGIN, area_margin=settings.AUTO_AREA_MARGIN,
+                alpha=settings.AUTO_CALIBRATE_ALPHA,
+            )
+        if settings.LIGHT_GATE_ENABLE:
+            light_gate = LightingGate(settings.LIGHT_CHANGED_FRAC, settings.LIGHT_MEAN_DELTA,
+                                      settings.LIGHT_HIST_DIST, settings.LIGHT_SETTLE_FRAMES,
+                                      settings.LIGHT_MAX_SPREAD)
+        # Buffers reservados una vez; el gray anterior vive dentro del detector
+        detector = MotionDetector(settings.PROC_WIDTH, settings.THRESH,
+                                  settings.MIN_AREA, settings.DILATE_ITERS, gate=light_gate,
+                                  calibrator=calibrator, coarse_width=settings.COARSE_WIDTH)
+        detector.reset(frame)
+        sx, sy = detector.sx, detector.sy
+        if settings.HEATMAP_ENABLE:
+            from app.vision.heatmap import MotionHeatmap, suggest_zones
+            # Continúa el mapa guardado (si el tamaño de procesado cambió, se empieza de cero)
+            heatmap = MotionHeatmap(settings.HEATMAP_HALFLIFE_MIN * 60.0)
+            if heatmap.load(runtime):
+                print(f"[HEAT] Mapa de calor recuperado ({heatmap.samples} muestras)")
+    heat_zones = []
+    last_heat_save_ts = time.monotonic()
+
+    def _class_ok(t, allowed) -> bool:
+        """Sin clasificador vale cualquier pista; con él, solo las ya clasificadas y permitidas."""
+        if classifier is None:
+            return True
+        return t.label is not None and (allowed is None or t.label in allowed)
 
     # Alertas TG movimiento
-    last_motion_alert_ts = 0.0
+    last_motion_alert_ts = float("-inf")
+    burst_detect_ts = None  # frame (monótono, procesado) que disparó la ráfaga en curso
+    burst = BurstCollector(settings.ALERT_BURST_FRAMES, settings.ALERT_BURST_WINDOW_SEC,
+                           settings.ALERT_BURST_PRE_SEC, settings.ALERT_BURST_MIN_GAP_SEC)
+    # Trabajo caro evitado por el filtro de luz (1 por evento)
+    light_events_seen = 0
+    alerts_avoided = 0
+    clips_avoided = 0
+
+    # Volcado periódico de métricas (RUNTIME_DIR/metrics.json)
+    last_metrics_ts = float("-inf")
+
+    # Latencias de extremo a extremo (reloj monótono; ver FrameTimes)
+    lat_detect = LatencyStats()   # captura → detección terminada
+    lat_alert = LatencyStats()    # detección → alerta aceptada por Telegram
+    lat_stale = LatencyStats()    # Date − Last-Modified del servidor (si las envía)
 
     # FPS estimado para UI (no crítico). El recorder usa video_fps si está definido.
-    last_ts = time.time()
+    last_ts = time.monotonic()
     fps_est = 5.0
     alpha_fps = 0.2
 
-    # Bucle principal
-    fail_count = 0
-    MAX_FAILS_BEFORE_REDISCOVER = 3
+    # Bucle principal: timeouts adaptativos + backoff + breaker de re-descubrimiento
+    health = FetchHealth(
+        min_timeout=settings.FETCH_TIMEOUT_MIN_SEC,
+        max_timeout=settings.FETCH_TIMEOUT_MAX_SEC,
+        timeout_mult=settings.FETCH_TIMEOUT_MULT,
+        fails_before_rediscover=settings.MAX_FAILS_BEFORE_REDISCOVER,
+        backoff_base=settings.FETCH_BACKOFF_BASE_SEC,
+        backoff_max=settings.FETCH_BACKOFF_MAX_SEC,
+        breaker_cooldown=settings.BREAKER_COOLDOWN_SEC,
+        breaker_max_cooldown=settings.BREAKER_MAX_COOLDOWN_SEC,
+    )
 
     # Cooldown para envío de clips a TG
-    last_clip_sent_ts = 0.0
-
-    while True:
-        ok, frame = get_frame_once(state.snapshot_base, settings.SNAPSHOT_REFERER, state.snapshot_cookie)
-        if not ok or frame is None:
-            fail_count += 1
-            if fail_count >= MAX_FAILS_BEFORE_REDISCOVER:
-                print("[RECOVER] Fallos seguidos; re-descubriendo (selenium→redir→html)…")
-                okr = discover_snapshot_base(settings, state, prefer_selenium=True)
-                fail_count = 0
-                time.sleep(0.5)
-            else:
-                time.sleep(0.2)
-            continue
-        fail_count = 0
-
-        # === Snapshot (atómico) para /snapshot
-        _save_latest_frame_bgr(frame, jpeg_quality=getattr(settings, "PHOTO_JPEG_QUALITY", 90))
+    last_clip_sent_ts = float("-inf")
 
-        # Timestamps y FPS est.
-        now_ts = time.time()
-        dt = now_ts - last_ts
-        last_ts = now_ts
-        if 0 < dt < 1.0:
-            fps_est = fps_est * (1 - alpha_fps) + (1.0 / dt) * alpha_fps
-
-        vis = frame
-
-        # Notificar frame al recorder SIEMPRE (para mantener preroll)
-        recorder.notify_frame(now_ts, frame, fps_hint=fps_est)
-
-        # ---- CONSUMIR ÓRDENES DEL BOT (p.ej. /clip N) ----
-        for cmd in _drain_commands():
-            if not isinstance(cmd, dict):
+    try:
+        while True:
+            # Frontera de frame: un Settings nuevo (inmutable) sustituye al anterior de golpe
+            new_settings = reloader.poll()
+            if new_settings is not None:
+                changes = diff_settings(settings, new_settings)
+                settings = new_settings
+                # Activadas en caliente: se crean ahora (desactivarlas deja el objeto sin uso)
+                if settings.THUMB_ENABLE and thumbnailer is None:
+                    thumbnailer = _make_thumbnailer(settings)
+                if settings.TRANSCODE_ENABLE and transcoder is None:
+                    transcoder = _make_transcoder(settings, recorder.video_codec)
+                _apply_settings(settings, changes, detector=detector, calibrator=calibrator,
+                                light_gate=light_gate, tracker=tracker, classifier=classifier,
+                                burst=burst, recorder=recorder, segrec=segrec,
+                                transcoder=transcoder, thumbnailer=thumbnailer, heatmap=heatmap,
+                                health=health)
+                if classifier is not None:
+                    alert_classes = parse_classes(settings.ALERT_CLASSES)
+                    record_classes = parse_classes(settings.RECORD_CLASSES)
+
+            timings.start()
+            fetch_timeout = health.timeout()
+            res = fetch_frame(state.snapshot_base, settings.SNAPSHOT_REFERER, state.snapshot_cookie,
+                              timeout=fetch_timeout)
+            health.record(res, timeout_used=fetch_timeout)
+            if not res.ok:
+                if health.should_rediscover():
+                    print(f"[RECOVER] Fallos seguidos ({res.kind}); re-descubriendo (redir|html → selenium)…")
+                    okr = _discover(settings, state)
+                    health.on_rediscover(okr)
+                time.sleep(health.next_delay())
                 continue
-            if cmd.get("type") == "force_clip":
-                try:
-                    dur = float(cmd.get("duration_sec", 10.0))
-                except Exception:
-                    dur = 10.0
-                # Forzamos clip de 'dur' segundos desde AHORA (con preroll)
-                recorder.force_clip(now_ts, frame, duration_sec=dur)
-                print(f"[CMD] force_clip recibido → {dur:.1f} s")
-
-        # --- Detección de movimiento (opcional) ---
-        boxes = []
-        motion_now = False
-        if settings.ENABLE_MOTION:
-            gray, sx, sy = preprocess_frame(frame, settings.PROC_WIDTH)
-            min_area_eff = settings.MIN_AREA if settings.MIN_AREA > 0 else max(300, int(0.003 * gray.size))
-            if prev_gray is None:
-                prev_gray = gray
-            boxes = diff_and_boxes(prev_gray, gray, settings.THRESH, min_area_eff, settings.DILATE_ITERS)
-            boxes = merge_boxes(boxes, settings.MERGE_PADDING)
-            prev_gray = gray
-            motion_now = bool(boxes)
-
-            # Dibujo cajas
-            if boxes:
-                for (x, y, w, h) in boxes:
-                    X1 = int(x * sx); Y1 = int(y * sy)
-                    X2 = int((x + w) * sx); Y2 = int((y + h) * sy)
-                    cv2.rectangle(vis, (X1, Y1), (X2, Y2), settings.BOX_COLOR_BGR, max(1, settings.BOX_THICKNESS))
-
-            # 📣 ALERTA TG (foto) SOLO SI ARMADO
-            if motion_now and is_armed() and settings.SEND_TG_ON_MOTION and enabled(settings.TG_BOT_TOKEN, settings.TG_CHAT_ID):
-                if (now_ts - last_motion_alert_ts) >= max(1, settings.MOTION_ALERT_COOLDOWN_SEC):
-                    preview = _make_preview_with_boxes(
-                        frame, boxes, sx, sy,
-                        settings.BOX_COLOR_BGR, settings.BOX_THICKNESS,
-                        settings.PREVIEW_MAX_WIDTH
-                    )
-                    caption = "🚨 Movimiento detectado"
-                    okp = send_photo_bgr(
-                        settings.TG_BOT_TOKEN, settings.TG_CHAT_ID,
-                        preview, caption=caption, jpeg_quality=getattr(settings, "PHOTO_JPEG_QUALITY", 90)
-                    )
-                    if not okp:
-                        print("[TG] No se pudo enviar la foto de movimiento.", file=sys.stderr)
-                    last_motion_alert_ts = now_ts
-
-        # 🎥 LÓGICA DE CLIPS (por movimiento o por /clip N)
-        # - Por movimiento solo actúa si ARMADO
-        if (record_on_motion and is_armed()) and motion_now:
-            recorder.notify_motion(now_ts, frame)
-
-        # Tick: puede cerrar clip si toca; si lo cierra, devuelve la ruta
-        closed_path = recorder.tick(now_ts)
-        if closed_path:
-            print(f"[REC] Clip finalizado: {closed_path}")
-            # Envío opcional a Telegram (si hay función disponible)
-            if (os.getenv("TG_SEND_CLIPS", "false").lower() == "true") and tg_send_video_file and enabled(settings.TG_BOT_TOKEN, settings.TG_CHAT_ID):
-                # cooldown
-                if (now_ts - last_clip_sent_ts) >= max(1.0, float(os.getenv("TG_CLIP_COOLDOWN_SEC", 30))):
+            frame = res.frame
+            timings.lap("fetch")
+
+            # === Snapshot (atómico) para /snapshot
+            _save_latest_frame_bgr(frame, latest_path, jpeg_quality=getattr(settings, "PHOTO_JPEG_QUALITY", 90))
+            timings.lap("snapshot")
+
+            # Timestamps y FPS est.: now_ts (pared) para segmentos, /cut y metrics.json;
+            # now (monótono) para todo lo que mide intervalos (recorder, pistas, cooldowns)
+            now_ts = res.times.wall
+            now = res.times.decoded
+            dt = now - last_ts
+            last_ts = now
+            stale = res.times.server_stale()
+            if stale is not None:
+                lat_stale.add(stale)
+            if 0 < dt < 1.0:
+                fps_est = fps_est * (1 - alpha_fps) + (1.0 / dt) * alpha_fps
+
+            vis = frame
+
+            # Notificar frame al recorder SIEMPRE (para mantener preroll);
+            # en modo continuo todo va a los segmentos y los clips se cortan de ellos
+            if segrec is not None:
+                # request: la marca monótona tomada junto a times.wall (decoded va detrás
+                # lo que tarde la descarga y parecería un salto del reloj de pared)
+                segrec.write(now_ts, frame, res.times.request)
+            else:
+                recorder.notify_frame(now, frame, fps_hint=fps_est)
+
+            # ---- CONSUMIR ÓRDENES DEL BOT (p.ej. /clip N) ----
+            for cmd in _drain_commands(commands_path):
+                if not isinstance(cmd, dict):
+                    continue
+                if cmd.get("type") == "force_clip":
+                    try:
+                        dur = float(cmd.get("duration_sec", 10.0))
+                    except Exception:
+                        dur = 10.0
+                    # Forzamos clip de 'dur' segundos desde AHORA (con preroll)
+                    if segrec is not None:
+                        segrec.request_cut(now_ts - settings.PRE_ROLL_SEC, now_ts + dur, reason="manual")
+                    else:
+                        recorder.force_clip(now, frame, duration_sec=dur)
+                    print(f"[CMD] force_clip recibido → {dur:.1f} s")
+                elif cmd.get("type") == "cut":
+                    # Corte de la grabación continua: [start_ts, start_ts + duration_sec]
+                    if segrec is None:
+                        print("[CMD] cut ignorado: requiere RECORD_CONTINUOUS=true")
+                        continue
                     try:
-                        okv = tg_send_video_file(settings.TG_BOT_TOKEN, settings.TG_CHAT_ID, str(closed_path), caption="🎥 Clip")
-                        if not okv:
-                            print("[TG] No se pudo enviar el clip de vídeo.", file=sys.stderr)
+                        start = float(cmd.get("start_ts"))
+                        dur = min(settings.MAX_CLIP_SEC * 10, max(1.0, float(cmd.get("duration_sec", 60.0))))
+                    except Exception:
+                        continue
+                    segrec.request_cut(start, start + dur, reason="manual")
+                    print(f"[CMD] cut recibido → {dur:.0f} s desde hace {now_ts - start:.0f} s")
+                elif cmd.get("type") == "set":
+                    # /set CLAVE VALOR: se aplica en la siguiente frontera de frame
+                    chat = str(cmd.get("chat_id") or settings.TG_CHAT_ID)
+                    try:
+                        value = cmd.get("value")
+                        msg = "⚙️ " + reloader.set_override(str(cmd.get("key", "")),
+                                                            None if value is None else str(value))
+                    except ValueError as e:
+                        msg = f"⚠️ /set: {e}"
+                    print(f"[CMD] set → {msg}")
+                    if enabled(settings.TG_BOT_TOKEN, chat):
+                        send_text(settings.TG_BOT_TOKEN, chat, _tagged(settings, msg))
+                elif cmd.get("type") == "profile":
+                    # Encolado por el supervisor multi-cámara (/profile N camX)
+                    try:
+                        dur = float(cmd.get("duration_sec", settings.PROFILE_DEFAULT_SEC))
+                    except Exception:
+                        dur = settings.PROFILE_DEFAULT_SEC
+                    chat = str(cmd.get("chat_id") or settings.TG_CHAT_ID)
+                    on_done = None
+                    if settings.PROFILE_SEND_SUMMARY and enabled(settings.TG_BOT_TOKEN, chat):
+                        on_done = lambda rep, c=chat: send_text(settings.TG_BOT_TOKEN, c, _tagged(settings, rep.summary())[:4000])
+                    start_profile(dur, on_done=on_done)
+
+            timings.lap("record")
+
+            # --- Detección de movimiento (opcional) ---
+            boxes = []
+            motion_now = False
+            alert_now = False
+            tracks = []
+            fresh = []
+            if settings.ENABLE_MOTION:
+                boxes = detector.process(frame)
+                sx, sy = detector.sx, detector.sy
+                if heatmap is not None and detector.has_mask:
+                    heatmap.update(detector.binary, now)
+                boxes = merge_boxes(boxes, settings.MERGE_PADDING)
+                if tracker is not None:
+                    # Solo cuentan las pistas confirmadas; cada una se evalúa una vez para alerta
+                    tracker.update(boxes, now)
+                    tracks = tracker.active()
+                    boxes = [t.box for t in tracks]
+                    if classifier is not None:
+                        for r in classifier.poll():
+                            timings.add("classify", r.latency)
+                            t = tracker.get(r.track_id)
+                            if t is not None:
+                                t.label, t.score = r.label, r.score
+                        for t in tracks:
+                            if t.label is not None or classifier.is_pending(t.id):
+                                continue
+                            key = classifier.region_key(t.box)
+                            hit = classifier.lookup_region(key)
+                            if hit is not None:
+                                t.label, t.score = hit
+                                continue
+                            crop = crop_box(frame, t.box, sx, sy)  # antes de dibujar en frame
+                            if crop is not None:
+                                classifier.submit(t.id, crop, key)
+                    motion_now = any(_class_ok(t, record_classes) for t in tracks)
+                    # Pendientes hasta que una alerta las cubra (p.ej. confirmadas en el cooldown)
+                    fresh = [t for t in tracks if not t.alerted and _class_ok(t, alert_classes)]
+                    alert_now = bool(fresh)
+                else:
+                    motion_now = bool(boxes)
+                    alert_now = motion_now
+
+                if light_gate is not None and light_gate.events != light_events_seen:
+                    # Nuevo cambio de luz: sin él habría habido foto a TG y/o clip
+                    light_events_seen = light_gate.events
+                    armed_now = is_armed(runtime)
+                    if (armed_now and settings.SEND_TG_ON_MOTION and enabled(settings.TG_BOT_TOKEN, settings.TG_CHAT_ID)
+                            and (now - last_motion_alert_ts) >= max(1, settings.MOTION_ALERT_COOLDOWN_SEC)):
+                        alerts_avoided += 1
+                    if armed_now and settings.RECORD_ON_MOTION:
+                        clips_avoided += 1
+                    print(f"[LIGHT] Cambio de iluminación ignorado {light_gate.last_stats}")
+
+                # Dibujo cajas
+                if boxes:
+                    for (x, y, w, h) in boxes:
+                        X1 = int(x * sx); Y1 = int(y * sy)
+                        X2 = int((x + w) * sx); Y2 = int((y + h) * sy)
+                        cv2.rectangle(vis, (X1, Y1), (X2, Y2), settings.BOX_COLOR_BGR, max(1, settings.BOX_THICKNESS))
+                    for t in tracks:
+                        cv2.putText(vis, f"#{t.id} {t.label}" if t.label else f"#{t.id}", (int(t.box[0] * sx), max(12, int(t.box[1] * sy) - 4)),
+                                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, settings.BOX_COLOR_BGR, 1, cv2.LINE_AA)
+                timings.lap("detect")
+                res.times.processed = time.monotonic()
+                lat_detect.add(res.times.age(res.times.processed))
+
+                # Ráfaga: candidatas (antes y durante la alerta) con la preview ya reducida
+                if (settings.ALERT_BURST_ENABLE and boxes and settings.SEND_TG_ON_MOTION
+                        and enabled(settings.TG_BOT_TOKEN, settings.TG_CHAT_ID) and burst.wants(now)):
+                    score = sum(w * h for (_, _, w, h) in boxes) * (1.0 + max((t.score for t in tracks), default=0.0))
+                    burst.offer(now, _make_preview_with_boxes(
+                        frame, boxes, sx, sy, settings.BOX_COLOR_BGR, settings.BOX_THICKNESS,
+                        settings.PREVIEW_MAX_WIDTH), score)
+
+                # 📣 ALERTA TG (foto) SOLO SI ARMADO
+                if alert_now and is_armed(runtime) and settings.SEND_TG_ON_MOTION and enabled(settings.TG_BOT_TOKEN, settings.TG_CHAT_ID):
+                    cooldown_ok = (now - last_motion_alert_ts) >= max(1, settings.MOTION_ALERT_COOLDOWN_SEC)
+                    if settings.ALERT_BURST_ENABLE:
+                        # Una ráfaga en curso ya recoge los objetos nuevos
+                        if burst.active:
+                            for t in fresh:
+                                t.alerted = True
+                        elif cooldown_ok:
+                            burst.trigger(now)
+                            burst_detect_ts = res.times.processed
+                            last_motion_alert_ts = now
+                            for t in fresh:
+                                t.alerted = True
+                    elif cooldown_ok:
+                        for t in fresh:
+                            t.alerted = True
+                        preview = _make_preview_with_boxes(
+                            frame, boxes, sx, sy,
+                            settings.BOX_COLOR_BGR, settings.BOX_THICKNESS,
+                            settings.PREVIEW_MAX_WIDTH
+                        )
+                        caption = _tagged(settings, "🚨 Movimiento detectado")
+                        okp = send_photo_bgr(
+                            settings.TG_BOT_TOKEN, settings.TG_CHAT_ID,
+                            preview, caption=caption, jpeg_quality=getattr(settings, "PHOTO_JPEG_QUALITY", 90),
+                            detect_ts=res.times.processed,
+                        )
+                        if okp and not tg_queued():  # encolada: la mide el dispatcher al entregarla
+                            lat_alert.add(time.monotonic() - res.times.processed)
+                        elif not okp:
+                            print("[TG] No se pudo enviar la foto de movimiento.", file=sys.stderr)
+                        last_motion_alert_ts = now
+
+            # Fin de la ventana de ráfaga: un solo álbum (una petición, una notificación)
+            shots = burst.poll(now)
+            if shots:
+                oka = send_album_bgr(settings.TG_BOT_TOKEN, settings.TG_CHAT_ID, shots,
+                                     caption=_tagged(settings, f"🚨 Movimiento detectado ({len(shots)} fotos)"),
+                                     jpeg_quality=getattr(settings, "PHOTO_JPEG_QUALITY", 90),
+                                     detect_ts=burst_detect_ts)
+                if oka and burst_detect_ts is not None and not tg_queued():
+                    # Incluye la ventana de la ráfaga (ALERT_BURST_WINDOW_SEC): es la espera real
+                    lat_alert.add(time.monotonic() - burst_detect_ts)
+                elif not oka:
+                    print("[TG] No se pudo enviar la ráfaga de movimiento.", file=sys.stderr)
+                burst_detect_ts = None
+
+            timings.lap("alert")
+
+            # 🎥 LÓGICA DE CLIPS (por movimiento o por /clip N)
+            # - Por movimiento solo actúa si ARMADO
+            finished = []
+            if segrec is not None:
+                # Todo queda grabado: el movimiento solo se anota en el índice; si hay que
+                # enviar el clip, se corta de los segmentos al cerrar el evento
+                if motion_now:
+                    segrec.mark_motion(now_ts, armed=is_armed(runtime))
+                for ev in segrec.tick(now_ts):
+                    if ev.armed and settings.RECORD_ON_MOTION and settings.TG_SEND_CLIPS:
+                        a = ev.start - settings.PRE_ROLL_SEC
+                        segrec.request_cut(a, min(ev.end + settings.POST_ROLL_SEC, a + settings.MAX_CLIP_SEC),
+                                           reason="motion")
+                for cut in segrec.poll_cuts():
+                    recorder.quota.enforce(recorder.clip_dir)
+                    finished.append(cut.path)
+            else:
+                if (settings.RECORD_ON_MOTION and is_armed(runtime)) and motion_now:
+                    recorder.notify_motion(now, frame, score=sum(w * h for (_, _, w, h) in boxes))
+                if tracks:
+                    recorder.note_tracks(tracks, sx, sy)
+
+                # Tick: puede cerrar clip si toca; si lo cierra, devuelve la ruta
+                closed_path = recorder.tick(now)
+                if closed_path:
+                    finished.append(closed_path)
+
+            to_send = []
+            for closed_path in finished:
+                print(f"[REC] Clip finalizado: {closed_path}")
+                # Envío opcional a Telegram (si hay función disponible)
+                if settings.TG_SEND_CLIPS and tg_send_video_file and enabled(settings.TG_BOT_TOKEN, settings.TG_CHAT_ID):
+                    # cooldown (se cuenta al elegir el clip: no se transcodifica lo que no se va a enviar)
+                    if (now - last_clip_sent_ts) >= max(1.0, settings.TG_CLIP_COOLDOWN_SEC):
+                        last_clip_sent_ts = now
+                        if settings.TRANSCODE_ENABLE and transcoder is not None:
+                            transcoder.submit(closed_path)  # se envía la variante cuando esté lista
                         else:
-                            last_clip_sent_ts = now_ts
-                    except Exception as e:
-                        print(f"[TG] Error enviando clip: {e}", file=sys.stderr)
-            elif (os.getenv("TG_SEND_CLIPS", "false").lower() == "true") and not tg_send_video_file:
-                print("[TG] Aviso: TG_SEND_CLIPS=true pero no hay send_video_file() en app.telegram.client. Se omite el envío.")
-
-        # Ventana
-        if settings.SHOW_WINDOW:
-            show_frame(settings.WINDOW_TITLE, vis, fps_est)
-            if should_quit():
-                break
-
-    destroy_all()
-    print("⏹ Visor cerrado.")
-
-    # ✅ Telegram: fin
-    if enabled(settings.TG_BOT_TOKEN, settings.TG_CHAT_ID):
-        ok_tg_end = send_text(settings.TG_BOT_TOKEN, settings.TG_CHAT_ID, "⏹ Visor detenido.")
-        if not ok_tg_end:
-            print("[TG] Aviso de parada NO enviado. Revisa logs anteriores.", file=sys.stderr)
+                            to_send.append(closed_path)
+                elif settings.TG_SEND_CLIPS and not tg_send_video_file:
+                    print("[TG] Aviso: TG_SEND_CLIPS=true pero no hay send_video_file() en app.telegram.client. Se omite el envío.")
+
+            for tr in (transcoder.poll() if transcoder is not None else ()):
+                if tr.error:
+                    print(f"[TRANSCODE] {tr.src.name}: {tr.error}; se envía el original", file=sys.stderr)
+                elif tr.stats:
+                    st = tr.stats
+                    print(f"[TRANSCODE] {tr.path.name}: {st['src_bytes'] / 1048576:.1f} → {st['out_bytes'] / 1048576:.1f} MB "
+                          f"(x{st['ratio']}, {st['width']}px, {st['duration_sec']} s de vídeo, "
+                          f"{st['tool']} en {st['seconds']} s)")
+                to_send.append(tr.path)
+
+            for clip_path in to_send:
+                try:
+                    okv = tg_send_video_file(settings.TG_BOT_TOKEN, settings.TG_CHAT_ID, str(clip_path), caption=_tagged(settings, "🎥 Clip"))
+                    if not okv:
+                        print("[TG] No se pudo enviar el clip de vídeo.", file=sys.stderr)
+                except Exception as e:
+                    print(f"[TG] Error enviando clip: {e}", file=sys.stderr)
+
+            timings.lap("clips")
+
+            # 📡 Vista en vivo HTTP: se reenvía el JPEG original (sin recodificar);
+            # solo se codifica si hay que dibujar cajas y alguien está mirando el MJPEG.
+            if stream_hub is not None:
+                if settings.STREAM_DRAW_BOXES and boxes and stream_hub.clients > 0:
+                    ok_enc, buf = cv2.imencode(".jpg", vis, [int(cv2.IMWRITE_JPEG_QUALITY), 80])
+                    if ok_enc:
+                        stream_hub.publish(buf.tobytes())
+                elif res.data:
+                    stream_hub.publish(res.data)
+
+            timings.lap("stream")
+
+            # Ventana
+            if viewer is not None:
+                viewer.post(vis, fps_est, timings.snapshot())
+                if viewer.quit_event.is_set():
+                    break
+            elif settings.SHOW_WINDOW:
+                show_frame(settings.WINDOW_TITLE, vis, fps_est)
+                if should_quit():
+                    break
+            timings.lap("display")
+
+            if heatmap is not None and (now - last_heat_save_ts) >= max(5.0, settings.HEATMAP_SAVE_SEC):
+                last_heat_save_ts = now
+                zones = []
+                if heatmap.heat is not None:
+                    zones = suggest_zones(heatmap.heat, settings.HEATMAP_ZONE_ACTIVITY, settings.HEATMAP_ZONE_MIN_AREA)
+                if len(zones) != len(heat_zones):
+                    print(f"[HEAT] {len(zones)} zonas con actividad constante (candidatas a máscara, /heatmap)")
+                heat_zones = zones
+                heatmap.save(runtime, zones)
+
+            if settings.METRICS_INTERVAL_SEC > 0 and (now - last_metrics_ts) >= settings.METRICS_INTERVAL_SEC:
+                last_metrics_ts = now
+                for d in tg_delivered():  # alertas entregadas por el dispatcher (multi-cámara)
+                    lat_alert.add(d)
+                metrics = {
+                    "ts": now_ts,
+                    "camera": getattr(settings, "CAMERA_NAME", ""),
+                    "fps": round(fps_est, 2),
+                    "timings": timings.snapshot(),
+                    "fetch": health.snapshot(),
+                    "latency": {"capture_to_detect": lat_detect.snapshot(),
+                                "detect_to_alert": lat_alert.snapshot(),
+                                "server_stale": lat_stale.snapshot()},
+                    "boot": boot.snapshot(),
+                }
+                if detector is not None:
+                    metrics["motion"] = {"thresh": detector.effective_thresh(),
+                                         "min_area": detector.effective_min_area(),
+                                         "levels": dict(detector.coarse_counts),
+                                         "auto": calibrator.snapshot() if calibrator is not None else None}
+                if tracker is not None:
+                    metrics["tracks"] = tracker.snapshot()
+                if classifier is not None:
+                    metrics["classify"] = classifier.snapshot()
+                if light_gate is not None:
+                    metrics["lighting"] = dict(light_gate.snapshot(), alerts_avoided=alerts_avoided,
+                                               clips_avoided=clips_avoided)
+                if heatmap is not None:
+                    metrics["heatmap"] = dict(heatmap.snapshot(), zones=len(heat_zones))
+                if transcoder is not None and (transcoder.done or transcoder.failed or transcoder.pending):
+                    metrics["transcode"] = transcoder.snapshot()
+                metrics["config"] = reloader.snapshot()
+                write_metrics(metrics, runtime)
+    finally:
+        # Con ESC y también con Ctrl+C / SIGINT (headless, supervisor): el KeyboardInterrupt
+        # pasa por aquí antes de salir de run_viewer, así los .mp4 quedan cerrados
+        recorder.close(time.monotonic())
+        if thumbnailer is not None:
+            thumbnailer.close()
+        if classifier is not None:
+            classifier.close()
+        if heatmap is not None:
+            heatmap.save(runtime, heat_zones)
+        if transcoder is not None:
+            transcoder.close()
+        if segrec is not None:
+            segrec.close()
+        if viewer is not None:
+            viewer.stop()
+        elif settings.SHOW_WINDOW:
+            destroy_all()
+        print("⏹ Visor cerrado.")
+
+        # ✅ Telegram: fin
+        if enabled(settings.TG_BOT_TOKEN, settings.TG_CHAT_ID):
+            ok_tg_end = send_text(settings.TG_BOT_TOKEN, settings.TG_CHAT_ID, _tagged(settings, "⏹ Visor detenido."))
+            if not ok_tg_end:
+                print("[TG] Aviso de parada NO enviado. Revisa logs anteriores.", file=sys.stderr)
@@ -0,0 +1,33 @@
+# configuración multi-cámara (un fichero INI con una sección por cámara)
+
+from __future__ import annotations
+import configparser
+from dataclasses import dataclass, field
+from pathlib import Path
+
+
+@dataclass
+class CameraSpec:
+    """Una cámara: nombre (sección del INI) y variables de entorno propias."""
+    name: str
+    env: dict[str, str] = field(default_factory=dict)
+
+
+def load_cameras(path: Path) -> list[CameraSpec]:
+    """
+    Lee cameras.ini. Cada sección es una cámara; las claves son las mismas variables
+    que en .env (SNAPSHOT_HOME, THRESH, …). [DEFAULT] se aplica a todas.
+    Las claves se conservan en MAYÚSCULAS tal cual.
+    """
+    cp = configparser.ConfigParser(interpolation=None, inline_comment_prefixes=("#", ";"))
+    cp.optionxform = str  # no pasar a minúsculas
+    if not cp.read(path, encoding="utf-8"):
+        raise FileNotFoundError(f"No existe el fichero de cámaras: {path}")
+    cams: list[CameraSpec] = []
+    for name in cp.sections():
+        env = {k.strip(): v.strip() for k, v in cp.items(name)}
+        if not env.get("SNAPSHOT_HOME") and not env.get("SNAPSHOT_URL"):
+            print(f"[SUPERVISOR] [{name}] sin SNAPSHOT_HOME/SNAPSHOT_URL → se omite")
+            continue
+        cams.append(CameraSpec(name=name, env=env))
+    return cams
@@ -0,0 +1,248 @@
+# supervisor multi-cámara: un proceso por cámara, un bot y un dispatcher de Telegram
+
+from __future__ import annotations
+import os
+import sys
+import signal
+import time
+import argparse
+import multiprocessing as mp
+from pathlib import Path
+from dataclasses import dataclass
+from typing import Optional
+
+from app.config import load_settings
+from app.common.state import set_armed, is_armed
+from app.bot.poller import start_poller, handle_command
+from app.telegram.client import send_text
+from app.telegram.dispatcher import start_dispatcher
+from .config import CameraSpec, load_cameras
+
+_RESTART_BACKOFF_MIN = 1.0
+_RESTART_BACKOFF_MAX = 60.0
+_HEALTHY_RUN_SEC = 60.0  # si un worker vivió esto, el backoff vuelve al mínimo
+_STOP_TIMEOUT = 40.0  # margen para cerrar el clip y el último segmento (SegmentRecorder.close espera hasta 30 s)
+
+
+def _available_cores() -> list[int]:
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return list(range(os.cpu_count() or 1))
+
+
+def _camera_main(spec: CameraSpec, runtime_dir: str, core: Optional[int], outbox,
+                 delivered=None) -> None:
+    """Punto de entrada del proceso de una cámara (captura → detección → grabación)."""
+    os.environ.update(spec.env)
+    os.environ["CAMERA_NAME"] = spec.name
+    os.environ["RUNTIME_DIR"] = runtime_dir
+    os.environ["ALLOW_TG_COMMANDS"] = "false"  # el bot lo lleva el supervisor
+    os.environ.setdefault("SHOW_WINDOW", "false")
+    if core is not None and hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(0, {core})
+        except Exception as e:
+            print(f"[{spec.name}] No se pudo fijar CPU {core}: {e}", file=sys.stderr)
+
+    from app.telegram.client import set_outbox
+    set_outbox(outbox, delivered, spec.name.lower())
+
+    from app.state import RuntimeState
+    from app.run import run_viewer
+    # stop() manda SIGTERM: como KeyboardInterrupt, para que run_viewer cierre
+    # clips/segmentos en su finally en vez de morir a medias
+    signal.signal(signal.SIGTERM, _raise_interrupt)
+    settings = load_settings()
+    state = RuntimeState(snapshot_base=settings.SNAPSHOT_URL_INIT,
+                         snapshot_cookie=settings.SNAPSHOT_COOKIE)
+    try:
+        run_viewer(settings, state)
+    except KeyboardInterrupt:
+        pass
+
+
+def _raise_interrupt(*_) -> None:
+    raise KeyboardInterrupt
+
+
+@dataclass
+class _Worker:
+    spec: CameraSpec
+    runtime_dir: Path
+    core: Optional[int]
+    delivered: Optional[object] = None  # cola de vuelta del dispatcher (latencia de alertas)
+    proc: Optional[mp.Process] = None
+    started_at: float = 0.0
+    next_start: float = 0.0
+    backoff: float = _RESTART_BACKOFF_MIN
+    restarts: int = 0
+
+
+class Supervisor:
+    """
+    Lanza un proceso por cámara (repartidos entre los núcleos disponibles con
+    afinidad de CPU), comparte un único poller del bot y un único dispatcher de
+    envíos a Telegram, enruta comandos tipo "/snapshot cam3" y reinicia los
+    workers caídos con backoff exponencial.
+    """
+    def __init__(self, settings, cameras: list[CameraSpec], base_runtime: Path,
+                 pin_cores: bool = True):
+        self.settings = settings
+        self.ctx = mp.get_context("spawn")
+        self.outbox = self.ctx.Queue()
+        self._dispatcher = None
+        cores = _available_cores()
+        if len(cameras) > len(cores):
+            print(f"[SUPERVISOR] {len(cameras)} cámaras para {len(cores)} núcleos: "
+                  f"varias cámaras compartirán núcleo.")
+        self.workers: dict[str, _Worker] = {}
+        for i, spec in enumerate(cameras):
+            rdir = base_runtime / spec.name
+            rdir.mkdir(parents=True, exist_ok=True)
+            core = cores[i % len(cores)] if pin_cores else None
+            self.workers[spec.name.lower()] = _Worker(spec=spec, runtime_dir=rdir, core=core,
+                                                      delivered=self.ctx.Queue())
+
+    # -------- ciclo de vida --------
+
+    def _start_worker(self, w: _Worker, first: bool) -> None:
+        if not first:
+            # Un reinicio NO debe desarmar: conservar el estado actual de la cámara
+            w.spec.env["ARMED_ON_BOOT"] = "true" if is_armed(w.runtime_dir) else "false"
+        w.proc = self.ctx.Process(
+            target=_camera_main,
+            args=(w.spec, str(w.runtime_dir), w.core, self.outbox, w.delivered),
+            name=f"cam-{w.spec.name}",
+            daemon=False,
+        )
+        w.proc.start()
+        w.started_at = time.monotonic()
+        print(f"[SUPERVISOR] [{w.spec.name}] worker pid={w.proc.pid} cpu={w.core}")
+
+    def start(self) -> None:
+        self._dispatcher = start_dispatcher(self.outbox, {k: w.delivered for k, w in self.workers.items()})
+        start_poller(self.settings, handler=self.handle_text)
+        for w in self.workers.values():
+            self._start_worker(w, first=True)
+
+    def run_forever(self) -> None:
+        try:
+            while True:
+                self._check_workers()
+                time.sleep(1.0)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def _check_workers(self) -> None:
+        now = time.monotonic()
+        for w in self.workers.values():
+            if w.proc is None:
+                if now >= w.next_start:
+                    w.restarts += 1
+                    print(f"[SUPERVISOR] [{w.spec.name}] reinicio #{w.restarts}")
+                    self._start_worker(w, first=False)
+                continue
+            if w.proc.is_alive():
+                if now - w.started_at >= _HEALTHY_RUN_SEC:
+                    w.backoff = _RESTART_BACKOFF_MIN
+                continue
+            code = w.proc.exitcode
+            w.proc = None
+            w.next_start = now + w.backoff
+            print(f"[SUPERVISOR] [{w.spec.name}] worker terminó (exit={code}); "
+                  f"reinicio en {w.backoff:.0f} s", file=sys.stderr)
+            if self._tg_enabled():
+                send_text(self.settings.TG_BOT_TOKEN, self.settings.TG_CHAT_ID,
+                          f"[{w.spec.name}] ⚠️ Proceso caído (exit={code}); reinicio en {w.backoff:.0f} s")
+            w.backoff = min(_RESTART_BACKOFF_MAX, w.backoff * 2)
+
+    def stop(self) -> None:
+        for w in self.workers.values():
+            if w.proc is not None and w.proc.is_alive():
+                w.proc.terminate()
+        for w in self.workers.values():
+            if w.proc is not None:
+                w.proc.join(timeout=_STOP_TIMEOUT)
+                if w.proc.is_alive():
+                    print(f"[SUPERVISOR] [{w.spec.name}] no terminó en {_STOP_TIMEOUT:.0f} s → kill",
+                          file=sys.stderr)
+                    w.proc.kill()
+        self.outbox.put(None)
+        if self._dispatcher is not None:
+            self._dispatcher.join(timeout=_STOP_TIMEOUT)  # lo que quede en la cola se envía
+        print("[SUPERVISOR] Detenido.")
+
+    def _tg_enabled(self) -> bool:
+        return bool(self.settings.TG_BOT_TOKEN and self.settings.TG_CHAT_ID)
+
+    # -------- enrutado de comandos del bot --------
+
+    def handle_text(self, token: str, chat_id: str, text: str) -> None:
+        """
+        Enruta "/cmd [args] camX". Sin cámara: /arm, /disarm y /status se aplican a
+        todas; el resto requiere cámara salvo que solo haya una.
+        """
+        parts = text.split()
+        if not parts:
+            return
+        cmd = parts[0].lower()
+        targets = [p for p in parts[1:] if p.lower() in self.workers]
+        rest = [p for p in parts if p.lower() not in self.workers]
+        names = ", ".join(w.spec.name for w in self.workers.values())
+
+        if cmd.startswith("/cams"):
+            lines = []
+            for w in self.workers.values():
+                alive = "vivo" if (w.proc is not None and w.proc.is_alive()) else "caído"
+                lines.append(f"{w.spec.name}: {alive}, reinicios={w.restarts}")
+            send_text(token, chat_id, "\n".join(lines) or "Sin cámaras.")
+            return
+
+        if targets:
+            workers = [self.workers[t.lower()] for t in targets]
+        elif cmd.startswith(("/arm", "/disarm", "/status")) or len(self.workers) == 1:
+            workers = list(self.workers.values())
+        else:
+            send_text(token, chat_id, f"Indica la cámara: {cmd} … camX  (cámaras: {names})")
+            return
+
+        if cmd.startswith("/status") and len(workers) > 1:
+            lines = [f"{w.spec.name}: {'ARMADO 🔒' if is_armed(w.runtime_dir) else 'DESARMADO 🔓'}"
+                     for w in workers]
+            send_text(token, chat_id, "Estado:\n" + "\n".join(lines))
+            return
+        if cmd.startswith(("/arm", "/disarm")) and len(workers) > 1:
+            armed = cmd.startswith("/arm")
+            for w in workers:
+                set_armed(armed, w.runtime_dir)
+            send_text(token, chat_id, ("🔒 Armadas: " if armed else "🔓 Desarmadas: ")
+                      + ", ".join(w.spec.name for w in workers))
+            return
+
+        sub_text = " ".join(rest)
+        for w in workers:
+            handle_command(self.settings, token, chat_id, sub_text,
+                           runtime_dir=w.runtime_dir, label=w.spec.name,
+                           profile_via_queue=True)
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    ap = argparse.ArgumentParser(description="Supervisor multi-cámara")
+    ap.add_argument("cameras", nargs="?", default=os.getenv("CAMERAS_FILE", "cameras.ini"),
+                    help="fichero INI con una sección por cámara")
+    ap.add_argument("--no-pin", action="store_true", help="no fijar afinidad de CPU")
+    args = ap.parse_args(argv)
+
+    settings = load_settings()
+    cameras = load_cameras(Path(args.cameras))
+    if not cameras:
+        print("❌ No hay cámaras configuradas.")
+        return
+    base_runtime = Path(os.getenv("RUNTIME_DIR", "./runtime")).expanduser().resolve()
+    sup = Supervisor(settings, cameras, base_runtime, pin_cores=not args.no_pin)
+    print(f"▶ Supervisor: {len(cameras)} cámaras → {base_runtime}/<cámara>")
+    sup.start()
+    sup.run_forever()
@@ -0,0 +1,73 @@
+# alertas en ráfaga: las mejores K imágenes de un evento en un solo álbum
+
+from __future__ import annotations
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, List, Optional
+
+
+@dataclass
+class _Shot:
+    ts: float
+    score: float
+    image: object  # preview BGR ya reducida (con cajas)
+
+
+class BurstCollector:
+    """
+    Reúne candidatas para una alerta en ráfaga:
+    - antes de la alerta guarda previews de frames con movimiento de los últimos pre_sec
+    - trigger() abre una ventana de window_sec durante la que sigue aceptando previews
+    - al cerrar la ventana, poll() devuelve las k mejores (por puntuación: área de las
+      cajas × confianza de las pistas) en orden cronológico
+    wants() limita a una candidata cada min_gap s: el bucle solo genera la preview
+    (copia + cajas + resize) cuando se va a guardar.
+    """
+    def __init__(self, k: int = 4, window_sec: float = 3.0, pre_sec: float = 1.0,
+                 min_gap_sec: float = 0.3):
+        self.k = max(1, min(10, int(k)))  # límite de sendMediaGroup
+        self.window_sec = max(0.0, float(window_sec))
+        self.pre_sec = max(0.0, float(pre_sec))
+        self.min_gap_sec = max(0.0, float(min_gap_sec))
+        self._pre: Deque[_Shot] = deque()
+        self._shots: List[_Shot] = []
+        self._deadline: Optional[float] = None
+        self._last_ts = 0.0
+        self.bursts = 0
+
+    @property
+    def active(self) -> bool:
+        return self._deadline is not None
+
+    def wants(self, ts: float) -> bool:
+        return ts - self._last_ts >= self.min_gap_sec
+
+    def offer(self, ts: float, image, score: float) -> None:
+        self._last_ts = ts
+        shot = _Shot(ts, float(score), image)
+        if self._deadline is not None:
+            self._shots.append(shot)
+            return
+        self._pre.append(shot)
+        while self._pre and self._pre[0].ts < ts - self.pre_sec:
+            self._pre.popleft()
+
+    def trigger(self, ts: float) -> None:
+        """Empieza una ráfaga (las previews recientes cuentan como candidatas)."""
+        if self._deadline is not None:
+            return
+        self._deadline = ts + self.window_sec
+        self._shots = [s for s in self._pre if s.ts >= ts - self.pre_sec]
+        self._pre.clear()
+
+    def poll(self, ts: float) -> Optional[list]:
+        """Imágenes de la ráfaga si su ventana terminó (None si no hay nada que enviar)."""
+        if self._deadline is None or ts < self._deadline:
+            return None
+        best = sorted(self._shots, key=lambda s: s.score, reverse=True)[: self.k]
+        self._shots = []
+        self._deadline = None
+        if not best:
+            return None
+        self.bursts += 1
+        return [s.image for s in sorted(best, key=lambda s: s.ts)]
@@ -1,20 +1,81 @@
 from __future__ import annotations
-import sys, mimetypes, uuid, urllib.request
-import requests
-import cv2
+import os, sys, json, mimetypes, uuid, urllib.request
 from pathlib import Path
+from urllib.parse import urlparse
 
+# requests y cv2 se importan al primer envío (rapidez de arranque; ver warm_up)
+
+
+# Modo multi-cámara: si hay outbox (multiprocessing.Queue), los envíos se delegan
+# al dispatcher único del supervisor en lugar de salir desde cada proceso.
+# delivered: cola de vuelta de esta cámara (key) con la latencia detección → entrega
+# de las alertas que el dispatcher ya entregó a Telegram.
+_outbox = None
+_delivered = None
+_outbox_key = ""
+
+def set_outbox(q, delivered=None, key: str = "") -> None:
+    global _outbox, _delivered, _outbox_key
+    _outbox, _delivered, _outbox_key = q, delivered, key
+
+def queued() -> bool:
+    """True si los envíos solo se encolan (devuelven True al encolar, no al entregar)."""
+    return _outbox is not None
+
+def delivered_latencies() -> list:
+    """Latencias (s) detección → entrega medidas por el dispatcher desde la última llamada."""
+    out = []
+    while _delivered is not None:
+        try:
+            out.append(_delivered.get_nowait())
+        except Exception:  # queue.Empty
+            break
+    return out
+
+def _alert_meta(detect_ts) -> tuple:
+    """Cola del job para que el dispatcher mida la entrega (time.monotonic es del sistema)."""
+    return () if detect_ts is None or _delivered is None else ((_outbox_key, detect_ts),)
+
+def _queue_job(job: tuple) -> bool:
+    try:
+        _outbox.put(job)
+        return True
+    except Exception as e:
+        print(f"[TG] Error encolando envío: {e}", file=sys.stderr)
+        return False
+
+def api_url(token: str, method: str) -> str:
+    """URL de un método de la Bot API. TG_API_BASE permite apuntar a un servidor falso/local."""
+    base = os.getenv("TG_API_BASE", "https://api.telegram.org").rstrip("/")
+    return f"{base}/bot{token}/{method}"
 
 def enabled(token: str, chat_id: str) -> bool:
     return bool(token and chat_id)
 
+def warm_up() -> None:
+    """
+    Importa requests y resuelve el host de la API (en un hilo del arranque, mientras
+    se carga el resto): el primer envío no paga esos ~100-200 ms.
+    """
+    import socket
+    import requests  # noqa: F401
+    host = urlparse(os.getenv("TG_API_BASE", "https://api.telegram.org")).hostname
+    if host:
+        try:
+            socket.getaddrinfo(host, 443)
+        except Exception:
+            pass
+
 def send_text(token: str, chat_id: str, text: str) -> bool:
     if not enabled(token, chat_id):
         print("[TG] Deshabilitado: falta TG_BOT_TOKEN o TG_CHAT_ID", file=sys.stderr)
         return False
+    if _outbox is not None:
+        return _queue_job(("text", token, chat_id, text))
     try:
+        import requests
         r = requests.post(
-            f"https://api.telegram.org/bot{token}/sendMessage",
+            api_url(token, "sendMessage"),
             data={"chat_id": chat_id, "text": text},
             timeout=15
         )
@@ -31,22 +92,36 @@ def send_text(token: str, chat_id: str, text: str) -> bool:
         print(f"[TG] Error de red/envío: {e}", file=sys.stderr)
         return False
 
-def send_photo_bgr(token: str, chat_id: str, frame_bgr, caption: str = "", jpeg_quality: int = 80) -> bool:
+def send_photo_bgr(token: str, chat_id: str, frame_bgr, caption: str = "", jpeg_quality: int = 80,
+                   detect_ts: float | None = None) -> bool:
     """
-    Envía un frame BGR como foto a Telegram.
+    Envía un frame BGR como foto a Telegram. detect_ts (time.monotonic de la detección):
+    en modo multi-cámara el dispatcher mide con él la latencia hasta la entrega.
     """
     if not enabled(token, chat_id):
         print("[TG] Deshabilitado: falta TG_BOT_TOKEN o TG_CHAT_ID", file=sys.stderr)
         return False
     try:
+        import cv2
         q = min(100, max(1, int(jpeg_quality)))
         ok, buf = cv2.imencode(".jpg", frame_bgr, [int(cv2.IMWRITE_JPEG_QUALITY), q])
         if not ok:
             print("[TG] No se pudo codificar JPEG", file=sys.stderr)
             return False
-        files = {"photo": ("preview.jpg", buf.tobytes(), "image/jpeg")}
+        if _outbox is not None:
+            return _queue_job(("photo", token, chat_id, buf.tobytes(), caption) + _alert_meta(detect_ts))
+        return send_photo_bytes(token, chat_id, buf.tobytes(), caption)
+    except Exception as e:
+        print(f"[TG] Error de red/envío (foto): {e}", file=sys.stderr)
+        return False
+
+def send_photo_bytes(token: str, chat_id: str, jpeg: bytes, caption: str = "") -> bool:
+    """Envía un JPEG ya codificado como foto."""
+    try:
+        import requests
+        files = {"photo": ("preview.jpg", jpeg, "image/jpeg")}
         data = {"chat_id": chat_id, "caption": caption}
-        r = requests.post(f"https://api.telegram.org/bot{token}/sendPhoto", data=data, files=files, timeout=30)
+        r = requests.post(api_url(token, "sendPhoto"), data=data, files=files, timeout=30)
         if r.ok:
             return True
         print(f"[TG] sendPhoto fallo {r.status_code}: {r.text}", file=sys.stderr)
@@ -54,20 +129,71 @@ def send_photo_bgr(token: str, chat_id: str, frame_bgr, caption: str = "", jpeg_
     except Exception as e:
         print(f"[TG] Error de red/envío (foto): {e}", file=sys.stderr)
         return False
-    
+
+
+def send_album_bgr(token: str, chat_id: str, frames_bgr, caption: str = "", jpeg_quality: int = 80,
+                   detect_ts: float | None = None) -> bool:
+    """
+    Envía varios frames BGR como un único álbum (sendMediaGroup): una petición y una
+    sola notificación. Telegram admite de 2 a 10 fotos; con una se usa sendPhoto.
+    detect_ts: como en send_photo_bgr.
+    """
+    if not enabled(token, chat_id):
+        print("[TG] Deshabilitado: falta TG_BOT_TOKEN o TG_CHAT_ID", file=sys.stderr)
+        return False
+    try:
+        import cv2
+        q = min(100, max(1, int(jpeg_quality)))
+        jpegs = []
+        for f in list(frames_bgr)[:10]:
+            ok, buf = cv2.imencode(".jpg", f, [int(cv2.IMWRITE_JPEG_QUALITY), q])
+            if ok:
+                jpegs.append(buf.tobytes())
+        if not jpegs:
+            print("[TG] No se pudo codificar JPEG", file=sys.stderr)
+            return False
+        if _outbox is not None:
+            return _queue_job(("album", token, chat_id, jpegs, caption) + _alert_meta(detect_ts))
+        return send_album_bytes(token, chat_id, jpegs, caption)
+    except Exception as e:
+        print(f"[TG] Error de red/envío (álbum): {e}", file=sys.stderr)
+        return False
+
+def send_album_bytes(token: str, chat_id: str, jpegs: list, caption: str = "") -> bool:
+    """Envía JPEGs ya codificados como álbum (el pie va en la primera foto)."""
+    if len(jpegs) == 1:
+        return send_photo_bytes(token, chat_id, jpegs[0], caption)
+    try:
+        import requests
+        media = [{"type": "photo", "media": f"attach://p{i}"} for i in range(len(jpegs))]
+        if caption:
+            media[0]["caption"] = caption
+        files = {f"p{i}": (f"p{i}.jpg", jpg, "image/jpeg") for i, jpg in enumerate(jpegs)}
+        data = {"chat_id": chat_id, "media": json.dumps(media)}
+        r = requests.post(api_url(token, "sendMediaGroup"), data=data, files=files, timeout=60)
+        if r.ok:
+            return True
+        print(f"[TG] sendMediaGroup fallo {r.status_code}: {r.text}", file=sys.stderr)
+        return False
+    except Exception as e:
+        print(f"[TG] Error de red/envío (álbum): {e}", file=sys.stderr)
+        return False
+
 
 def send_video_file(bot_token: str, chat_id: str, file_path: str, caption: str | None = None) -> bool:
     """
     Envía un MP4 al chat indicado usando Telegram Bot API (sendVideo).
     Devuelve True/False.
     """
+    if _outbox is not None:
+        return _queue_job(("video", bot_token, chat_id, str(file_path), caption))
     try:
         video_path = Path(file_path)
         if not video_path.exists():
             print(f"[TG] Video no existe: {file_path}", file=sys.stderr)
             return False
 
-        url = f"https://api.telegram.org/bot{bot_token}/sendVideo"
+        url = api_url(bot_token, "sendVideo")
         boundary = f"----WebKitFormBoundary{uuid.uuid4().hex}"
         headers = {"Content-Type": f"multipart/form-data; boundary={boundary}"}
 
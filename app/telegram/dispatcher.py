@@ -0,0 +1,66 @@
+# dispatcher único de envíos a Telegram (modo multi-cámara)
+
+from __future__ import annotations
+import sys
+import time
+import threading
+from typing import Optional
+
+from .client import send_text, send_photo_bytes, send_album_bytes, send_video_file
+
+
+def _dispatch(job: tuple) -> bool:
+    kind = job[0]
+    if kind == "text":
+        _, token, chat_id, text = job
+        return send_text(token, chat_id, text)
+    if kind == "photo":
+        _, token, chat_id, jpeg, caption = job[:5]
+        return send_photo_bytes(token, chat_id, jpeg, caption)
+    if kind == "album":
+        _, token, chat_id, jpegs, caption = job[:5]
+        return send_album_bytes(token, chat_id, jpegs, caption)
+    if kind == "video":
+        _, token, chat_id, path, caption = job
+        return send_video_file(token, chat_id, path, caption=caption)
+    print(f"[TG-DISPATCH] Tipo de envío desconocido: {kind}", file=sys.stderr)
+    return False
+
+
+def _report(job: tuple, delivered: dict) -> None:
+    """Alerta con (cámara, detect_ts): latencia hasta la entrega → cola de vuelta de esa cámara."""
+    if job[0] not in ("photo", "album") or len(job) < 6:
+        return
+    key, detect_ts = job[5]
+    q = delivered.get(key)
+    if q is not None:
+        try:
+            q.put_nowait(time.monotonic() - detect_ts)
+        except Exception:
+            pass
+
+
+def _loop(q, delivered: dict) -> None:
+    while True:
+        job = q.get()
+        if job is None:
+            break
+        try:
+            if _dispatch(job):
+                _report(job, delivered)
+            else:
+                print(f"[TG-DISPATCH] Envío '{job[0]}' fallido", file=sys.stderr)
+        except Exception as e:
+            print(f"[TG-DISPATCH] ERROR: {e}", file=sys.stderr)
+
+
+def start_dispatcher(q, delivered: Optional[dict] = None) -> threading.Thread:
+    """
+    Consume los envíos encolados por los procesos de cámara (set_outbox) y los
+    manda en orden desde el supervisor. q.put(None) lo detiene.
+    delivered: {cámara: cola} para devolver la latencia detección → entrega de
+    cada alerta entregada (time.monotonic es del sistema: vale entre procesos).
+    """
+    t = threading.Thread(target=_loop, args=(q, delivered or {}), name="tg-dispatcher", daemon=True)
+    t.start()
+    return t
@@ -0,0 +1,148 @@
+# servidor HTTP local: último frame + MJPEG, repartido desde la descarga del bucle
+
+from __future__ import annotations
+import html
+import time
+import hmac
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+
+_BOUNDARY = "frame"
+_INDEX_HTML = (
+    "<!doctype html><html><head><meta charset='utf-8'><title>{title}</title></head>"
+    "<body style='margin:0;background:#000'>"
+    "<img src='stream.mjpg{qs}' style='width:100%;height:auto'></body></html>"
+)
+
+
+class FrameHub:
+    """
+    Buzón del último JPEG con número de secuencia.
+    publish() no bloquea nunca al bucle de captura; cada cliente espera al
+    siguiente frame y, si es lento, simplemente se salta los intermedios.
+    """
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._jpeg: Optional[bytes] = None
+        self._seq = 0
+        self._clients = 0
+
+    @property
+    def clients(self) -> int:
+        return self._clients
+
+    def publish(self, jpeg: bytes) -> None:
+        with self._cond:
+            self._jpeg = jpeg
+            self._seq += 1
+            self._cond.notify_all()
+
+    def latest(self) -> Tuple[int, Optional[bytes]]:
+        with self._cond:
+            return self._seq, self._jpeg
+
+    def wait_next(self, last_seq: int, timeout: float = 5.0) -> Tuple[int, Optional[bytes]]:
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq != last_seq, timeout=timeout)
+            return self._seq, self._jpeg
+
+    def _add_client(self, delta: int) -> None:
+        with self._cond:
+            self._clients += delta
+
+
+def _make_handler(hub: FrameHub, title: str, token: str, max_fps: float):
+    min_interval = (1.0 / max_fps) if max_fps and max_fps > 0 else 0.0
+
+    class _Handler(BaseHTTPRequestHandler):
+        timeout = 15  # un cliente muerto no retiene su hilo para siempre
+
+        def _authorized(self, qs: dict) -> bool:
+            if not token:
+                return True
+            got = (qs.get("token") or [""])[0]
+            return hmac.compare_digest(got, token)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            qs = parse_qs(url.query)
+            if not self._authorized(qs):
+                self.send_error(403)
+                return
+            route = url.path.rstrip("/") or "/"
+            if route == "/":
+                body = _INDEX_HTML.format(title=html.escape(title),
+                                          qs=f"?token={token}" if token else "").encode("utf-8")
+                self._send_bytes(body, "text/html; charset=utf-8")
+            elif route == "/latest.jpg":
+                _, jpeg = hub.latest()
+                if jpeg is None:
+                    self.send_error(503, "Sin frames todavía")
+                    return
+                self._send_bytes(jpeg, "image/jpeg")
+            elif route == "/stream.mjpg":
+                self._stream()
+            else:
+                self.send_error(404)
+
+        def _send_bytes(self, body: bytes, ctype: str) -> None:
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Cache-Control", "no-cache, no-store")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _stream(self) -> None:
+            self.send_response(200)
+            self.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={_BOUNDARY}")
+            self.send_header("Cache-Control", "no-cache, no-store")
+            self.end_headers()
+            hub._add_client(+1)
+            last_seq, last_sent = -1, 0.0
+            try:
+                while True:
+                    seq, jpeg = hub.wait_next(last_seq)
+                    if jpeg is None or seq == last_seq:
+                        continue
+                    if min_interval:
+                        wait = min_interval - (time.monotonic() - last_sent)
+                        if wait > 0:
+                            time.sleep(wait)
+                            seq, jpeg = hub.latest()  # tras esperar, el más reciente
+                    self.wfile.write(
+                        f"--{_BOUNDARY}\r\nContent-Type: image/jpeg\r\n"
+                        f"Content-Length: {len(jpeg)}\r\n\r\n".encode("ascii"))
+                    self.wfile.write(jpeg)
+                    self.wfile.write(b"\r\n")
+                    last_seq, last_sent = seq, time.monotonic()
+            except (BrokenPipeError, ConnectionResetError, TimeoutError, OSError):
+                pass
+            finally:
+                hub._add_client(-1)
+
+        def log_message(self, fmt, *args):
+            pass
+
+    return _Handler
+
+
+def start_stream_server(hub: FrameHub, listen: str = "0.0.0.0:8080", title: str = "Webcam",
+                        token: str = "", max_fps: float = 0.0) -> Optional[ThreadingHTTPServer]:
+    """
+    Rutas: /  (página con el stream), /latest.jpg, /stream.mjpg
+    Si token no está vacío, se exige ?token=... en todas las rutas.
+    """
+    host, _, port = listen.rpartition(":")
+    try:
+        server = ThreadingHTTPServer((host or "0.0.0.0", int(port)),
+                                     _make_handler(hub, title, token, max_fps))
+        server.daemon_threads = True
+    except Exception as e:
+        print(f"[STREAM] No se pudo escuchar en {listen}: {e}")
+        return None
+    threading.Thread(target=server.serve_forever, name="stream-server", daemon=True).start()
+    print(f"[STREAM] Vista en vivo: http://{listen}/  (MJPEG: /stream.mjpg, último: /latest.jpg)")
+    return server
@@ -1,6 +1,9 @@
 # utilidades de ventana
 
 from __future__ import annotations
+import time
+import threading
+from typing import Optional
 import cv2
 
 def create_window(title: str):
@@ -18,3 +21,83 @@ def should_quit() -> bool:
 
 def destroy_all():
     cv2.destroyAllWindows()
+
+
+def _draw_timings(img, timings: dict) -> None:
+    y = 18
+    for name, ms in timings.items():
+        txt = f"{name}: {ms:.1f} ms"
+        cv2.putText(img, txt, (8, y), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (0, 0, 0), 3, cv2.LINE_AA)
+        cv2.putText(img, txt, (8, y), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (255, 255, 255), 1, cv2.LINE_AA)
+        y += 16
+
+
+class ViewerThread:
+    """
+    Ventana OpenCV en su propio hilo con buzón de "último frame":
+    - post() nunca espera: sustituye el frame pendiente (los intermedios se descartan)
+    - el render va a su ritmo (max_fps opcional) y actualiza el título 1 vez/s
+    - ESC se comunica al bucle mediante quit_event
+    El hilo crea y destruye la ventana (HighGUI debe usarse desde un único hilo).
+    """
+    def __init__(self, title: str, max_fps: float = 0.0, overlay_timings: bool = False):
+        self.title = title
+        self.min_interval = (1.0 / max_fps) if max_fps and max_fps > 0 else 0.0
+        self.overlay_timings = overlay_timings
+        self.quit_event = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._pending = None  # (frame, fps, timings)
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "ViewerThread":
+        self._thread = threading.Thread(target=self._run, name="viewer", daemon=True)
+        self._thread.start()
+        return self
+
+    def post(self, frame, fps: float, timings: Optional[dict] = None) -> None:
+        with self._lock:
+            self._pending = (frame, fps, timings)
+
+    def stop(self, timeout: float = 2.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+
+    def _run(self) -> None:
+        try:
+            create_window(self.title)
+            last_draw = 0.0
+            last_title = 0.0
+            while not self._stop.is_set():
+                with self._lock:
+                    item, self._pending = self._pending, None
+                now = time.monotonic()
+                if item is not None and (now - last_draw) >= self.min_interval:
+                    frame, fps, timings = item
+                    if self.overlay_timings and timings:
+                        frame = frame.copy()
+                        _draw_timings(frame, timings)
+                    cv2.imshow(self.title, frame)
+                    last_draw = now
+                    if now - last_title >= 1.0:
+                        try:
+                            cv2.setWindowTitle(self.title, f"{self.title}  |  {fps:.1f} fps (ESC para salir)")
+                        except Exception:
+                            pass
+                        last_title = now
+                elif item is not None:
+                    # Aún no toca dibujar: devolver al buzón si no llegó otro más nuevo
+                    with self._lock:
+                        if self._pending is None:
+                            self._pending = item
+                if (cv2.waitKey(10) & 0xFF) == 27:  # ESC
+                    self.quit_event.set()
+        except Exception as e:
+            # La captura sigue sin ventana (un fallo de display no para el sistema)
+            print(f"[VIEWER] ERROR en hilo de render: {e}; se continúa sin ventana")
+        finally:
+            try:
+                destroy_all()
+            except Exception:
+                pass
@@ -0,0 +1,158 @@
+# micro-benchmarks de detección (python -m app.vision.bench)
+
+from __future__ import annotations
+import sys
+import time
+import argparse
+import tracemalloc
+import numpy as np
+import cv2
+
+from app.vision.motion import preprocess_frame, diff_and_boxes, detect_batch, MotionDetector
+
+
+def synthetic_frames(n: int, w: int = 1280, h: int = 720, seed: int = 0):
+    """Fondo fijo con ruido de sensor y un rectángulo que cruza la escena."""
+    rng = np.random.default_rng(seed)
+    bg = cv2.GaussianBlur(rng.integers(0, 255, (h, w, 3), dtype=np.uint8), (31, 31), 0)
+    frames = []
+    for i in range(n):
+        f = bg.copy()
+        noise = rng.integers(-3, 4, (h, w, 3), dtype=np.int16)
+        f = np.clip(f.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+        if (i // 20) % 2 == 0:  # tramos con y sin movimiento
+            x = int((i * 17) % (w - 120))
+            cv2.rectangle(f, (x, h // 3), (x + 120, h // 3 + 200), (40, 200, 90), -1)
+        frames.append(f)
+    return frames
+
+
+def _functions_step(proc_width, thresh, min_area, dilate_iters):
+    """Ruta clásica (preprocess_frame + diff_and_boxes) como función de un frame."""
+    st = {"prev": None}
+
+    def step(f):
+        gray, _, _ = preprocess_frame(f, proc_width)
+        prev = st["prev"] if st["prev"] is not None else gray
+        boxes = diff_and_boxes(prev, gray, thresh, min_area, dilate_iters)
+        st["prev"] = gray
+        return boxes
+    return step
+
+
+def _detector_step(proc_width, thresh, min_area, dilate_iters):
+    det = MotionDetector(proc_width, thresh, min_area, dilate_iters)
+    return det.process
+
+
+def _measure(step, frames):
+    """
+    Ejecuta step sobre frames y devuelve (cajas, segundos/frame, bytes asignados/frame).
+    Los bytes son el pico transitorio por frame (tracemalloc.reset_peak), tras el
+    primer frame (que reserva buffers).
+    """
+    out = [step(frames[0])]
+    tracemalloc.start()
+    alloc = 0
+    t_total = 0.0
+    for f in frames[1:]:
+        base, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        t0 = time.perf_counter()
+        out.append(step(f))
+        t_total += time.perf_counter() - t0
+        _, peak = tracemalloc.get_traced_memory()
+        alloc += peak - base
+    tracemalloc.stop()
+    k = max(1, len(frames) - 1)
+    return out[1:], t_total / k, alloc / k
+
+
+def bench_detector(n: int, proc_width: int, thresh: int, min_area: int, dilate_iters: int) -> bool:
+    frames = synthetic_frames(n)
+    params = (proc_width, thresh, min_area, dilate_iters)
+    ref, t_ref, a_ref = _measure(_functions_step(*params), frames)
+    new, t_new, a_new = _measure(_detector_step(*params), frames)
+    same = ref == new
+    print(f"[BENCH] funciones:      {1000 * t_ref:7.3f} ms/frame  asignado {a_ref / 1024:8.1f} KiB/frame")
+    print(f"[BENCH] MotionDetector: {1000 * t_new:7.3f} ms/frame  asignado {a_new / 1024:8.1f} KiB/frame")
+    print(f"[BENCH] speedup x{t_ref / max(1e-9, t_new):.2f}  cajas idénticas: {same}")
+    return same
+
+
+def bench_coarse(n: int, proc_width: int, thresh: int, min_area: int, dilate_iters: int,
+                 coarse_width: int) -> bool:
+    """
+    Grueso a fino frente a MotionDetector completo: ms/frame con y sin movimiento.
+    Los frames se generan ya a proc_width para medir la detección y no el resize.
+    """
+    frames = synthetic_frames(n, w=proc_width, h=proc_width * 9 // 16)
+    full = MotionDetector(proc_width, thresh, min_area, dilate_iters)
+    coarse = MotionDetector(proc_width, thresh, min_area, dilate_iters, coarse_width=coarse_width)
+    full.process(frames[0])
+    coarse.process(frames[0])
+    t = {"quiet": [0.0, 0.0, 0], "motion": [0.0, 0.0, 0]}
+    same = True
+    for f in frames[1:]:
+        t0 = time.perf_counter()
+        ref = full.process(f)
+        t1 = time.perf_counter()
+        new = coarse.process(f)
+        t2 = time.perf_counter()
+        same = same and ref == new
+        acc = t["motion" if ref else "quiet"]
+        acc[0] += t1 - t0
+        acc[1] += t2 - t1
+        acc[2] += 1
+    for kind, (a, b, k) in t.items():
+        if k:
+            print(f"[BENCH] {kind:6s} ({k:4d} frames): completo {1000 * a / k:7.3f} ms  "
+                  f"grueso→fino {1000 * b / k:7.3f} ms  x{a / max(1e-9, b):.2f}")
+    print(f"[BENCH] niveles {coarse.coarse_counts}  cajas idénticas: {same}")
+    return same
+
+
+def bench_batch(n: int, proc_width: int, thresh: int, min_area: int, dilate_iters: int,
+                chunk_mb: float) -> bool:
+    """detect_batch sobre la pila de grises frente a diff_and_boxes frame a frame."""
+    grays = np.stack([preprocess_frame(f, proc_width)[0] for f in synthetic_frames(n)])
+    t_ref = t_bat = float("inf")
+    for _ in range(3):  # mejor de 3: las dos rutas duran pocos ms
+        t0 = time.perf_counter()
+        ref = [diff_and_boxes(grays[max(0, i - 1)], grays[i], thresh, min_area, dilate_iters)
+               for i in range(len(grays))]
+        t1 = time.perf_counter()
+        res = detect_batch(grays, thresh, min_area, dilate_iters, chunk_mb=chunk_mb)
+        t2 = time.perf_counter()
+        t_ref, t_bat = min(t_ref, t1 - t0), min(t_bat, t2 - t1)
+    same = ref == [r.boxes for r in res]
+    k = max(1, len(grays))
+    moving = sum(1 for r in res if r.boxes)
+    skipped = sum(1 for r in res if r.max_diff <= thresh)
+    print(f"[BENCH] frame a frame:  {1000 * t_ref / k:7.3f} ms/frame")
+    print(f"[BENCH] detect_batch:   {1000 * t_bat / k:7.3f} ms/frame  (bloques de ≤ {chunk_mb:g} MB, con estadísticas)")
+    print(f"[BENCH] speedup x{t_ref / max(1e-9, t_bat):.2f}  frames con cajas={moving}/{k}  "
+          f"sin blur (max|diff| ≤ thresh)={skipped}/{k}  cajas idénticas: {same}")
+    return same
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmarks de detección de movimiento")
+    ap.add_argument("--frames", type=int, default=300)
+    ap.add_argument("--proc-width", type=int, default=320)
+    ap.add_argument("--thresh", type=int, default=15)
+    ap.add_argument("--min-area", type=int, default=300)
+    ap.add_argument("--dilate-iters", type=int, default=2)
+    ap.add_argument("--coarse-width", type=int, default=80)
+    ap.add_argument("--batch-mb", type=float, default=2.0, help="memoria por bloque de detect_batch")
+    a = ap.parse_args(argv)
+    ok = bench_detector(a.frames, a.proc_width, a.thresh, a.min_area, a.dilate_iters)
+    if a.coarse_width > 0:
+        ok = bench_coarse(a.frames, a.proc_width, a.thresh, a.min_area, a.dilate_iters,
+                          a.coarse_width) and ok
+    ok = bench_batch(a.frames, a.proc_width, a.thresh, a.min_area, a.dilate_iters, a.batch_mb) and ok
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,236 @@
+# segunda etapa opcional: clasificación en CPU de los recortes con movimiento
+
+from __future__ import annotations
+import math
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+import cv2
+import numpy as np
+
+CLASSES = ("person", "vehicle", "animal", "other")
+
+# Etiquetas de MobileNet-SSD (VOC, 21 clases) → nuestras 4 clases
+_VOC_LABELS = ("background", "aeroplane", "bicycle", "bird", "boat", "bottle", "bus", "car",
+               "cat", "chair", "cow", "diningtable", "dog", "horse", "motorbike", "person",
+               "pottedplant", "sheep", "sofa", "train", "tvmonitor")
+_GROUPS = {
+    "person": "person",
+    "aeroplane": "vehicle", "bicycle": "vehicle", "boat": "vehicle", "bus": "vehicle",
+    "car": "vehicle", "motorbike": "vehicle", "train": "vehicle", "truck": "vehicle",
+    "bird": "animal", "cat": "animal", "cow": "animal", "dog": "animal", "horse": "animal",
+    "sheep": "animal",
+}
+
+
+def parse_classes(raw: str) -> Optional[frozenset]:
+    """'person,vehicle' → frozenset; vacío → None (sin filtro)."""
+    items = {c.strip().lower() for c in (raw or "").split(",") if c.strip()}
+    return frozenset(items) if items else None
+
+
+@dataclass
+class ClassResult:
+    track_id: int
+    label: str
+    score: float
+    latency: float  # s de inferencia en el worker
+
+
+class _HogBackend:
+    """Detector de personas HOG+SVM de OpenCV: solo distingue person / other."""
+    def __init__(self, min_conf: float):
+        if not hasattr(cv2, "HOGDescriptor"):
+            # OpenCV 5 lo movió a contrib: usar CLASSIFY_BACKEND=dnn
+            raise RuntimeError("HOG no disponible en este OpenCV (usa CLASSIFY_BACKEND=dnn)")
+        self.hog = cv2.HOGDescriptor()
+        self.hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+        self.min_conf = min_conf
+
+    def classify(self, crop) -> Tuple[str, float]:
+        h, w = crop.shape[:2]
+        # La ventana HOG es 64x128: escalar el recorte para que quepa al menos una
+        scale = max(1.0, 128.0 / max(1, h), 64.0 / max(1, w))
+        if scale > 1.0:
+            crop = cv2.resize(crop, (int(w * scale) + 1, int(h * scale) + 1), interpolation=cv2.INTER_LINEAR)
+        _, weights = self.hog.detectMultiScale(crop, winStride=(8, 8), padding=(8, 8), scale=1.1)
+        best = float(np.max(weights)) if len(weights) else 0.0
+        return ("person", best) if best >= self.min_conf else ("other", best)
+
+
+class _DnnBackend:
+    """Red SSD vía cv2.dnn (por defecto MobileNet-SSD Caffe, entrada 300x300)."""
+    def __init__(self, model: str, config: str, labels: Tuple[str, ...], min_conf: float,
+                 input_size: int = 300):
+        self.net = cv2.dnn.readNet(model, config) if config else cv2.dnn.readNet(model)
+        self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        self.labels = labels
+        self.min_conf = min_conf
+        self.input_size = input_size
+
+    def classify(self, crop) -> Tuple[str, float]:
+        n = self.input_size
+        blob = cv2.dnn.blobFromImage(crop, 0.007843, (n, n), 127.5)
+        self.net.setInput(blob)
+        det = self.net.forward().reshape(-1, 7)  # [_, clase, conf, x1, y1, x2, y2]
+        if det.size == 0:
+            return "other", 0.0
+        i = int(np.argmax(det[:, 2]))
+        score = float(det[i, 2])
+        cls = int(det[i, 1])
+        if score < self.min_conf or not (0 <= cls < len(self.labels)):
+            return "other", score
+        return _GROUPS.get(self.labels[cls].lower(), "other"), score
+
+
+class CropClassifier:
+    """
+    Clasifica recortes de pistas en un pool de hilos (OpenCV libera el GIL):
+    - submit() no bloquea: respeta un presupuesto de max_per_sec inferencias
+      (cubo de fichas) y un máximo de trabajos en vuelo
+    - resultados cacheados por pista (una vez por objeto) y por región (celda de
+      rejilla + tamaño, con TTL) para no reclasificar objetos estáticos
+    - cada hilo tiene su propia red/HOG (no son thread-safe)
+    El bucle recoge los resultados con poll().
+    """
+    def __init__(self, backend: str = "hog", model: str = "", config: str = "",
+                 labels: Optional[Tuple[str, ...]] = None, min_conf: float = 0.4,
+                 workers: int = 1, max_per_sec: float = 4.0, cache_ttl: float = 300.0,
+                 region_px: int = 24):
+        self.backend = (backend or "hog").lower()
+        if self.backend == "dnn" and not model:
+            raise ValueError("CLASSIFY_BACKEND=dnn requiere CLASSIFY_MODEL")
+        self.model = model
+        self.config = config
+        self.labels = tuple(labels) if labels else _VOC_LABELS
+        self.min_conf = float(min_conf)
+        self.workers = max(1, int(workers))
+        self.rate = max(0.1, float(max_per_sec))
+        self.cache_ttl = max(0.0, float(cache_ttl))
+        self.region_px = max(4, int(region_px))
+        # Construir un backend ya: un modelo inexistente falla aquí y no en cada recorte
+        self._spare = self._make_backend()
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="classify")
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._done: List[ClassResult] = []
+        self._pending: set = set()
+        self._tokens = self.rate
+        self._tokens_ts = time.monotonic()
+        self._regions: Dict[tuple, Tuple[str, float, float]] = {}  # key → (label, score, ts)
+        self.submitted = 0
+        self.skipped_budget = 0
+        self.region_hits = 0
+        self.errors = 0
+        self.counts: Dict[str, int] = {c: 0 for c in CLASSES}
+
+    # -------- backend por hilo --------
+
+    def _make_backend(self):
+        if self.backend == "dnn":
+            return _DnnBackend(self.model, self.config, self.labels, self.min_conf)
+        return _HogBackend(self.min_conf)
+
+    def _net(self):
+        b = getattr(self._local, "backend", None)
+        if b is None:
+            with self._lock:
+                b, self._spare = self._spare, None  # el primer hilo reutiliza el de prueba
+            if b is None:
+                b = self._make_backend()
+            self._local.backend = b
+        return b
+
+    def _work(self, track_id: int, crop, key: tuple) -> None:
+        t0 = time.perf_counter()
+        try:
+            label, score = self._net().classify(crop)
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+                self._pending.discard(track_id)
+                if self.errors <= 3:
+                    print(f"[CLASSIFY] Error: {e}")
+            return
+        res = ClassResult(track_id, label, score, time.perf_counter() - t0)
+        with self._lock:
+            self._pending.discard(track_id)
+            self._done.append(res)
+            self._regions[key] = (label, score, time.monotonic())
+            self.counts[label] = self.counts.get(label, 0) + 1
+
+    # -------- API del bucle --------
+
+    def region_key(self, box: Tuple[int, int, int, int]) -> tuple:
+        """Celda de la rejilla del centro + orden de magnitud del área (coords procesadas)."""
+        x, y, w, h = box
+        g = self.region_px
+        return (int((x + w / 2.0) // g), int((y + h / 2.0) // g),
+                int(round(math.log2(max(1, w * h)))))
+
+    def lookup_region(self, key: tuple) -> Optional[Tuple[str, float]]:
+        with self._lock:
+            hit = self._regions.get(key)
+            if hit is None:
+                return None
+            if time.monotonic() - hit[2] > self.cache_ttl:
+                del self._regions[key]
+                return None
+            self.region_hits += 1
+            return hit[0], hit[1]
+
+    def is_pending(self, track_id: int) -> bool:
+        with self._lock:
+            return track_id in self._pending
+
+    def submit(self, track_id: int, crop, key: tuple) -> bool:
+        """Encola el recorte (ya copiado) si hay presupuesto. False = se reintentará."""
+        now = time.monotonic()
+        with self._lock:
+            if track_id in self._pending:
+                return True
+            self._tokens = min(self.rate, self._tokens + (now - self._tokens_ts) * self.rate)
+            self._tokens_ts = now
+            if self._tokens < 1.0 or len(self._pending) >= 2 * self.workers:
+                self.skipped_budget += 1
+                return False
+            self._tokens -= 1.0
+            self._pending.add(track_id)
+            self.submitted += 1
+        self._pool.submit(self._work, track_id, crop, key)
+        return True
+
+    def poll(self) -> List[ClassResult]:
+        with self._lock:
+            done, self._done = self._done, []
+        return done
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "backend": self.backend,
+                "submitted": self.submitted,
+                "pending": len(self._pending),
+                "skipped_budget": self.skipped_budget,
+                "region_hits": self.region_hits,
+                "errors": self.errors,
+                "counts": dict(self.counts),
+            }
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def crop_box(frame, box: Tuple[int, int, int, int], sx: float, sy: float, pad: float = 0.15):
+    """Recorte (copia) del frame original para una caja en coords procesadas, con margen."""
+    H, W = frame.shape[:2]
+    x, y, w, h = box
+    px, py = w * pad, h * pad
+    x1 = max(0, int((x - px) * sx)); y1 = max(0, int((y - py) * sy))
+    x2 = min(W, int((x + w + px) * sx)); y2 = min(H, int((y + h + py) * sy))
+    if x2 <= x1 or y2 <= y1:
+        return None
+    return frame[y1:y2, x1:x2].copy()
@@ -0,0 +1,143 @@
+# mapa de calor del movimiento (con olvido) y zonas candidatas a máscara
+
+from __future__ import annotations
+import os
+import json
+import time
+from pathlib import Path
+from typing import List, Optional
+import cv2
+import numpy as np
+
+HEATMAP_FILE = "heatmap.npy"
+HEATMAP_META = "heatmap.json"
+
+
+class MotionHeatmap:
+    """
+    Fracción del tiempo que cada píxel (a resolución de PROC_WIDTH) supera el umbral,
+    como media exponencial con semivida halflife_sec:
+        heat ← heat·(1−α) + mask·α,   α = 1 − 0.5^(dt / semivida)
+    Un solo cv2.accumulateWeighted por frame sobre la máscara binaria que el
+    detector ya calculó (0/255): heat/255 es la actividad 0..1.
+    Los frames de cambio de luz no se acumulan. Si cambia el tamaño de procesado
+    el mapa se reinicia.
+    """
+    def __init__(self, halflife_sec: float = 3600.0):
+        self.halflife_sec = max(1.0, float(halflife_sec))
+        self.heat: Optional[np.ndarray] = None
+        self.samples = 0
+        self._last_ts: Optional[float] = None
+
+    def update(self, mask: np.ndarray, ts: float) -> None:
+        if self.heat is None or self.heat.shape != mask.shape:
+            self.heat = np.zeros(mask.shape, np.float32)
+            self.samples = 0
+            self._last_ts = None
+        dt = 0.0 if self._last_ts is None else min(60.0, max(0.0, ts - self._last_ts))
+        self._last_ts = ts
+        # Al arrancar, media simple hasta que manda la semivida (sin sesgo hacia 0)
+        alpha = max(1.0 - 0.5 ** (dt / self.halflife_sec), 1.0 / (self.samples + 1))
+        cv2.accumulateWeighted(mask, self.heat, alpha)
+        self.samples += 1
+
+    # -------- persistencia (RUNTIME_DIR/heatmap.npy + heatmap.json) --------
+
+    def save(self, runtime_dir: Path, zones: Optional[list] = None) -> None:
+        """Escritura atómica (.tmp → os.replace); un fallo solo se avisa."""
+        if self.heat is None:
+            return
+        path = runtime_dir / HEATMAP_FILE
+        tmp = runtime_dir / (HEATMAP_FILE + ".tmp")
+        try:
+            with open(tmp, "wb") as f:
+                np.save(f, self.heat)
+            os.replace(tmp, path)
+            meta = {"ts": time.time(), "shape": list(self.heat.shape), "samples": self.samples,
+                    "halflife_sec": self.halflife_sec, "zones": zones or []}
+            (runtime_dir / HEATMAP_META).write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+        except Exception as e:
+            print(f"[HEAT] No se pudo guardar el mapa de calor: {e}")
+            tmp.unlink(missing_ok=True)
+
+    def load(self, runtime_dir: Path) -> bool:
+        """Recupera el mapa guardado (se descarta si el tamaño de procesado no coincide luego)."""
+        heat = load_heatmap(runtime_dir)
+        if heat is None:
+            return False
+        try:
+            meta = json.loads((runtime_dir / HEATMAP_META).read_text(encoding="utf-8"))
+            self.samples = int(meta.get("samples", 0))
+        except Exception:
+            self.samples = 0
+        self.heat = heat
+        return True
+
+    def snapshot(self) -> dict:
+        return {"samples": self.samples,
+                "shape": list(self.heat.shape) if self.heat is not None else None,
+                "mean_activity": round(float(self.heat.mean()) / 255.0, 4) if self.heat is not None else None}
+
+
+def load_heatmap(runtime_dir: Path) -> Optional[np.ndarray]:
+    try:
+        heat = np.load(runtime_dir / HEATMAP_FILE)
+    except Exception:
+        return None
+    return heat.astype(np.float32, copy=False) if heat.ndim == 2 else None
+
+
+def suggest_zones(heat: np.ndarray, min_activity: float = 0.15,
+                  min_area_frac: float = 0.002) -> List[dict]:
+    """
+    Regiones casi siempre activas (árboles, banderas, pantallas): píxeles con
+    actividad ≥ min_activity, cerrados y agrupados por componentes conexas; se
+    descartan las de menos de min_area_frac del frame. Cajas en fracciones del
+    frame (0..1, independientes de la resolución), de más a menos activa.
+    """
+    h, w = heat.shape[:2]
+    hot = (heat >= min_activity * 255.0).astype(np.uint8) * 255
+    k = max(3, (w // 80) | 1)
+    hot = cv2.morphologyEx(hot, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (k, k)))
+    n, labels, stats, _ = cv2.connectedComponentsWithStats(hot, connectivity=8)
+    zones = []
+    for i in range(1, n):
+        x, y, bw, bh, area = (int(v) for v in stats[i])
+        if area < min_area_frac * w * h:
+            continue
+        act = float(heat[labels == i].mean()) / 255.0
+        zones.append({
+            "x": round(x / w, 3), "y": round(y / h, 3), "w": round(bw / w, 3), "h": round(bh / h, 3),
+            "area": round(area / float(w * h), 4),
+            "activity": round(act, 3),
+        })
+    zones.sort(key=lambda z: z["activity"], reverse=True)
+    return zones
+
+
+def render_heatmap(frame_bgr, heat: np.ndarray, zones: Optional[List[dict]] = None,
+                   opacity: float = 0.55) -> np.ndarray:
+    """Mapa de calor (JET) sobre el frame, con las zonas sugeridas numeradas."""
+    h0, w0 = frame_bgr.shape[:2]
+    act = cv2.resize(heat, (w0, h0), interpolation=cv2.INTER_LINEAR)
+    # Relativa al máximo y con raíz: el paso ocasional se ve junto a una zona siempre activa
+    norm = np.sqrt(np.clip(act / max(1.0, float(act.max())), 0.0, 1.0))
+    color = cv2.applyColorMap((norm * 255.0).astype(np.uint8), cv2.COLORMAP_JET)
+    alpha = (norm * opacity)[..., None]
+    out = (frame_bgr.astype(np.float32) * (1.0 - alpha) + color.astype(np.float32) * alpha).astype(np.uint8)
+    for i, z in enumerate(zones or [], 1):
+        x1, y1 = int(z["x"] * w0), int(z["y"] * h0)
+        x2, y2 = int((z["x"] + z["w"]) * w0), int((z["y"] + z["h"]) * h0)
+        cv2.rectangle(out, (x1, y1), (x2, y2), (255, 255, 255), 2)
+        cv2.putText(out, f"{i}", (x1 + 4, y1 + 18), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2, cv2.LINE_AA)
+    return out
+
+
+def format_zones(zones: List[dict]) -> str:
+    if not zones:
+        return "Sin zonas con actividad constante."
+    lines = ["Zonas candidatas a máscara (x, y, ancho, alto en % del frame):"]
+    for i, z in enumerate(zones, 1):
+        lines.append(f"{i}: x={z['x'] * 100:.0f}% y={z['y'] * 100:.0f}% "
+                     f"{z['w'] * 100:.0f}%×{z['h'] * 100:.0f}% activa {z['activity'] * 100:.0f}% del tiempo")
+    return "\n".join(lines)
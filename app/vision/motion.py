@@ -1,5 +1,6 @@
 from __future__ import annotations
-from typing import List, Tuple
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
 import cv2
 import numpy as np
 
@@ -70,3 +71,513 @@ def merge_boxes(boxes: List[Tuple[int, int, int, int]], padding: int = 15
             nxt.append(base)
         work = nxt
     return work
+
+@dataclass
+class FrameMotion:
+    """Resultado de detect_batch para un frame (respecto al anterior)."""
+    boxes: List[Tuple[int, int, int, int]] = field(default_factory=list)
+    changed: int = 0            # píxeles por encima del umbral (tras blur, antes de dilate)
+    changed_frac: float = 0.0
+    mean_diff: float = 0.0      # media de |diff| sin difuminar
+    max_diff: int = 0
+
+def _row_sums(a: np.ndarray) -> np.ndarray:
+    """Suma por fila de una pila (N, M) uint8: cv2.reduce (int32) es ~10× más rápido que numpy."""
+    if 255 * a.shape[1] < 2 ** 31:
+        return cv2.reduce(a, 1, cv2.REDUCE_SUM, dtype=cv2.CV_32S).ravel().astype(np.int64)
+    return a.sum(axis=1, dtype=np.uint64).astype(np.int64)
+
+def detect_batch(grays: np.ndarray, thresh: int, min_area: int, dilate_iters: int,
+                 prev: Optional[np.ndarray] = None, chunk_mb: float = 2.0) -> List[FrameMotion]:
+    """
+    diff_and_boxes sobre una pila (N, H, W) de grises ya reducidos, por bloques de
+    frames de como mucho chunk_mb de buffers (con ~2 MB el bloque sigue en caché L2).
+    Por bloque, todo es vectorial sobre la pila:
+    - |diff| de todos los frames en una llamada (la pila contra sí misma desplazada)
+    - estadísticas por frame con reducciones por fila de la pila (media, máximo,
+      píxeles > umbral)
+    - frames con max|diff| ≤ thresh: sin cajas, y se saltan blur/dilate/contornos (el
+      blur es una media ponderada: no supera el máximo). Esta es la ganancia real
+      frente al bucle frame a frame; en frames con movimiento o ruido por encima del
+      umbral ambas rutas cuestan lo mismo (blur y contornos dominan)
+    - el resto se procesa como una sola imagen alta en la que cada frame lleva
+      p = max(2, dilate_iters) filas de relleno arriba y abajo: reflejadas para el blur
+      (igual que el borde de cv2.GaussianBlur) y a cero para dilate
+    Las cajas son las mismas, en el mismo orden, que frame a frame. prev es el frame
+    anterior al primero (None: el primero no tiene movimiento).
+    """
+    grays = np.ascontiguousarray(grays, dtype=np.uint8)
+    if grays.ndim != 3:
+        raise ValueError("grays debe ser (N, H, W) uint8")
+    n, h, w = grays.shape
+    out: List[FrameMotion] = []
+    if n == 0:
+        return out
+    k = max(0, int(dilate_iters))
+    p = max(2, k)
+    hp = h + 2 * p
+    if h < p + 2:
+        raise ValueError(f"frames demasiado bajos ({h} filas) para el relleno de {p}")
+    hw = h * w
+    flat = grays.reshape(n, hw)
+    first = (grays[0] if prev is None else np.asarray(prev, dtype=np.uint8)).reshape(1, hw)
+    chunk = max(1, min(n, int(chunk_mb * 1024 * 1024) // (3 * hp * w)))
+    pad = np.empty((chunk, hp, w), np.uint8)   # |diff| con relleno reflejado
+    work = np.empty_like(pad)                  # blur → (dilate)
+    binm = np.empty_like(pad)                  # threshold
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+    for i0 in range(0, n, chunk):
+        c = min(chunk, n - i0)
+        body = pad[:c, p:p + h].reshape(c, hw)  # vista: una fila por frame (salto hp·w)
+        if i0 == 0:
+            cv2.absdiff(flat[:1], first, dst=body[:1])
+            if c > 1:
+                cv2.absdiff(flat[1:c], flat[:c - 1], dst=body[1:])
+        else:
+            cv2.absdiff(flat[i0:i0 + c], flat[i0 - 1:i0 + c - 1], dst=body)
+        mx = body.max(axis=1)
+        mean = _row_sums(body) / float(hw)
+        res = [FrameMotion(mean_diff=float(mean[j]), max_diff=int(mx[j])) for j in range(c)]
+        out.extend(res)
+        act = np.flatnonzero(mx > thresh)
+        m = len(act)
+        if m == 0:
+            continue
+        if m < c:
+            pad[:m] = pad[act]                 # solo los frames que pueden tener cajas
+        pd, bi = pad[:m], binm[:m]
+        wk = work[:m].reshape(m * hp, w)
+        pd[:, :p] = pd[:, 2 * p:p:-1]                  # filas -1..-p = 1..p (REFLECT_101)
+        pd[:, p + h:] = pd[:, p + h - 2:h - 2:-1]      # filas h..h+p-1 = h-2..h-1-p
+        cv2.GaussianBlur(pd.reshape(m * hp, w), (5, 5), 0, dst=wk)
+        cv2.threshold(wk, thresh, 255, cv2.THRESH_BINARY, dst=bi.reshape(m * hp, w))
+        bi[:, :p] = 0
+        bi[:, p + h:] = 0
+        changed = _row_sums(bi.reshape(m, hp * w)) // 255  # binaria 0/255
+        for j, i in enumerate(act):
+            res[i].changed = int(changed[j])
+            res[i].changed_frac = res[i].changed / float(hw)
+        src = bi.reshape(m * hp, w)
+        if k > 0:
+            cv2.dilate(src, kernel, dst=wk, iterations=k)
+            wk3 = work[:m]
+            wk3[:, :p] = 0
+            wk3[:, p + h:] = 0
+            src = wk
+        cnts, _ = cv2.findContours(src, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        # Un contorno no cruza el relleno: su frame sale de la fila. Dentro de cada frame
+        # se conserva el orden de findContours (el mismo que sobre el frame suelto)
+        for cn in cnts:
+            if cv2.contourArea(cn) < max(1, min_area):
+                continue
+            x, y, bw, bh = cv2.boundingRect(cn)
+            j = y // hp
+            res[act[j]].boxes.append((x, y - j * hp - p, bw, bh))
+    return out
+
+def _proc_size(w0: int, h0: int, proc_width: int) -> tuple[int, int]:
+    """Tamaño (w, h) de procesado; misma regla que preprocess_frame."""
+    if proc_width <= 0 or proc_width >= w0:
+        return w0, h0
+    ratio = proc_width / float(w0)
+    return proc_width, int(h0 * ratio)
+
+class LightingGate:
+    """
+    Filtro previo de cambios globales de iluminación (nubes, autoexposición, paso a IR).
+    Con estadísticas baratas sobre el gray reducido decide si el frame es un cambio
+    de luz y no movimiento real:
+    - fracción de píxeles que superan el umbral (máscara binaria ya calculada)
+    - diferencia de brillo medio entre frames
+    - desplazamiento del histograma (Bhattacharyya, 32 bins)
+    - uniformidad: la luz escala el brillo de todo el frame por igual, así que el
+      cociente de brillo por bloque (8×8) apenas varía; un objeto grande cerca de la
+      cámara cambia unos bloques y otros no. Sin uniformidad (dispersión relativa del
+      cociente > max_spread) nunca se suprime.
+    Tras un evento se suprimen además settle_frames frames mientras la cámara se estabiliza.
+    """
+    def __init__(self, changed_frac: float = 0.5, mean_delta: float = 12.0,
+                 hist_dist: float = 0.25, settle_frames: int = 3, max_spread: float = 0.2):
+        self.changed_frac = float(changed_frac)
+        self.mean_delta = float(mean_delta)
+        self.hist_dist = float(hist_dist)
+        self.settle_frames = max(0, int(settle_frames))
+        self.max_spread = max(0.0, float(max_spread))
+        self._settle = 0
+        self._prev_hist = None
+        self.events = 0               # cambios de luz detectados
+        self.frames_suppressed = 0    # frames sin extracción de cajas por el filtro
+        self.last_stats: dict = {}
+
+    def _hist(self, gray: np.ndarray) -> np.ndarray:
+        h = cv2.calcHist([gray], [0], None, [32], [0, 256])
+        cv2.normalize(h, h, 1.0, 0.0, cv2.NORM_L1)
+        return h
+
+    def reset(self, gray: np.ndarray) -> None:
+        self._prev_hist = self._hist(gray)
+        self._settle = 0
+
+    @staticmethod
+    def _ratio_spread(prev: np.ndarray, cur: np.ndarray, n: int = 8) -> float:
+        """std/media del cociente de brillo por bloque (+8: bloques negros sin división por ~0)."""
+        a = cv2.resize(prev, (n, n), interpolation=cv2.INTER_AREA).astype(np.float32) + 8.0
+        b = cv2.resize(cur, (n, n), interpolation=cv2.INTER_AREA).astype(np.float32) + 8.0
+        mean, std = cv2.meanStdDev(b / a)
+        return float(std[0, 0] / max(1e-6, mean[0, 0]))
+
+    def check(self, prev: np.ndarray, cur: np.ndarray, changed_mask: np.ndarray) -> bool:
+        """True si el frame se debe tratar como cambio de iluminación (sin cajas)."""
+        hist = self._hist(cur)
+        prev_hist = self._prev_hist if self._prev_hist is not None else self._hist(prev)
+        self._prev_hist = hist
+        frac = cv2.countNonZero(changed_mask) / float(changed_mask.size)
+        delta = cv2.mean(cur)[0] - cv2.mean(prev)[0]
+        dist = cv2.compareHist(prev_hist, hist, cv2.HISTCMP_BHATTACHARYYA)
+        self.last_stats = {"changed_frac": round(frac, 3), "mean_delta": round(delta, 1),
+                           "hist_dist": round(dist, 3)}
+
+        lighting = frac >= self.changed_frac or (abs(delta) >= self.mean_delta and dist >= self.hist_dist)
+        if lighting:
+            spread = self._ratio_spread(prev, cur)
+            self.last_stats["ratio_spread"] = round(spread, 3)
+            lighting = spread <= self.max_spread
+        if lighting:
+            if self._settle == 0:
+                self.events += 1
+            self._settle = self.settle_frames + 1
+        if self._settle > 0:
+            self._settle -= 1
+            self.frames_suppressed += 1
+            return True
+        return False
+
+    def snapshot(self) -> dict:
+        return {"events": self.events, "frames_suppressed": self.frames_suppressed,
+                "last": dict(self.last_stats)}
+
+class ThresholdCalibrator:
+    """
+    Autocalibración de THRESH y MIN_AREA a partir del ruido observado en periodos
+    tranquilos (frames con menos de quiet_frac de píxeles por encima del umbral y
+    sin cambio de luz):
+    - suelo de ruido = percentil 95 del diff difuminado (histograma de 256 bins)
+      → thresh = suelo × thresh_margin
+    - área de ruido = mayor contorno descartado por min_area
+      → min_area = área de ruido × area_margin
+      (solo en frames que sí tuvieron blobs descartados: un frame sin ningún blob no
+      dice nada del tamaño del ruido, y con ellos min_area caería al mínimo tras
+      cualquier rato en calma)
+    Ambos se suavizan con una media exponencial (alpha por muestra) y se acotan a
+    [min, max]. Parte de los valores estáticos configurados.
+    """
+    def __init__(self, thresh: int, min_area: int,
+                 thresh_bounds: Tuple[int, int] = (8, 40),
+                 area_bounds: Tuple[int, int] = (150, 6000),
+                 thresh_margin: float = 2.0, area_margin: float = 4.0,
+                 alpha: float = 0.02, quiet_frac: float = 0.01, every: int = 5):
+        self.thresh_bounds = (int(min(thresh_bounds)), int(max(thresh_bounds)))
+        self.area_bounds = (int(min(area_bounds)), int(max(area_bounds)))
+        self.thresh_margin = float(thresh_margin)
+        self.area_margin = float(area_margin)
+        self.alpha = min(1.0, max(0.001, float(alpha)))
+        self.quiet_frac = float(quiet_frac)
+        self.every = max(1, int(every))
+        self._thresh = float(self._clamp(thresh, self.thresh_bounds))
+        self._area = float(self._clamp(min_area, self.area_bounds)) if min_area > 0 else None
+        self._n = 0
+        self.noise_floor = None   # p95 del diff en frames tranquilos (EMA)
+        self.noise_area = None    # mayor blob de ruido (EMA, px procesados)
+        self.samples = 0
+
+    @staticmethod
+    def _clamp(v: float, bounds: Tuple[int, int]) -> float:
+        return min(bounds[1], max(bounds[0], v))
+
+    @property
+    def thresh(self) -> int:
+        return int(round(self._thresh))
+
+    def min_area(self, default: int) -> int:
+        return int(round(self._area)) if self._area is not None else default
+
+    def due(self) -> bool:
+        """El próximo wants_sample() pedirá muestra (sin consumir el turno)."""
+        return (self._n + 1) % self.every == 0
+
+    def wants_sample(self) -> bool:
+        self._n += 1
+        return self._n % self.every == 0
+
+    def update(self, blur: np.ndarray, changed_mask: np.ndarray, rejected_area: float,
+               default_area: int) -> bool:
+        """Muestra de un frame (no de cambio de luz). Devuelve False si no era tranquilo."""
+        if cv2.countNonZero(changed_mask) > self.quiet_frac * changed_mask.size:
+            return False
+        hist = cv2.calcHist([blur], [0], None, [256], [0, 256]).ravel()
+        cum = np.cumsum(hist)
+        p95 = float(np.searchsorted(cum, 0.95 * cum[-1]))
+        a = self.alpha
+        self.noise_floor = p95 if self.noise_floor is None else self.noise_floor * (1 - a) + p95 * a
+        self._thresh = self._clamp(self._thresh * (1 - a) + self.noise_floor * self.thresh_margin * a,
+                                   self.thresh_bounds)
+        if rejected_area > 0:
+            self.noise_area = (rejected_area if self.noise_area is None
+                               else self.noise_area * (1 - a) + rejected_area * a)
+            area = self._area if self._area is not None else float(default_area)
+            self._area = self._clamp(area * (1 - a) + self.noise_area * self.area_margin * a,
+                                     self.area_bounds)
+        self.samples += 1
+        return True
+
+    def snapshot(self) -> dict:
+        return {
+            "thresh": self.thresh,
+            "min_area": int(round(self._area)) if self._area is not None else None,
+            "noise_floor": round(self.noise_floor, 2) if self.noise_floor is not None else None,
+            "noise_area": round(self.noise_area, 1) if self.noise_area is not None else None,
+            "samples": self.samples,
+        }
+
+class MotionDetector:
+    """
+    Equivalente con estado de preprocess_frame + diff_and_boxes, sin asignaciones
+    por frame: los buffers (resize, gray actual/anterior, absdiff, blur, threshold,
+    dilate) se reservan una vez al tamaño de procesado y todas las llamadas OpenCV
+    escriben con dst=. El gray anterior y el actual se intercambian (no se copian).
+    Produce exactamente las mismas cajas que las funciones sueltas (sin gate).
+    Con gate (LightingGate), los frames clasificados como cambio de luz no llegan a
+    dilate/findContours: devuelven [] y lighting queda a True.
+    Con calibrator (ThresholdCalibrator), umbral y área mínima son los calibrados.
+
+    Con coarse_width > 0 (grueso a fino): antes de blur/dilate/contornos se mira un
+    mapa de coarse_width px de ancho con el máximo de |diff| > umbral de cada celda.
+    El blur 5x5 nunca supera el máximo de su vecindad, así que una celda sin píxeles
+    por encima del umbral no puede dar máscara: sin celdas marcadas no hay cajas, y
+    con ellas el resto solo se calcula en sus regiones, ampliadas con el radio del
+    blur y del dilate. Las cajas son idénticas (y en el mismo orden) a las de la
+    ruta completa; el frame de muestra del calibrador usa siempre la ruta completa.
+    """
+    def __init__(self, proc_width: int, thresh: int, min_area: int, dilate_iters: int,
+                 gate: Optional[LightingGate] = None,
+                 calibrator: Optional[ThresholdCalibrator] = None,
+                 coarse_width: int = 0):
+        self.proc_width = int(proc_width)
+        self.thresh = int(thresh)
+        self.min_area = int(min_area)  # <= 0 → automático (0.3 % del frame procesado, mín. 300)
+        self.dilate_iters = max(0, int(dilate_iters))
+        self.sx = self.sy = 1.0
+        self._src_shape = None
+        self._has_prev = False
+        self.gate = gate
+        self.calibrator = calibrator
+        self.coarse_width = max(0, int(coarse_width))
+        self.lighting = False  # el último frame fue un cambio de iluminación
+        self.has_mask = False  # el último frame dejó máscara válida (ni referencia ni cambio de luz)
+        # 3x3 rectangular == kernel por defecto de cv2.dilate(…, None)
+        self._kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+        self._hotpad = None
+        self._ckernel = None
+        # frames resueltos en el nivel grueso / en regiones / en el frame completo
+        self.coarse_counts = {"quiet": 0, "roi": 0, "full": 0}
+
+    # -------- buffers --------
+
+    def _alloc(self, frame) -> None:
+        h0, w0 = frame.shape[:2]
+        pw, ph = _proc_size(w0, h0, self.proc_width)
+        self._dsize = (pw, ph)
+        self._small = np.empty((ph, pw, 3), np.uint8) if (pw, ph) != (w0, h0) else None
+        self._cur = np.empty((ph, pw), np.uint8)
+        self._prev = np.empty((ph, pw), np.uint8)
+        self._diff = np.empty((ph, pw), np.uint8)
+        self._blur = np.empty((ph, pw), np.uint8)
+        self._bin = np.empty((ph, pw), np.uint8)
+        self._dil = np.empty((ph, pw), np.uint8)
+        self._hotpad = None
+        if self.coarse_width > 0 and pw > self.coarse_width:
+            # Celdas de cell×cell px; el relleno hasta múltiplo de cell queda siempre a 0.
+            # cell ≤ 16: un solo píxel a 255 en la celda aún da media ≥ 1 (INTER_AREA redondea)
+            self._cell = min(16, max(1, pw // self.coarse_width))
+            gh, gw = -(-ph // self._cell), -(-pw // self._cell)
+            self._hotpad = np.zeros((gh * self._cell, gw * self._cell), np.uint8)
+            self._hot = self._hotpad[:ph, :pw]
+            self._coarse = np.empty((gh, gw), np.uint8)
+        self.sx = w0 / float(pw)
+        self.sy = h0 / float(ph)
+        self._src_shape = frame.shape
+        self._has_prev = False
+
+    @property
+    def gray(self) -> np.ndarray:
+        """Último gray procesado (vista del buffer interno: no modificar)."""
+        return self._prev
+
+    @property
+    def binary(self) -> np.ndarray:
+        """Píxeles por encima del umbral (antes de dilate) del último frame (vista del buffer)."""
+        return self._bin
+
+    @property
+    def mask(self) -> np.ndarray:
+        """Máscara binaria (tras dilate) del último frame (vista del buffer interno)."""
+        return self._dil if self.dilate_iters > 0 else self._bin
+
+    def effective_min_area(self) -> int:
+        if self.min_area > 0:
+            base = self.min_area
+        else:
+            base = max(300, int(0.003 * self._cur.size))
+        if self.calibrator is not None:
+            return self.calibrator.min_area(base)
+        return base
+
+    def effective_thresh(self) -> int:
+        return self.calibrator.thresh if self.calibrator is not None else self.thresh
+
+    def configure(self, proc_width: int, thresh: int, min_area: int, dilate_iters: int,
+                  coarse_width: Optional[int] = None) -> None:
+        """
+        Cambia parámetros en caliente (entre frames). Un proc_width distinto re-reserva
+        los buffers: el siguiente frame pasa a ser la referencia (sin cajas).
+        """
+        if int(proc_width) != self.proc_width:
+            self.proc_width = int(proc_width)
+            self._src_shape = None
+        if coarse_width is not None and max(0, int(coarse_width)) != self.coarse_width:
+            self.coarse_width = max(0, int(coarse_width))
+            self._src_shape = None
+        self.thresh = int(thresh)
+        self.min_area = int(min_area)
+        self.dilate_iters = max(0, int(dilate_iters))
+
+    # -------- API --------
+
+    def _to_gray(self, frame) -> np.ndarray:
+        if self._src_shape != frame.shape:
+            self._alloc(frame)
+        if self._small is not None:
+            cv2.resize(frame, self._dsize, dst=self._small, interpolation=cv2.INTER_AREA)
+            cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY, dst=self._cur)
+        else:
+            cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self._cur)
+        return self._cur
+
+    def reset(self, frame) -> None:
+        """Toma frame como referencia (sin detectar)."""
+        self._to_gray(frame)
+        if self.gate is not None:
+            self.gate.reset(self._cur)
+        self._swap()
+
+    def process(self, frame) -> List[Tuple[int, int, int, int]]:
+        """Devuelve las cajas (coords del frame procesado) respecto al frame anterior."""
+        self._to_gray(frame)
+        self.lighting = False
+        self.has_mask = False
+        if not self._has_prev:
+            if self.gate is not None:
+                self.gate.reset(self._cur)
+            self._swap()
+            return []
+        boxes = self._boxes(self._prev, self._cur)
+        self.has_mask = not self.lighting
+        self._swap()
+        return boxes
+
+    def _coarse_rois(self, thresh: int) -> Optional[List[Tuple[int, int, int, int]]]:
+        """
+        Regiones (x, y, w, h) donde puede haber máscara; [] si no hay movimiento y None
+        si conviene procesar el frame completo (regiones grandes).
+        """
+        cv2.threshold(self._diff, thresh, 255, cv2.THRESH_BINARY, dst=self._hot)
+        if cv2.countNonZero(self._hot) == 0:
+            return []
+        cell = self._cell
+        coarse = self._coarse
+        cv2.resize(self._hotpad, coarse.shape[::-1], dst=coarse, interpolation=cv2.INTER_AREA)
+        # Todo píxel de la máscara final está a ≤ 2 + dilate_iters de un píxel caliente,
+        # y su valor depende de diffs a otros 2 + dilate_iters: margen 2·(2 + k) + 1
+        c = -(-(2 * (2 + self.dilate_iters) + 1) // cell)
+        if self._ckernel is None or self._ckernel.shape[0] != 2 * c + 1:
+            self._ckernel = cv2.getStructuringElement(cv2.MORPH_RECT, (2 * c + 1, 2 * c + 1))
+        cv2.dilate(coarse, self._ckernel, dst=coarse)
+        n, _, stats, _ = cv2.connectedComponentsWithStats(coarse, connectivity=8)
+        ph, pw = self._diff.shape
+        rects = []
+        for i in range(1, n):
+            x, y, w, h = (int(v) * cell for v in stats[i][:4])
+            rects.append((x, y, min(pw, x + w) - x, min(ph, y + h) - y))
+        rects = merge_boxes(rects, padding=1)  # disjuntas y sin tocarse
+        if sum(w * h for (_, _, w, h) in rects) > 0.5 * pw * ph:
+            return None
+        return rects
+
+    def _boxes(self, prev: np.ndarray, cur: np.ndarray) -> List[Tuple[int, int, int, int]]:
+        cv2.absdiff(prev, cur, dst=self._diff)
+        thresh = self.effective_thresh()
+        rois = None
+        if self._hotpad is not None and not (self.calibrator is not None and self.calibrator.due()):
+            rois = self._coarse_rois(thresh)
+        if rois is None:
+            self.coarse_counts["full"] += 1
+            cv2.GaussianBlur(self._diff, (5, 5), 0, dst=self._blur)
+            cv2.threshold(self._blur, thresh, 255, cv2.THRESH_BINARY, dst=self._bin)
+        else:
+            self.coarse_counts["roi" if rois else "quiet"] += 1
+            self._bin.fill(0)
+            for (x, y, w, h) in rois:
+                cv2.GaussianBlur(self._diff[y:y + h, x:x + w], (5, 5), 0, dst=self._blur[y:y + h, x:x + w])
+                cv2.threshold(self._blur[y:y + h, x:x + w], thresh, 255, cv2.THRESH_BINARY,
+                              dst=self._bin[y:y + h, x:x + w])
+        if self.gate is not None and self.gate.check(prev, cur, self._bin):
+            # Cambio de luz: sin cajas; el swap posterior deja este frame como referencia
+            self.lighting = True
+            return []
+        if rois is None:
+            src = self._bin
+            if self.dilate_iters > 0:
+                cv2.dilate(self._bin, self._kernel, dst=self._dil, iterations=self.dilate_iters)
+                src = self._dil
+            cnts, _ = cv2.findContours(src, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        else:
+            cnts = self._roi_contours(rois)
+        min_area = max(1, self.effective_min_area())
+        boxes: List[Tuple[int, int, int, int]] = []
+        rejected = 0.0
+        for c in cnts:
+            area = cv2.contourArea(c)
+            if area < min_area:
+                rejected = max(rejected, area)
+                continue
+            boxes.append(cv2.boundingRect(c))
+        if self.calibrator is not None and self.calibrator.wants_sample():
+            self.calibrator.update(self._blur, self._bin, rejected, min_area)
+        return boxes
+
+    def _roi_contours(self, rois: List[Tuple[int, int, int, int]]) -> list:
+        """Contornos de la máscara solo dentro de las regiones, en coords del frame."""
+        if self.dilate_iters > 0:
+            self._dil.fill(0)
+        cnts = []
+        for (x, y, w, h) in rois:
+            src = self._bin[y:y + h, x:x + w]
+            if self.dilate_iters > 0:
+                dst = self._dil[y:y + h, x:x + w]
+                cv2.dilate(src, self._kernel, dst=dst, iterations=self.dilate_iters)
+                src = dst
+            found, _ = cv2.findContours(src, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE, offset=(x, y))
+            cnts.extend(found)
+        if len(rois) > 1:
+            # findContours devuelve los contornos en orden inverso al barrido de su
+            # primer píxel (fila superior, más a la izquierda): mismo orden que el frame completo
+            def first_px(c):
+                pts = c.reshape(-1, 2)
+                y0 = int(pts[:, 1].min())
+                return y0, int(pts[pts[:, 1] == y0, 0].min())
+            cnts.sort(key=first_px, reverse=True)
+        return cnts
+
+    def _swap(self) -> None:
+        self._prev, self._cur = self._cur, self._prev
+        self._has_prev = True
@@ -0,0 +1,171 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+Box = Tuple[int, int, int, int]
+
+
+def iou(a: Box, b: Box) -> float:
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = ix * iy
+    union = aw * ah + bw * bh - inter
+    return inter / float(union) if union > 0 else 0.0
+
+
+@dataclass
+class Track:
+    """Objeto seguido entre frames (coords del frame procesado)."""
+    id: int
+    box: Box
+    first_ts: float
+    last_ts: float
+    cx: float = 0.0
+    cy: float = 0.0
+    vx: float = 0.0  # px/s
+    vy: float = 0.0
+    hits: int = 1
+    misses: int = 0
+    confirmed: bool = False
+    alerted: bool = False          # ya se evaluó para alerta (una vez por objeto)
+    label: Optional[str] = None    # clase del clasificador (app.vision.classify)
+    score: float = 0.0
+    path: List[Tuple[float, float, float]] = field(default_factory=list)  # (ts, cx, cy)
+
+    def predict(self, ts: float) -> Box:
+        """Caja prevista en ts (velocidad constante)."""
+        dt = max(0.0, ts - self.last_ts)
+        x, y, w, h = self.box
+        px = self.cx + self.vx * dt
+        py = self.cy + self.vy * dt
+        return (int(round(px - w / 2)), int(round(py - h / 2)), w, h)
+
+
+class Tracker:
+    """
+    Seguimiento multi-objeto barato sobre las cajas de movimiento:
+    - predicción de velocidad constante con filtro alfa-beta (Kalman simplificado)
+    - asociación voraz por IoU con la caja prevista y, si no solapa, por distancia
+      de centroides (max_dist px del frame procesado)
+    - una pista se confirma tras min_hits asociaciones y muere tras max_misses
+      frames sin caja
+    update() devuelve las pistas que se confirman en ese frame (objetos nuevos).
+    """
+    def __init__(self, iou_thresh: float = 0.2, max_dist: float = 40.0,
+                 min_hits: int = 3, max_misses: int = 5,
+                 alpha: float = 0.6, beta: float = 0.2, max_path: int = 2000):
+        self.iou_thresh = float(iou_thresh)
+        self.max_dist = float(max_dist)
+        self.min_hits = max(1, int(min_hits))
+        self.max_misses = max(0, int(max_misses))
+        self.alpha = float(alpha)
+        self.beta = float(beta)
+        self.max_path = max(2, int(max_path))
+        self.tracks: List[Track] = []
+        self._next_id = 1
+        self.created = 0
+        self.confirmed_total = 0
+
+    def reset(self) -> None:
+        self.tracks = []
+
+    def _match(self, boxes: List[Box], ts: float) -> List[Tuple[int, int]]:
+        """Pares (índice pista, índice caja) por coste creciente (voraz)."""
+        cands = []
+        for ti, t in enumerate(self.tracks):
+            pred = t.predict(ts)
+            pcx, pcy = pred[0] + pred[2] / 2.0, pred[1] + pred[3] / 2.0
+            for bi, b in enumerate(boxes):
+                ov = iou(pred, b)
+                if ov >= self.iou_thresh:
+                    cands.append((1.0 - ov, ti, bi))
+                    continue
+                d = ((b[0] + b[2] / 2.0 - pcx) ** 2 + (b[1] + b[3] / 2.0 - pcy) ** 2) ** 0.5
+                if d <= self.max_dist:
+                    cands.append((1.0 + d / max(1.0, self.max_dist), ti, bi))
+        cands.sort()
+        used_t, used_b, pairs = set(), set(), []
+        for _, ti, bi in cands:
+            if ti in used_t or bi in used_b:
+                continue
+            used_t.add(ti)
+            used_b.add(bi)
+            pairs.append((ti, bi))
+        return pairs
+
+    def _correct(self, t: Track, b: Box, ts: float) -> None:
+        dt = ts - t.last_ts
+        mx, my = b[0] + b[2] / 2.0, b[1] + b[3] / 2.0
+        if dt > 0:
+            px, py = t.cx + t.vx * dt, t.cy + t.vy * dt
+            rx, ry = mx - px, my - py
+            t.cx = px + self.alpha * rx
+            t.cy = py + self.alpha * ry
+            t.vx += self.beta * rx / dt
+            t.vy += self.beta * ry / dt
+        else:
+            t.cx, t.cy = mx, my
+        t.box = b
+        t.last_ts = ts
+        t.hits += 1
+        t.misses = 0
+        t.path.append((ts, t.cx, t.cy))
+        if len(t.path) > self.max_path:
+            del t.path[: len(t.path) - self.max_path]
+
+    def update(self, boxes: List[Box], ts: float) -> List[Track]:
+        pairs = self._match(boxes, ts)
+        matched_t = {ti for ti, _ in pairs}
+        matched_b = {bi for _, bi in pairs}
+        newly: List[Track] = []
+
+        for ti, bi in pairs:
+            t = self.tracks[ti]
+            self._correct(t, boxes[bi], ts)
+            if not t.confirmed and t.hits >= self.min_hits:
+                t.confirmed = True
+                self.confirmed_total += 1
+                newly.append(t)
+
+        alive: List[Track] = []
+        for ti, t in enumerate(self.tracks):
+            if ti not in matched_t:
+                t.misses += 1
+            if t.misses <= self.max_misses:
+                alive.append(t)
+        self.tracks = alive
+
+        for bi, b in enumerate(boxes):
+            if bi in matched_b:
+                continue
+            cx, cy = b[0] + b[2] / 2.0, b[1] + b[3] / 2.0
+            t = Track(id=self._next_id, box=b, first_ts=ts, last_ts=ts, cx=cx, cy=cy,
+                      path=[(ts, cx, cy)])
+            self._next_id += 1
+            self.created += 1
+            if self.min_hits <= 1:
+                t.confirmed = True
+                self.confirmed_total += 1
+                newly.append(t)
+            self.tracks.append(t)
+        return newly
+
+    def get(self, track_id: int) -> Optional[Track]:
+        for t in self.tracks:
+            if t.id == track_id:
+                return t
+        return None
+
+    def active(self, confirmed_only: bool = True) -> List[Track]:
+        """Pistas vistas en el último update (misses == 0)."""
+        return [t for t in self.tracks if t.misses == 0 and (t.confirmed or not confirmed_only)]
+
+    def snapshot(self) -> dict:
+        return {
+            "active": len(self.active(confirmed_only=False)),
+            "confirmed_active": len(self.active()),
+            "created": self.created,
+            "confirmed": self.confirmed_total,
+        }
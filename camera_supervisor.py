@@ -0,0 +1,10 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# arranque multi-cámara (un proceso por cámara, un solo bot de Telegram)
+#   python camera_supervisor.py cameras.ini
+
+from app.supervisor.supervisor import main
+
+if __name__ == "__main__":
+    main()
@@ -3,15 +3,39 @@
 
 # archivo principal (mínimo)
 
+import time
+_T0 = time.perf_counter()  # inicio del proceso (informe [BOOT])
+
+import argparse
+
+from app.common.metrics import BootTimer
 from app.config import load_settings
 from app.state import RuntimeState
-from app.run import run_viewer
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Visor y grabador de movimiento para una cámara por snapshots")
+    ap.add_argument("--check", action="store_true",
+                    help="valida configuración y conectividad (cámara, Telegram, RUNTIME_DIR) sin entrar en el bucle")
+    args = ap.parse_args(argv)
+    boot = BootTimer(_T0)
+    boot.mark("imports")
+    if args.check:
+        from app.check import run_check
+        return 0 if run_check(boot) else 1
+
+    settings = load_settings()
+    state = RuntimeState(snapshot_base=settings.SNAPSHOT_URL_INIT,
+                         snapshot_cookie=settings.SNAPSHOT_COOKIE)
+    boot.mark("config")
+    from app.run import run_viewer  # solo módulos ligeros: el resto, según la configuración
+    boot.mark("imports")
+    run_viewer(settings, state, boot=boot)
+    return 0
+
 
 if __name__ == "__main__":
     try:
-        settings = load_settings()
-        state = RuntimeState(snapshot_base=settings.SNAPSHOT_URL_INIT,
-                             snapshot_cookie=settings.SNAPSHOT_COOKIE)
-        run_viewer(settings, state)
+        raise SystemExit(main())
     except KeyboardInterrupt:
         pass